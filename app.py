@@ -1,10 +1,29 @@
-from flask import Flask, request, jsonify, send_file
+from flask import Flask, request, jsonify, send_file, g, make_response, stream_with_context
 from flask_cors import CORS
+from werkzeug.exceptions import HTTPException, MethodNotAllowed, NotFound
 import sqlite3
-from datetime import datetime, timedelta
+import queue
+import json
+import base64
+import hashlib
+import re
+import bisect
+import unicodedata
+from functools import wraps
+from concurrent.futures import ThreadPoolExecutor
+import threading
+from collections import OrderedDict
+from datetime import date, datetime, timedelta, timezone
 from models import init_db
+from importar import IMPORTADORES, TAMANO_LOTE, importar_csv
+from mantenimiento import SERIES_DOCUMENTOS, acumular_ventas_diarias, reservar_codigos
 import io
+import csv
+import gzip
+import zipfile
+import tempfile
 from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
 from openpyxl.styles import Font, PatternFill
 import os
 from dotenv import load_dotenv
@@ -29,13 +48,58 @@ def check_login_credentials(email, password):
     }
     return email in valid_credentials and valid_credentials[email] == password
 
-# Conexión a la base de datos
-def get_db_connection():
-    conn = sqlite3.connect('database.db')
+# -------------------- CONEXIÓN A LA BASE DE DATOS --------------------
+DATABASE_PATH = 'database.db'
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 8))
+
+# Pool de conexiones abiertas que se reutilizan entre requests. El servidor
+# crea un hilo por request, por eso el pool es por proceso y no thread-local.
+_db_pool = queue.LifoQueue(maxsize=DB_POOL_SIZE)
+
+def open_db_connection():
+    """Abrir una conexión nueva con WAL y pragmas ajustados"""
+    conn = sqlite3.connect(DATABASE_PATH, check_same_thread=False)
     conn.row_factory = sqlite3.Row  # Para obtener diccionarios en lugar de tuplas
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    conn.execute('PRAGMA busy_timeout=5000')
+    conn.execute('PRAGMA cache_size=-16000')  # ~16 MB de page cache
+    conn.execute('PRAGMA temp_store=MEMORY')
+    conn.execute('PRAGMA mmap_size=67108864')
     return conn
 
+def tomar_conexion():
+    """Sacar una conexión del pool, o abrir una nueva si está vacío"""
+    try:
+        return _db_pool.get_nowait()
+    except queue.Empty:
+        return open_db_connection()
+
+def devolver_conexion(conn):
+    """Devolver la conexión al pool, descartando transacciones sin commit"""
+    if conn.in_transaction:
+        conn.rollback()
+    try:
+        _db_pool.put_nowait(conn)
+    except queue.Full:
+        conn.close()
+
+def get_db_connection():
+    """
+    Conexión del request actual. Se toma del pool la primera vez que se pide
+    y se devuelve al pool en el teardown del app context.
+    """
+    if 'db' not in g:
+        g.db = tomar_conexion()
+    return g.db
+
+def release_db_connection(exception=None):
+    conn = g.pop('db', None)
+    if conn is not None:
+        devolver_conexion(conn)
+
 app = Flask(__name__)
+app.teardown_appcontext(release_db_connection)
 
 # CORS configurado para Vercel + desarrollo local
 CORS(app, origins=[
@@ -49,9 +113,510 @@ CORS(app, origins=[
 @app.after_request
 def after_request(response):
     response.headers.add('Access-Control-Allow-Origin', '*')
-    response.headers.add('Access-Control-Allow-Headers', 'Content-Type,Authorization')
+    response.headers.add('Access-Control-Allow-Headers', 'Content-Type,Authorization,Idempotency-Key')
     response.headers.add('Access-Control-Allow-Methods', 'GET,PUT,POST,DELETE,OPTIONS')
+    response.headers.add('Access-Control-Expose-Headers', 'X-Total-Count,Idempotent-Replayed')
+    return response
+
+# -------------------- PAGINACIÓN POR CURSOR --------------------
+PAGINA_POR_DEFECTO = 100
+PAGINA_MAXIMA = 500
+
+class CursorInvalido(ValueError):
+    pass
+
+@app.errorhandler(CursorInvalido)
+def cursor_invalido(error):
+    return jsonify({'error': 'Cursor de paginación inválido'}), 400
+
+def codificar_cursor(valores):
+    return base64.urlsafe_b64encode(json.dumps(valores).encode()).decode()
+
+def decodificar_cursor(cursor):
+    try:
+        valores = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (ValueError, TypeError):
+        raise CursorInvalido(cursor)
+    # Solo valores escalares: son los parámetros del filtro keyset
+    if not isinstance(valores, list) or not all(
+            v is None or isinstance(v, (str, int, float)) for v in valores):
+        raise CursorInvalido(cursor)
+    return valores
+
+def leer_paginacion():
+    """
+    Leer limit/cursor del query string. Devuelve None cuando el request no pide
+    paginación, así los clientes existentes siguen recibiendo la lista completa.
+    """
+    if 'limit' not in request.args and 'cursor' not in request.args:
+        return None
+    try:
+        limit = int(request.args.get('limit', PAGINA_POR_DEFECTO))
+    except ValueError:
+        limit = PAGINA_POR_DEFECTO
+    limit = max(1, min(limit, PAGINA_MAXIMA))
+    cursor = request.args.get('cursor')
+    return limit, decodificar_cursor(cursor) if cursor else None
+
+def cursor_ordenado(conn, select_sql, claves, descendente=False, params=()):
+    """Cursor sobre select_sql completo, en el mismo orden que usa la paginación"""
+    direccion = 'DESC' if descendente else 'ASC'
+    orden = ', '.join(f'{columna} {direccion}' for columna, _ in claves)
+    return conn.execute(f'{select_sql} ORDER BY {orden}', params)
+
+def consulta_paginada(conn, select_sql, claves, paginacion, descendente=False, params=()):
+    """
+    Ejecutar select_sql con paginación keyset sobre las columnas de `claves`
+    (lista de (expresión SQL, nombre en la fila)). La última clave debe ser
+    única para que el orden sea estable. Sin paginación devuelve todas las filas.
+    select_sql no puede tener WHERE propio (el filtro del cursor se agrega al
+    final); sus parámetros van en `params`.
+    """
+    if paginacion is None:
+        return cursor_ordenado(conn, select_sql, claves, descendente, params).fetchall(), None
+    
+    direccion = 'DESC' if descendente else 'ASC'
+    orden = ', '.join(f'{columna} {direccion}' for columna, _ in claves)
+    limit, cursor = paginacion
+    params = list(params)
+    filtro = ''
+    if cursor is not None:
+        if len(cursor) != len(claves):
+            raise CursorInvalido(cursor)
+        operador = '<' if descendente else '>'
+        columnas = ', '.join(columna for columna, _ in claves)
+        marcadores = ', '.join('?' for _ in claves)
+        filtro = f'WHERE ({columnas}) {operador} ({marcadores})'
+        params.extend(cursor)
+    
+    filas = conn.execute(f'{select_sql} {filtro} ORDER BY {orden} LIMIT ?', params + [limit + 1]).fetchall()
+    siguiente = None
+    if len(filas) > limit:
+        filas = filas[:limit]
+        siguiente = codificar_cursor([filas[-1][nombre] for _, nombre in claves])
+    return filas, siguiente
+
+def filas_a_dicts(filas):
+    return [dict(fila) for fila in filas]
+
+def respuesta_json_streaming(cursor, transformar_lote=filas_a_dicts, tamano_lote=500):
+    """
+    Emitir un arreglo JSON leyendo el cursor por lotes, sin armar la lista
+    completa en memoria. Se envía con chunked transfer y la conexión sigue
+    tomada hasta que termina el generador.
+    """
+    def generar():
+        yield '['
+        primero = True
+        while True:
+            filas = cursor.fetchmany(tamano_lote)
+            if not filas:
+                break
+            items = transformar_lote(filas)
+            if not items:
+                continue
+            yield ('' if primero else ',') + ','.join(json.dumps(item) for item in items)
+            primero = False
+        yield ']'
+    return app.response_class(stream_with_context(generar()), mimetype='application/json')
+
+def respuesta_lista(conn, items, paginacion, siguiente, tabla, stats=None):
+    """
+    Lista completa cuando no se pidió paginación ni stats; si no, un objeto con
+    items, next_cursor y stats según corresponda. Con ?total=1 se agrega el
+    header X-Total-Count.
+    """
+    if paginacion is None and stats is None:
+        return jsonify(items)
+    cuerpo = {'items': items}
+    if paginacion is not None:
+        cuerpo['next_cursor'] = siguiente
+        cuerpo['limit'] = paginacion[0]
+    if stats is not None:
+        cuerpo['stats'] = stats
+    response = jsonify(cuerpo)
+    if request.args.get('total') in ('1', 'true'):
+        total = conn.execute(f'SELECT COUNT(*) FROM {tabla}').fetchone()[0]
+        response.headers['X-Total-Count'] = str(total)
     return response
+
+# -------------------- CACHE POR VERSIÓN DE DATOS --------------------
+def version_datos(conn, tablas):
+    """
+    Versión actual de las tablas indicadas, según los contadores que mantienen
+    los triggers de cambios_tablas. Cambia con cualquier escritura, venga de
+    este proceso o de otro.
+    """
+    filas = conn.execute(
+        'SELECT tabla, version FROM cambios_tablas WHERE tabla IN (SELECT value FROM json_each(?))',
+        (json.dumps(list(tablas)),)
+    ).fetchall()
+    versiones = {fila['tabla']: fila['version'] for fila in filas}
+    return tuple(versiones.get(tabla, 0) for tabla in tablas)
+
+class CacheVersionada:
+    """
+    Cache en memoria cuyas entradas solo son válidas para la versión de datos
+    con la que se calcularon. Lleva la cuenta de aciertos y fallos.
+    """
+    def __init__(self, max_entradas=32):
+        self.max_entradas = max_entradas
+        self._entradas = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+    
+    def obtener(self, clave, version, calcular, guardar=True):
+        """
+        Devolver (valor, hit); calcular() solo corre si la versión cambió.
+        Con guardar=False el valor calculado no se guarda (por ejemplo, si
+        se leyó dentro de una transacción que todavía puede deshacerse).
+        """
+        with self._lock:
+            entrada = self._entradas.get(clave)
+            if entrada is not None and entrada[0] == version:
+                self._entradas.move_to_end(clave)
+                self.hits += 1
+                return entrada[1], True
+            self.misses += 1
+        
+        valor = calcular()
+        if not guardar:
+            return valor, False
+        with self._lock:
+            self._entradas[clave] = (version, valor)
+            self._entradas.move_to_end(clave)
+            while len(self._entradas) > self.max_entradas:
+                self._entradas.popitem(last=False)
+        return valor, False
+    
+    def invalidar(self):
+        with self._lock:
+            self._entradas.clear()
+    
+    def estadisticas(self):
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': round(self.hits / total, 3) if total else 0.0,
+            'entradas': len(self._entradas)
+        }
+
+def etag_por_tablas(*tablas, por_dia=False):
+    """
+    GET condicional: el ETag se deriva de la URL y de los contadores de cambios
+    de `tablas`. Si coincide con If-None-Match se responde 304 antes de leer o
+    serializar filas. Con por_dia=True la fecha entra en el ETag, para vistas
+    que calculan vencimientos contra el día actual.
+    """
+    def decorador(vista):
+        @wraps(vista)
+        def envoltura(*args, **kwargs):
+            conn = get_db_connection()
+            version = version_datos(conn, tablas)
+            if por_dia:
+                version += (datetime.now().strftime('%Y-%m-%d'),)
+            etag = hashlib.sha1(f'{request.full_path}|{version}'.encode()).hexdigest()
+            
+            if etag in request.if_none_match:
+                response = app.response_class(status=304)
+            else:
+                response = make_response(vista(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag)
+            response.headers['Cache-Control'] = 'no-cache'
+            return response
+        return envoltura
+    return decorador
+
+def pide_streaming():
+    return request.args.get('stream') in ('1', 'true')
+
+def responder_listado(conn, select_sql, claves, tabla, transformar_lote=filas_a_dicts,
+                      descendente=False, calcular_stats=None):
+    """
+    Respuesta común de los endpoints de listado:
+    - sin parámetros: la lista completa, como siempre
+    - ?limit= / ?cursor=: una página con next_cursor (ver consulta_paginada)
+    - ?stats=1: agrega las estadísticas de la tabla si el endpoint las tiene
+    - ?stream=1: la lista completa emitida por lotes (ver respuesta_json_streaming)
+    """
+    paginacion = leer_paginacion()
+    if paginacion is None and pide_streaming():
+        return respuesta_json_streaming(cursor_ordenado(conn, select_sql, claves, descendente), transformar_lote)
+    
+    filas, siguiente = consulta_paginada(conn, select_sql, claves, paginacion, descendente)
+    stats = None
+    if calcular_stats is not None and request.args.get('stats') in ('1', 'true'):
+        stats = calcular_stats(conn)
+    return respuesta_lista(conn, transformar_lote(filas), paginacion, siguiente, tabla, stats)
+
+# -------------------- TRANSACCIONES COMPARTIDAS E IDEMPOTENCIA --------------------
+IDEMPOTENCIA_TTL_HORAS = int(os.getenv('IDEMPOTENCIA_TTL_HORAS', 24))
+
+class ConexionLote:
+    """
+    Conexión compartida por varias escrituras que deben confirmarse juntas
+    (un lote de /api/batch o una escritura con Idempotency-Key). Los commit
+    y rollback que hacen las rutas no tienen efecto: quien envuelve la
+    conexión confirma o deshace todo al final.
+    """
+    def __init__(self, conn):
+        self._conn = conn
+        self.rollback_pedido = False
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        self.rollback_pedido = True
+
+    def __getattr__(self, nombre):
+        return getattr(self._conn, nombre)
+
+def idempotente(vista):
+    """
+    Soporte de Idempotency-Key para endpoints de creación. La primera vez se
+    ejecuta la vista y su respuesta se guarda en la misma transacción que la
+    escritura; un reintento con la misma clave recibe esa respuesta sin pasar
+    por la ruta. La transacción se abre con BEGIN IMMEDIATE, así dos intentos
+    simultáneos con la misma clave se serializan y solo uno escribe.
+    Sin el header la vista se ejecuta como siempre.
+    """
+    @wraps(vista)
+    def envoltura(*args, **kwargs):
+        clave = request.headers.get('Idempotency-Key')
+        if not clave:
+            return vista(*args, **kwargs)
+        if len(clave) > 255:
+            return jsonify({'error': 'Idempotency-Key demasiado larga'}), 400
+
+        conn = get_db_connection()
+        huella = hashlib.sha1(request.get_data()).hexdigest()
+        ahora = datetime.now(timezone.utc)
+
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            guardada = conn.execute('''
+                SELECT huella_cuerpo, status, respuesta, mimetype FROM claves_idempotencia
+                WHERE clave = ? AND metodo = ? AND ruta = ? AND expira > ?
+            ''', (clave, request.method, request.path, ahora.isoformat())).fetchone()
+            if guardada is not None:
+                conn.rollback()
+                if guardada['huella_cuerpo'] != huella:
+                    return jsonify({'error': 'Idempotency-Key ya usada con otro cuerpo'}), 422
+                response = app.response_class(guardada['respuesta'], status=guardada['status'],
+                                              mimetype=guardada['mimetype'])
+                response.headers['Idempotent-Replayed'] = 'true'
+                return response
+
+            transaccion = ConexionLote(conn)
+            g.db = transaccion
+            try:
+                response = make_response(vista(*args, **kwargs))
+            finally:
+                g.db = conn
+
+            # Solo se guardan las escrituras exitosas; un error se puede reintentar
+            if response.status_code >= 400 or transaccion.rollback_pedido:
+                conn.rollback()
+                return response
+
+            conn.execute('DELETE FROM claves_idempotencia WHERE expira <= ?', (ahora.isoformat(),))
+            conn.execute('''
+                INSERT INTO claves_idempotencia
+                (clave, metodo, ruta, huella_cuerpo, status, respuesta, mimetype, expira)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (clave, request.method, request.path, huella, response.status_code,
+                  response.get_data(as_text=True), response.mimetype,
+                  (ahora + timedelta(hours=IDEMPOTENCIA_TTL_HORAS)).isoformat()))
+            conn.commit()
+            return response
+        finally:
+            if conn.in_transaction:
+                conn.rollback()
+    return envoltura
+
+# -------------------- CONTADORES DE DOCUMENTOS --------------------
+# SERIES_DOCUMENTOS y la reserva de números (reservar_codigos) están en
+# mantenimiento.py, porque la importación de ventas también los usa
+
+def siguiente_codigo(conn, serie):
+    return reservar_codigos(conn, serie)[0]
+
+def numero_de_codigo(serie, codigo):
+    """Número de un código con el formato de la serie ('FAC-0123' -> 123), o None"""
+    prefijo = SERIES_DOCUMENTOS[serie].split('{')[0]
+    resto = str(codigo)[len(prefijo):] if str(codigo).startswith(prefijo) else ''
+    return int(resto) if resto.isascii() and resto.isdigit() else None
+
+def registrar_codigo_manual(conn, serie, codigo):
+    """
+    Un código escrito a mano con el formato de la serie adelanta el contador
+    hasta su número, en la misma transacción, así la serie no lo vuelve a
+    emitir. Códigos con otro formato no afectan al contador.
+    """
+    numero = numero_de_codigo(serie, codigo)
+    if numero is not None:
+        conn.execute('''
+            INSERT INTO contadores (serie, valor) VALUES (?, ?)
+            ON CONFLICT (serie) DO UPDATE SET valor = MAX(valor, excluded.valor)
+        ''', (serie, numero))
+
+@app.route('/api/contadores/<serie>/reservar', methods=['POST'])
+def reservar_rango(serie):
+    """Reservar un rango de códigos de una serie para cargas masivas"""
+    if serie not in SERIES_DOCUMENTOS:
+        return jsonify({'error': f'Serie desconocida: {serie}'}), 404
+    data = request.get_json(silent=True) or {}
+    try:
+        cantidad = int(data.get('cantidad', 1))
+    except (TypeError, ValueError):
+        cantidad = 0
+    if not 1 <= cantidad <= 10000:
+        return jsonify({'error': 'La cantidad debe estar entre 1 y 10000'}), 400
+
+    conn = get_db_connection()
+    codigos = reservar_codigos(conn, serie, cantidad)
+    conn.commit()
+    return jsonify({'serie': serie, 'desde': codigos[0], 'hasta': codigos[-1], 'codigos': codigos}), 201
+
+# -------------------- AUTOCOMPLETADO --------------------
+AUTOCOMPLETADO_MAX_RESULTADOS = 20
+AUTOCOMPLETADO_MAX_PALABRAS = 4     # claves por nombre: una por cada inicio de palabra
+AUTOCOMPLETADO_LARGO_CLAVE = 48     # las claves se recortan; acota la memoria por entrada
+
+def normalizar_nombre(texto):
+    """Minúsculas, sin acentos y con espacios simples: 'José  Pérez' -> 'jose perez'"""
+    descompuesto = unicodedata.normalize('NFKD', texto or '')
+    sin_acentos = ''.join(c for c in descompuesto if not unicodedata.combining(c))
+    return ' '.join(sin_acentos.lower().split())
+
+class IndicePrefijos:
+    """
+    Índice en memoria para autocompletar los nombres de una tabla. Guarda una
+    lista ordenada de (clave, id) con una clave por cada inicio de palabra del
+    nombre normalizado ('estudio luna' -> 'estudio luna', 'luna'); una búsqueda
+    es un bisect más un recorrido corto, sin tocar la base de datos.
+
+    Se construye en la primera consulta y las rutas de escritura lo actualizan
+    con registrar_cambio(). Recuerda la versión de cambios_tablas con la que
+    está al día: si la tabla cambió por otro camino (otro proceso, una
+    importación, un lote deshecho), la versión no cuadra y se reconstruye.
+    """
+    def __init__(self, tabla):
+        self.tabla = tabla
+        self._lock = threading.Lock()
+        self._claves = []    # lista ordenada de (clave, id)
+        self._nombres = {}   # id -> nombre original
+        self.version = None  # None: sin construir o descartado
+
+    @staticmethod
+    def _claves_de(id, nombre):
+        palabras = normalizar_nombre(nombre).split(' ')
+        return {(' '.join(palabras[i:])[:AUTOCOMPLETADO_LARGO_CLAVE], id)
+                for i in range(min(len(palabras), AUTOCOMPLETADO_MAX_PALABRAS)) if palabras[i]}
+
+    def _construir(self, conn, version):
+        claves = []
+        nombres = {}
+        for fila in conn.execute(f'SELECT id, nombre FROM {self.tabla}'):
+            nombres[fila['id']] = fila['nombre']
+            claves.extend(self._claves_de(fila['id'], fila['nombre']))
+        claves.sort()
+        self._claves = claves
+        self._nombres = nombres
+        self.version = version
+
+    def _quitar(self, id):
+        nombre = self._nombres.pop(id, None)
+        if nombre is None:
+            return
+        for clave in self._claves_de(id, nombre):
+            i = bisect.bisect_left(self._claves, clave)
+            if i < len(self._claves) and self._claves[i] == clave:
+                del self._claves[i]
+
+    def buscar(self, conn, texto, limite):
+        """Hasta `limite` registros cuyo nombre tiene una palabra que empieza por `texto`"""
+        version = version_datos(conn, (self.tabla,))[0]
+        prefijo = normalizar_nombre(texto)[:AUTOCOMPLETADO_LARGO_CLAVE]
+        resultados = []
+        with self._lock:
+            if self.version != version:
+                self._construir(conn, version)
+            vistos = set()
+            i = bisect.bisect_left(self._claves, (prefijo,))
+            while i < len(self._claves) and len(resultados) < limite:
+                clave, id = self._claves[i]
+                if not clave.startswith(prefijo):
+                    break
+                if id not in vistos:
+                    vistos.add(id)
+                    resultados.append({'id': id, 'nombre': self._nombres[id]})
+                i += 1
+        return resultados
+
+    def registrar_cambio(self, conn, id, nombre=None):
+        """
+        Aplicar al índice una escritura de este proceso (nombre=None para un
+        borrado). Se llama con la conexión de la escritura después del
+        commit. Si la transacción sigue abierta (un lote de /api/batch o una
+        escritura con Idempotency-Key, que todavía se pueden deshacer) o si
+        entre medias hubo otras escrituras en la tabla, el índice se descarta
+        y se reconstruye en la próxima consulta.
+        """
+        if conn.in_transaction:
+            with self._lock:
+                self.version = None
+            return
+        version = version_datos(conn, (self.tabla,))[0]
+        with self._lock:
+            if self.version is None or version == self.version:
+                return
+            if version != self.version + 1:
+                self.version = None
+                return
+            self._quitar(id)
+            if nombre is not None:
+                self._nombres[id] = nombre
+                for clave in self._claves_de(id, nombre):
+                    bisect.insort(self._claves, clave)
+            self.version = version
+
+    def estadisticas(self):
+        return {'registros': len(self._nombres), 'claves': len(self._claves), 'version': self.version}
+
+INDICES_AUTOCOMPLETADO = {
+    'clientes': IndicePrefijos('clientes'),
+    'productos': IndicePrefijos('productos'),
+}
+
+@app.route('/api/autocomplete', methods=['GET'])
+def autocompletar():
+    """
+    Sugerencias para escribir en formularios: clientes y productos cuyo nombre
+    tiene una palabra que empieza por q (sin distinguir mayúsculas ni acentos).
+    Parámetros: q, tipo (clientes, productos o ambos separados por coma), limit.
+    """
+    texto = request.args.get('q', '')
+    if not normalizar_nombre(texto):
+        return jsonify({'error': 'Parámetro q requerido'}), 400
+    tipos = [t.strip() for t in request.args.get('tipo', 'clientes,productos').split(',') if t.strip()]
+    desconocidos = [t for t in tipos if t not in INDICES_AUTOCOMPLETADO]
+    if desconocidos:
+        return jsonify({'error': f"Tipos inválidos: {', '.join(desconocidos)}"}), 400
+    try:
+        limite = int(request.args.get('limit', 10))
+    except ValueError:
+        return jsonify({'error': 'limit debe ser un entero'}), 400
+    limite = max(1, min(limite, AUTOCOMPLETADO_MAX_RESULTADOS))
+
+    conn = get_db_connection()
+    return jsonify({tipo: INDICES_AUTOCOMPLETADO[tipo].buscar(conn, texto, limite) for tipo in tipos})
+
 # -------------------- RUTAS DE AUTENTICACIÓN --------------------
 @app.route('/api/auth/login', methods=['POST'])
 def login():
@@ -97,33 +662,59 @@ def get_usuarios():
         SELECT id, name, email, role, created_at 
         FROM usuarios
     ''').fetchall()
-    conn.close()
     return jsonify([dict(usuario) for usuario in usuarios])
 
+# -------------------- CATÁLOGO DE PRODUCTOS --------------------
+catalogo_cache = CacheVersionada(max_entradas=1)
+
+def catalogo_productos(conn):
+    """
+    Todos los productos como {id: dict}, cargados una vez y servidos desde
+    memoria mientras la versión de productos no cambie. Las rutas que
+    escriben productos lo invalidan; la versión cubre las escrituras de
+    otros procesos. Dentro de una transacción abierta solo se usa el
+    catálogo guardado si la versión coincide: un catálogo leído con
+    escrituras sin confirmar no se guarda. El dict es compartido, no se
+    debe modificar.
+    """
+    version = version_datos(conn, ('productos',))
+    catalogo, _ = catalogo_cache.obtener(
+        'productos', version,
+        lambda: {fila['id']: dict(fila) for fila in conn.execute('SELECT * FROM productos')},
+        guardar=not conn.in_transaction)
+    return catalogo
+
+def producto_del_catalogo(conn, producto_id):
+    try:
+        return catalogo_productos(conn).get(int(producto_id))
+    except (TypeError, ValueError):
+        return None
+
 # -------------------- RUTAS PARA PRODUCTOS --------------------
 @app.route('/api/productos', methods=['GET'])
+@etag_por_tablas('productos')
 def get_productos():
     conn = get_db_connection()
-    productos = conn.execute('SELECT * FROM productos').fetchall()
-    conn.close()
-    return jsonify([dict(producto) for producto in productos])
+    return responder_listado(conn, 'SELECT * FROM productos', [('id', 'id')], 'productos')
 
 @app.route('/api/productos/<int:id>', methods=['GET'])
+@etag_por_tablas('productos')
 def get_producto(id):
     conn = get_db_connection()
     producto = conn.execute('SELECT * FROM productos WHERE id = ?', (id,)).fetchone()
-    conn.close()
     return jsonify(dict(producto)) if producto else ('', 404)
 
 @app.route('/api/productos', methods=['POST'])
+@idempotente
 def agregar_producto():
     data = request.json
     conn = get_db_connection()
-    conn.execute('INSERT INTO productos (nombre, tipo, precio, descripcion) VALUES (?, ?, ?, ?)', 
-                 (data['nombre'], data['tipo'], data['precio'], data.get('descripcion', '')))
+    cursor = conn.execute('INSERT INTO productos (nombre, tipo, precio, descripcion) VALUES (?, ?, ?, ?)', 
+                          (data['nombre'], data['tipo'], data['precio'], data.get('descripcion', '')))
     conn.commit()
-    conn.close()
-    return jsonify({'mensaje': 'Producto creado'}), 201
+    catalogo_cache.invalidar()
+    INDICES_AUTOCOMPLETADO['productos'].registrar_cambio(conn, cursor.lastrowid, data['nombre'])
+    return jsonify({'mensaje': 'Producto creado', 'id': cursor.lastrowid}), 201
 
 @app.route('/api/productos/<int:id>', methods=['PUT'])
 def actualizar_producto(id):
@@ -132,7 +723,8 @@ def actualizar_producto(id):
     conn.execute('UPDATE productos SET nombre = ?, tipo = ?, precio = ?, descripcion = ? WHERE id = ?',
                  (data['nombre'], data['tipo'], data['precio'], data.get('descripcion', ''), id))
     conn.commit()
-    conn.close()
+    catalogo_cache.invalidar()
+    INDICES_AUTOCOMPLETADO['productos'].registrar_cambio(conn, id, data['nombre'])
     return jsonify({'mensaje': 'Producto actualizado'})
 
 @app.route('/api/productos/<int:id>', methods=['DELETE'])
@@ -140,34 +732,35 @@ def eliminar_producto(id):
     conn = get_db_connection()
     conn.execute('DELETE FROM productos WHERE id = ?', (id,))
     conn.commit()
-    conn.close()
+    catalogo_cache.invalidar()
+    INDICES_AUTOCOMPLETADO['productos'].registrar_cambio(conn, id)
     return jsonify({'mensaje': 'Producto eliminado'})
 
 # -------------------- RUTAS PARA CLIENTES --------------------
 @app.route('/api/clientes', methods=['GET'])
+@etag_por_tablas('clientes')
 def get_clientes():
     conn = get_db_connection()
-    clientes = conn.execute('SELECT * FROM clientes').fetchall()
-    conn.close()
-    return jsonify([dict(cliente) for cliente in clientes])
+    return responder_listado(conn, 'SELECT * FROM clientes', [('id', 'id')], 'clientes')
 
 @app.route('/api/clientes/<int:id>', methods=['GET'])
+@etag_por_tablas('clientes')
 def get_cliente(id):
     conn = get_db_connection()
     cliente = conn.execute('SELECT * FROM clientes WHERE id = ?', (id,)).fetchone()
-    conn.close()
     return jsonify(dict(cliente)) if cliente else ('', 404)
 
 @app.route('/api/clientes', methods=['POST'])
+@idempotente
 def agregar_cliente():
     data = request.json
     conn = get_db_connection()
-    conn.execute('INSERT INTO clientes (nombre, email, telefono, direccion, notas) VALUES (?, ?, ?, ?, ?)',
-                 (data['nombre'], data.get('email', ''), data.get('telefono', ''), 
-                  data.get('direccion', ''), data.get('notas', '')))
+    cursor = conn.execute('INSERT INTO clientes (nombre, email, telefono, direccion, notas) VALUES (?, ?, ?, ?, ?)',
+                          (data['nombre'], data.get('email', ''), data.get('telefono', ''), 
+                           data.get('direccion', ''), data.get('notas', '')))
     conn.commit()
-    conn.close()
-    return jsonify({'mensaje': 'Cliente agregado'}), 201
+    INDICES_AUTOCOMPLETADO['clientes'].registrar_cambio(conn, cursor.lastrowid, data['nombre'])
+    return jsonify({'mensaje': 'Cliente agregado', 'id': cursor.lastrowid}), 201
 
 @app.route('/api/clientes/<int:id>', methods=['PUT'])
 def actualizar_cliente(id):
@@ -177,7 +770,7 @@ def actualizar_cliente(id):
                  (data['nombre'], data.get('email', ''), data.get('telefono', ''), 
                   data.get('direccion', ''), data.get('notas', ''), id))
     conn.commit()
-    conn.close()
+    INDICES_AUTOCOMPLETADO['clientes'].registrar_cambio(conn, id, data['nombre'])
     return jsonify({'mensaje': 'Cliente actualizado'})
 
 @app.route('/api/clientes/<int:id>', methods=['DELETE'])
@@ -185,66 +778,169 @@ def eliminar_cliente(id):
     conn = get_db_connection()
     conn.execute('DELETE FROM clientes WHERE id = ?', (id,))
     conn.commit()
-    conn.close()
+    INDICES_AUTOCOMPLETADO['clientes'].registrar_cambio(conn, id)
     return jsonify({'mensaje': 'Cliente eliminado'})
 
+# -------------------- IMPORTACIÓN MASIVA --------------------
+@app.route('/api/importar/<tabla>', methods=['POST'])
+def importar_datos(tabla):
+    """
+    Importar clientes o productos desde un CSV, subido como multipart en el
+    campo 'archivo' o enviado como cuerpo text/csv. El archivo se lee en
+    streaming y se guarda en lotes; la respuesta trae los errores por fila.
+    Si la lectura se corta a mitad del archivo responde 207 con lo que ya se
+    insertó (400 si no se insertó nada).
+    """
+    if tabla not in IMPORTADORES:
+        return jsonify({'error': f'No se puede importar {tabla}, use clientes o productos'}), 404
+
+    archivo = request.files.get('archivo')
+    flujo = archivo.stream if archivo else request.stream
+    try:
+        tamano_lote = max(1, int(request.args.get('lote', TAMANO_LOTE)))
+    except ValueError:
+        tamano_lote = TAMANO_LOTE
+
+    conn = get_db_connection()
+    try:
+        texto = io.TextIOWrapper(flujo, encoding='utf-8-sig', newline='')
+        resumen = importar_csv(conn, tabla, texto, tamano_lote)
+    except UnicodeDecodeError:
+        return jsonify({'error': 'El archivo debe estar codificado en UTF-8'}), 400
+    except (ValueError, csv.Error) as e:
+        return jsonify({'error': str(e)}), 400
+
+    if tabla == 'productos':
+        catalogo_cache.invalidar()
+    if resumen.get('error'):
+        # Con lotes ya confirmados la importación quedó a medias: 207 con lo insertado
+        return jsonify(resumen), 207 if resumen['insertados'] else 400
+    return jsonify(resumen), 201 if resumen['insertados'] else 200
+
 # -------------------- RUTAS PARA PEDIDOS --------------------
+def cargar_productos_pedidos(conn, pedido_ids):
+    """
+    Cargar los productos de varios pedidos en una sola consulta.
+    Devuelve {pedido_id: [productos]}; los ids se pasan como un arreglo JSON
+    para no chocar con el límite de parámetros de SQLite. Nombre, precio y
+    tipo salen del catálogo en memoria, sin join con productos.
+    """
+    productos_por_pedido = {pedido_id: [] for pedido_id in pedido_ids}
+    if not productos_por_pedido:
+        return productos_por_pedido
+    
+    catalogo = catalogo_productos(conn)
+    filas = conn.execute('''
+        SELECT pp.pedido_id, pp.producto_id, pp.cantidad
+        FROM pedido_productos pp
+        WHERE pp.pedido_id IN (SELECT value FROM json_each(?))
+        ORDER BY pp.pedido_id, pp.id
+    ''', (json.dumps(list(productos_por_pedido)),)).fetchall()
+    
+    for fila in filas:
+        producto = catalogo.get(fila['producto_id'])
+        if producto is None:
+            continue
+        productos_por_pedido[fila['pedido_id']].append({
+            'cantidad': fila['cantidad'],
+            'nombre': producto['nombre'],
+            'precio': producto['precio'],
+            'tipo': producto['tipo']
+        })
+    return productos_por_pedido
+
+def lineas_pedido(productos):
+    """
+    [(producto_id, cantidad)] de los productos recibidos en el JSON, con la
+    cantidad convertida a entero. Lanza ValueError si alguna no es positiva
+    y TypeError/ValueError si no es un número.
+    """
+    lineas = []
+    for linea in productos:
+        cantidad = int(linea.get('cantidad', 1))
+        if cantidad <= 0:
+            raise ValueError(f'Cantidad inválida: {cantidad}')
+        lineas.append((linea['producto_id'], cantidad))
+    return lineas
+
+def totales_pedido(conn, lineas):
+    """
+    (subtotal, item_count) de las líneas de un pedido con los precios del
+    catálogo; la misma cuenta que hace recalcular_totales_pedidos en SQL.
+    Lanza KeyError con el id si un producto no existe.
+    """
+    subtotal = 0
+    item_count = 0
+    for producto_id, cantidad in lineas:
+        producto = producto_del_catalogo(conn, producto_id)
+        if producto is None:
+            raise KeyError(producto_id)
+        subtotal += producto['precio'] * cantidad
+        item_count += cantidad
+    return subtotal, item_count
+
+def agregar_productos_a_pedidos(conn, pedidos):
+    """Convertir filas de pedidos en dicts con sus productos (una consulta por lote)"""
+    productos_por_pedido = cargar_productos_pedidos(conn, [pedido['id'] for pedido in pedidos])
+    pedidos_con_productos = []
+    for pedido in pedidos:
+        pedido_dict = dict(pedido)
+        pedido_dict['productos'] = productos_por_pedido[pedido['id']]
+        pedidos_con_productos.append(pedido_dict)
+    return pedidos_con_productos
+
 @app.route('/api/pedidos', methods=['GET'])
+@etag_por_tablas('pedidos', 'pedido_productos', 'productos', 'clientes')
 def get_pedidos():
     conn = get_db_connection()
-    pedidos = conn.execute('''
+    return responder_listado(conn, '''
         SELECT p.*, c.nombre as cliente_nombre 
         FROM pedidos p 
         LEFT JOIN clientes c ON p.cliente_id = c.id
-    ''').fetchall()
-    
-    # Obtener productos para cada pedido
-    pedidos_con_productos = []
-    for pedido in pedidos:
-        pedido_dict = dict(pedido)
-        productos = conn.execute('''
-            SELECT pp.cantidad, pr.nombre, pr.precio, pr.tipo
-            FROM pedido_productos pp
-            JOIN productos pr ON pp.producto_id = pr.id
-            WHERE pp.pedido_id = ?
-        ''', (pedido['id'],)).fetchall()
-        pedido_dict['productos'] = [dict(producto) for producto in productos]
-        pedidos_con_productos.append(pedido_dict)
-    
-    conn.close()
-    return jsonify(pedidos_con_productos)
+    ''', [('p.id', 'id')], 'pedidos', lambda pedidos: agregar_productos_a_pedidos(conn, pedidos))
 
 @app.route('/api/pedidos', methods=['POST'])
+@idempotente
 def crear_pedido():
     data = request.json
     conn = get_db_connection()
     
-    # Crear el pedido
+    try:
+        lineas = lineas_pedido(data.get('productos', []))
+        subtotal, item_count = totales_pedido(conn, lineas)
+    except (TypeError, ValueError):
+        return jsonify({'error': 'Las cantidades deben ser números enteros positivos'}), 400
+    except KeyError as e:
+        return jsonify({'error': f'Producto no encontrado: {e.args[0]}'}), 404
+    
+    # Crear el pedido, con sus totales en la misma transacción que sus productos
     cursor = conn.cursor()
     cursor.execute('''
-        INSERT INTO pedidos (cliente_id, fecha, encargado_principal, pago_realizado, notas, estado) 
-        VALUES (?, ?, ?, ?, ?, ?)
+        INSERT INTO pedidos (cliente_id, fecha, encargado_principal, pago_realizado, notas, estado,
+                             subtotal, item_count, total) 
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
     ''', (
         data.get('cliente_id'),
         data.get('fecha', datetime.now().strftime("%Y-%m-%d %H:%M:%S")),
         data.get('encargado_principal', ''),
         data.get('pago_realizado', False),
         data.get('notas', ''),
-        data.get('estado', 'pendiente')
+        data.get('estado', 'pendiente'),
+        subtotal,
+        item_count,
+        subtotal
     ))
     
     pedido_id = cursor.lastrowid
     
     # Agregar productos al pedido
-    if 'productos' in data:
-        for producto in data['productos']:
-            cursor.execute('''
-                INSERT INTO pedido_productos (pedido_id, producto_id, cantidad) 
-                VALUES (?, ?, ?)
-            ''', (pedido_id, producto['producto_id'], producto.get('cantidad', 1)))
+    for producto_id, cantidad in lineas:
+        cursor.execute('''
+            INSERT INTO pedido_productos (pedido_id, producto_id, cantidad) 
+            VALUES (?, ?, ?)
+        ''', (pedido_id, producto_id, cantidad))
     
     conn.commit()
-    conn.close()
     return jsonify({'mensaje': 'Pedido creado', 'id': pedido_id}), 201
 
 @app.route('/api/pedidos/<int:id>', methods=['PUT'])
@@ -252,6 +948,15 @@ def actualizar_pedido(id):
     data = request.json
     conn = get_db_connection()
     
+    if 'productos' in data:
+        try:
+            lineas = lineas_pedido(data['productos'])
+            subtotal, item_count = totales_pedido(conn, lineas)
+        except (TypeError, ValueError):
+            return jsonify({'error': 'Las cantidades deben ser números enteros positivos'}), 400
+        except KeyError as e:
+            return jsonify({'error': f'Producto no encontrado: {e.args[0]}'}), 404
+    
     # Actualizar el pedido principal
     conn.execute('''
         UPDATE pedidos 
@@ -272,14 +977,15 @@ def actualizar_pedido(id):
         # Eliminar productos existentes
         conn.execute('DELETE FROM pedido_productos WHERE pedido_id = ?', (id,))
         # Agregar nuevos productos
-        for producto in data['productos']:
+        for producto_id, cantidad in lineas:
             conn.execute('''
                 INSERT INTO pedido_productos (pedido_id, producto_id, cantidad) 
                 VALUES (?, ?, ?)
-            ''', (id, producto['producto_id'], producto.get('cantidad', 1)))
+            ''', (id, producto_id, cantidad))
+        conn.execute('UPDATE pedidos SET subtotal = ?, item_count = ?, total = ? WHERE id = ?',
+                     (subtotal, item_count, subtotal, id))
     
     conn.commit()
-    conn.close()
     return jsonify({'mensaje': 'Pedido actualizado'})
 
 @app.route('/api/pedidos/<int:id>/estado', methods=['PUT'])
@@ -288,7 +994,6 @@ def actualizar_estado_pedido(id):
     conn = get_db_connection()
     conn.execute('UPDATE pedidos SET estado = ? WHERE id = ?', (data['estado'], id))
     conn.commit()
-    conn.close()
     return jsonify({'mensaje': 'Estado del pedido actualizado'})
 
 @app.route('/api/pedidos/<int:id>/pago', methods=['PUT'])
@@ -297,7 +1002,6 @@ def actualizar_pago_pedido(id):
     conn = get_db_connection()
     conn.execute('UPDATE pedidos SET pago_realizado = ? WHERE id = ?', (data['pago_realizado'], id))
     conn.commit()
-    conn.close()
     return jsonify({'mensaje': 'Estado de pago actualizado'})
 
 @app.route('/api/pedidos/<int:id>', methods=['DELETE'])
@@ -308,10 +1012,10 @@ def eliminar_pedido(id):
     # Eliminar el pedido
     conn.execute('DELETE FROM pedidos WHERE id = ?', (id,))
     conn.commit()
-    conn.close()
     return jsonify({'mensaje': 'Pedido eliminado'})
 
 @app.route('/api/pedidos/pendientes', methods=['GET'])
+@etag_por_tablas('pedidos', 'clientes', 'ventas')
 def get_pedidos_pendientes():
     """Obtener pedidos que no tienen venta asociada y están listos para facturar"""
     conn = get_db_connection()
@@ -324,14 +1028,14 @@ def get_pedidos_pendientes():
         AND p.estado = 'completado'
         ORDER BY p.fecha DESC
     ''').fetchall()
-    conn.close()
     return jsonify([dict(pedido) for pedido in pedidos])
 
 # -------------------- RUTAS PARA VENTAS --------------------
 @app.route('/api/ventas', methods=['GET'])
+@etag_por_tablas('ventas', 'clientes', 'productos', 'pedidos')
 def get_ventas():
     conn = get_db_connection()
-    ventas = conn.execute('''
+    return responder_listado(conn, '''
         SELECT v.*, 
                c.nombre as cliente_nombre, 
                p.nombre as producto_nombre,
@@ -340,12 +1044,48 @@ def get_ventas():
         LEFT JOIN clientes c ON v.cliente_id = c.id
         LEFT JOIN productos p ON v.producto_id = p.id
         LEFT JOIN pedidos ped ON v.pedido_id = ped.id
-        ORDER BY v.id DESC
-    ''').fetchall()
-    conn.close()
-    return jsonify([dict(venta) for venta in ventas])
+    ''', [('v.id', 'id')], 'ventas', descendente=True)
+
+def lineas_venta_pedido(conn, pedido):
+    """
+    Líneas (producto_id, tipo, precio_unitario, cantidad, total) de una venta
+    hecha desde un pedido. El total guardado en el pedido se reparte entre
+    sus productos: los pedidos importados según el monto de cada línea en el
+    archivo (assigned_payment) y los demás según su valor en el catálogo, así
+    la suma de las líneas es siempre el total de la venta aunque los precios
+    hayan cambiado desde el pedido. Lanza KeyError con el id si un producto
+    ya no existe.
+    """
+    catalogo = catalogo_productos(conn)
+    importado = conn.execute('SELECT 1 FROM importacion_pedidos WHERE pedido_id = ?',
+                             (pedido['id'],)).fetchone() is not None
+    filas = conn.execute(
+        'SELECT producto_id, cantidad, assigned_payment FROM pedido_productos WHERE pedido_id = ? ORDER BY id',
+        (pedido['id'],)).fetchall()
+    pesos = []
+    for fila in filas:
+        producto = catalogo.get(fila['producto_id'])
+        if producto is None:
+            raise KeyError(fila['producto_id'])
+        pesos.append((fila['assigned_payment'] or 0) if importado else producto['precio'] * fila['cantidad'])
+    if filas and not sum(pesos):
+        pesos = [fila['cantidad'] or 1 for fila in filas]
+
+    total = pedido['total'] or 0
+    suma_pesos = sum(pesos)
+    lineas = []
+    asignado = 0
+    for i, (fila, peso) in enumerate(zip(filas, pesos)):
+        # La última línea se lleva el redondeo
+        monto = round(total - asignado, 2) if i == len(filas) - 1 else round(total * peso / suma_pesos, 2)
+        asignado += monto
+        cantidad = fila['cantidad']
+        lineas.append((fila['producto_id'], catalogo[fila['producto_id']]['tipo'].upper(),
+                       monto / cantidad if cantidad else monto, cantidad, monto))
+    return lineas
 
 @app.route('/api/ventas', methods=['POST'])
+@idempotente
 def registrar_venta():
     data = request.json
     conn = get_db_connection()
@@ -357,35 +1097,31 @@ def registrar_venta():
         if pedido_id:
             pedido = cursor.execute('SELECT * FROM pedidos WHERE id = ?', (pedido_id,)).fetchone()
             if not pedido:
-                conn.close()
                 return jsonify({'error': 'Pedido no encontrado'}), 404
             
             # Usar datos del pedido
             cliente_id = pedido['cliente_id']
-            # Para el total, usar el monto del pedido o calcular desde productos
-            productos_pedido = cursor.execute('''
-                SELECT pp.cantidad, p.precio 
-                FROM pedido_productos pp 
-                JOIN productos p ON pp.producto_id = p.id 
-                WHERE pp.pedido_id = ?
-            ''', (pedido_id,)).fetchall()
-            
-            total = sum(prod['cantidad'] * prod['precio'] for prod in productos_pedido)
+            # El total ya está guardado en el pedido; las líneas lo reparten
+            total = pedido['total']
+            try:
+                lineas = lineas_venta_pedido(conn, pedido)
+            except KeyError as e:
+                return jsonify({'error': f'El pedido tiene un producto que ya no existe: {e.args[0]}'}), 409
         else:
             # Método tradicional - calcular desde producto individual
-            producto = cursor.execute('SELECT precio FROM productos WHERE id = ?', 
-                                   (data['producto_id'],)).fetchone()
+            producto = producto_del_catalogo(conn, data['producto_id'])
             if not producto:
-                conn.close()
                 return jsonify({'error': 'Producto no encontrado'}), 404
             
             total = producto['precio'] * data['cantidad']
             cliente_id = data.get('cliente_id')
+            lineas = [(producto['id'], producto['tipo'].upper(), producto['precio'], data['cantidad'], total)]
         
         # Determinar estado de pago
         estado_pago = data.get('estado_pago', 'pendiente')  # Default pendiente
         
         # Crear la venta
+        fecha = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         cursor.execute('''
             INSERT INTO ventas (cliente_id, producto_id, cantidad, total, fecha, pedido_id, estado_pago) 
             VALUES (?, ?, ?, ?, ?, ?, ?)
@@ -394,16 +1130,23 @@ def registrar_venta():
             data.get('producto_id'),  # Puede ser None si viene de pedido con múltiples productos
             data.get('cantidad', 1), 
             total, 
-            datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            fecha,
             pedido_id,
             estado_pago
         ))
         
         venta_id = cursor.lastrowid
         
+        # Líneas de la venta: su suma es el total de la venta
+        cursor.executemany('''
+            INSERT INTO venta_items (venta_id, producto_id, tipo, precio_unitario, cantidad, total, fecha)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', [(venta_id, *linea, fecha) for linea in lineas])
+        acumular_ventas_diarias(conn, [venta_id])
+        
         # Si la venta está pendiente de pago, crear cuenta por cobrar automáticamente
         if estado_pago == 'pendiente':
-            numero_factura = f"FAC-{venta_id:04d}"
+            numero_factura = siguiente_codigo(conn, 'FAC')
             fecha_vencimiento = datetime.now().date() + timedelta(days=30)  # 30 días para pagar
             
             cursor.execute('''
@@ -426,7 +1169,6 @@ def registrar_venta():
             cursor.execute('UPDATE pedidos SET estado_pago = ? WHERE id = ?', ('pagado', pedido_id))
         
         conn.commit()
-        conn.close()
         return jsonify({
             'mensaje': 'Venta registrada',
             'venta_id': venta_id,
@@ -435,59 +1177,56 @@ def registrar_venta():
         
     except Exception as e:
         conn.rollback()
-        conn.close()
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/ventas/<int:id>', methods=['DELETE'])
 def eliminar_venta(id):
     conn = get_db_connection()
+    # El resumen diario se descuenta antes de que el trigger borre las líneas
+    acumular_ventas_diarias(conn, [id], -1)
     conn.execute('DELETE FROM ventas WHERE id = ?', (id,))
     conn.commit()
-    conn.close()
     return jsonify({'mensaje': 'Venta eliminada'})
 
 # -------------------- RUTAS PARA CUENTAS POR COBRAR --------------------
+def calcular_vencimiento(cuenta):
+    """Convertir una fila de cuenta en dict con días vencidos y estado al día"""
+    cuenta_dict = dict(cuenta)
+    
+    # Calcular días vencidos
+    if cuenta['fecha_vencimiento']:
+        try:
+            fecha_venc = datetime.strptime(cuenta['fecha_vencimiento'], '%Y-%m-%d').date()
+            dias_diff = (datetime.now().date() - fecha_venc).days
+            cuenta_dict['dias_vencido'] = max(0, dias_diff)
+            
+            # Actualizar estado según días vencidos
+            if cuenta_dict['estado'] == 'pendiente' and dias_diff > 0:
+                cuenta_dict['estado'] = 'vencido'
+            elif cuenta_dict['estado'] == 'vencido' and dias_diff <= 0:
+                cuenta_dict['estado'] = 'pendiente'
+        except:
+            cuenta_dict['dias_vencido'] = 0
+    
+    return cuenta_dict
+
 @app.route('/api/cuentas-por-cobrar', methods=['GET'])
+@etag_por_tablas('cuentas_por_cobrar', 'clientes', 'pedidos', por_dia=True)
 def get_cuentas_por_cobrar():
     conn = get_db_connection()
-    cuentas = conn.execute('''
+    return responder_listado(conn, '''
         SELECT c.*, 
                cl.nombre as cliente_nombre,
                p.id as pedido_numero
         FROM cuentas_por_cobrar c
         LEFT JOIN clientes cl ON c.cliente_id = cl.id
         LEFT JOIN pedidos p ON c.pedido_id = p.id
-        ORDER BY c.fecha_vencimiento ASC
-    ''').fetchall()
-    
-    # Calcular días vencidos para cada cuenta
-    cuentas_con_datos = []
-    for cuenta in cuentas:
-        cuenta_dict = dict(cuenta)
-        
-        # Calcular días vencidos
-        from datetime import datetime, date
-        if cuenta['fecha_vencimiento']:
-            try:
-                fecha_venc = datetime.strptime(cuenta['fecha_vencimiento'], '%Y-%m-%d').date()
-                hoy = date.today()
-                dias_diff = (hoy - fecha_venc).days
-                cuenta_dict['dias_vencido'] = max(0, dias_diff)
-                
-                # Actualizar estado según días vencidos
-                if cuenta_dict['estado'] == 'pendiente' and dias_diff > 0:
-                    cuenta_dict['estado'] = 'vencido'
-                elif cuenta_dict['estado'] == 'vencido' and dias_diff <= 0:
-                    cuenta_dict['estado'] = 'pendiente'
-            except:
-                cuenta_dict['dias_vencido'] = 0
-        
-        cuentas_con_datos.append(cuenta_dict)
-    
-    conn.close()
-    return jsonify(cuentas_con_datos)
+    ''', [('c.fecha_vencimiento', 'fecha_vencimiento'), ('c.id', 'id')], 'cuentas_por_cobrar',
+        lambda cuentas: [calcular_vencimiento(cuenta) for cuenta in cuentas],
+        calcular_stats=calcular_stats_cuentas_por_cobrar)
 
 @app.route('/api/cuentas-por-cobrar', methods=['POST'])
+@idempotente
 def crear_cuenta_por_cobrar():
     data = request.json
     conn = get_db_connection()
@@ -500,25 +1239,35 @@ def crear_cuenta_por_cobrar():
     # Determinar estado inicial
     estado = 'pagado' if saldo <= 0 else data.get('estado', 'pendiente')
     
-    conn.execute('''
-        INSERT INTO cuentas_por_cobrar 
-        (numero_factura, cliente_id, pedido_id, monto, monto_pagado, saldo, 
-         fecha_vencimiento, estado, notas) 
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-    ''', (
-        data['numero_factura'],
-        data['cliente_id'],
-        data.get('pedido_id'),
-        monto,
-        monto_pagado,
-        saldo,
-        data['fecha_vencimiento'],
-        estado,
-        data.get('notas', '')
-    ))
+    # Sin número explícito se toma el siguiente de la serie FAC
+    numero_factura = data.get('numero_factura')
+    if numero_factura:
+        registrar_codigo_manual(conn, 'FAC', numero_factura)
+    else:
+        numero_factura = siguiente_codigo(conn, 'FAC')
+    
+    try:
+        cursor = conn.execute('''
+            INSERT INTO cuentas_por_cobrar 
+            (numero_factura, cliente_id, pedido_id, monto, monto_pagado, saldo, 
+             fecha_vencimiento, estado, notas) 
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (
+            numero_factura,
+            data['cliente_id'],
+            data.get('pedido_id'),
+            monto,
+            monto_pagado,
+            saldo,
+            data['fecha_vencimiento'],
+            estado,
+            data.get('notas', '')
+        ))
+    except sqlite3.IntegrityError as e:
+        conn.rollback()
+        return jsonify({'error': f'No se pudo crear la cuenta por cobrar: {e}'}), 409
     conn.commit()
-    conn.close()
-    return jsonify({'mensaje': 'Cuenta por cobrar creada'}), 201
+    return jsonify({'mensaje': 'Cuenta por cobrar creada', 'id': cursor.lastrowid, 'numero_factura': numero_factura}), 201
 
 @app.route('/api/cuentas-por-cobrar/<int:id>', methods=['PUT'])
 def actualizar_cuenta_por_cobrar(id):
@@ -530,7 +1279,6 @@ def actualizar_cuenta_por_cobrar(id):
         # Obtener datos actuales
         cuenta_actual = conn.execute('SELECT * FROM cuentas_por_cobrar WHERE id = ?', (id,)).fetchone()
         if not cuenta_actual:
-            conn.close()
             return jsonify({'error': 'Cuenta no encontrada'}), 404
         
         # Calcular nuevo saldo
@@ -553,19 +1301,23 @@ def actualizar_cuenta_por_cobrar(id):
         saldo = monto - monto_pagado
         estado = 'pagado' if saldo <= 0 else data.get('estado', 'pendiente')
         
-        conn.execute('''
-            UPDATE cuentas_por_cobrar 
-            SET numero_factura = ?, cliente_id = ?, pedido_id = ?, monto = ?, 
-                monto_pagado = ?, saldo = ?, fecha_vencimiento = ?, estado = ?, notas = ?
-            WHERE id = ?
-        ''', (
-            data['numero_factura'], data['cliente_id'], data.get('pedido_id'),
-            monto, monto_pagado, saldo, data['fecha_vencimiento'], estado,
-            data.get('notas', ''), id
-        ))
+        registrar_codigo_manual(conn, 'FAC', data['numero_factura'])
+        try:
+            conn.execute('''
+                UPDATE cuentas_por_cobrar 
+                SET numero_factura = ?, cliente_id = ?, pedido_id = ?, monto = ?, 
+                    monto_pagado = ?, saldo = ?, fecha_vencimiento = ?, estado = ?, notas = ?
+                WHERE id = ?
+            ''', (
+                data['numero_factura'], data['cliente_id'], data.get('pedido_id'),
+                monto, monto_pagado, saldo, data['fecha_vencimiento'], estado,
+                data.get('notas', ''), id
+            ))
+        except sqlite3.IntegrityError as e:
+            conn.rollback()
+            return jsonify({'error': f'No se pudo actualizar la cuenta por cobrar: {e}'}), 409
     
     conn.commit()
-    conn.close()
     return jsonify({'mensaje': 'Cuenta por cobrar actualizada'})
 
 @app.route('/api/cuentas-por-cobrar/<int:id>', methods=['DELETE'])
@@ -573,37 +1325,31 @@ def eliminar_cuenta_por_cobrar(id):
     conn = get_db_connection()
     conn.execute('DELETE FROM cuentas_por_cobrar WHERE id = ?', (id,))
     conn.commit()
-    conn.close()
     return jsonify({'mensaje': 'Cuenta por cobrar eliminada'})
 
+def calcular_stats_cuentas_por_cobrar(conn):
+    """Estadísticas de cuentas por cobrar en una sola pasada (agregación condicional)"""
+    fila = conn.execute('''
+        SELECT 
+            SUM(CASE WHEN estado != 'pagado' THEN saldo END) as total_por_cobrar,
+            COUNT(CASE WHEN estado = 'pendiente' THEN 1 END) as facturas_pendientes,
+            COUNT(CASE WHEN estado = 'vencido' THEN 1 END) as facturas_vencidas,
+            COUNT(*) as total_facturas
+        FROM cuentas_por_cobrar
+    ''').fetchone()
+    
+    return {
+        'total_por_cobrar': fila['total_por_cobrar'] or 0,
+        'facturas_pendientes': fila['facturas_pendientes'],
+        'facturas_vencidas': fila['facturas_vencidas'],
+        'total_facturas': fila['total_facturas']
+    }
+
 @app.route('/api/cuentas-por-cobrar/stats', methods=['GET'])
+@etag_por_tablas('cuentas_por_cobrar')
 def estadisticas_cuentas_por_cobrar():
     conn = get_db_connection()
-    
-    # Total por cobrar
-    total_result = conn.execute('SELECT SUM(saldo) FROM cuentas_por_cobrar WHERE estado != "pagado"').fetchone()
-    total_por_cobrar = total_result[0] or 0
-    
-    # Facturas pendientes
-    pendientes_result = conn.execute('SELECT COUNT(*) FROM cuentas_por_cobrar WHERE estado = "pendiente"').fetchone()
-    facturas_pendientes = pendientes_result[0] or 0
-    
-    # Facturas vencidas
-    vencidas_result = conn.execute('SELECT COUNT(*) FROM cuentas_por_cobrar WHERE estado = "vencido"').fetchone()
-    facturas_vencidas = vencidas_result[0] or 0
-    
-    # Total de facturas
-    total_facturas_result = conn.execute('SELECT COUNT(*) FROM cuentas_por_cobrar').fetchone()
-    total_facturas = total_facturas_result[0] or 0
-    
-    conn.close()
-    
-    return jsonify({
-        'total_por_cobrar': total_por_cobrar,
-        'facturas_pendientes': facturas_pendientes,
-        'facturas_vencidas': facturas_vencidas,
-        'total_facturas': total_facturas
-    })
+    return jsonify(calcular_stats_cuentas_por_cobrar(conn))
 
 @app.route('/api/cuentas-por-cobrar/<int:id>/marcar-pagado', methods=['PUT'])
 def marcar_cuenta_como_pagada(id):
@@ -614,7 +1360,6 @@ def marcar_cuenta_como_pagada(id):
         # Obtener cuenta actual
         cuenta = cursor.execute('SELECT * FROM cuentas_por_cobrar WHERE id = ?', (id,)).fetchone()
         if not cuenta:
-            conn.close()
             return jsonify({'error': 'Cuenta no encontrada'}), 404
         
         # Marcar cuenta como completamente pagada
@@ -641,7 +1386,6 @@ def marcar_cuenta_como_pagada(id):
             ''', (cuenta['pedido_id'],))
         
         conn.commit()
-        conn.close()
         return jsonify({
             'mensaje': 'Cuenta marcada como pagada',
             'venta_actualizada': bool(cuenta['venta_id']),
@@ -650,47 +1394,22 @@ def marcar_cuenta_como_pagada(id):
         
     except Exception as e:
         conn.rollback()
-        conn.close()
         return jsonify({'error': str(e)}), 500
 
 # -------------------- RUTAS PARA CUENTAS POR PAGAR --------------------
 @app.route('/api/cuentas-por-pagar', methods=['GET'])
+@etag_por_tablas('cuentas_por_pagar', por_dia=True)
 def get_cuentas_por_pagar():
     conn = get_db_connection()
-    cuentas = conn.execute('''
+    return responder_listado(conn, '''
         SELECT *
         FROM cuentas_por_pagar
-        ORDER BY fecha_vencimiento ASC
-    ''').fetchall()
-    
-    # Calcular días vencidos para cada cuenta
-    cuentas_con_datos = []
-    for cuenta in cuentas:
-        cuenta_dict = dict(cuenta)
-        
-        # Calcular días vencidos
-        from datetime import datetime, date
-        if cuenta['fecha_vencimiento']:
-            try:
-                fecha_venc = datetime.strptime(cuenta['fecha_vencimiento'], '%Y-%m-%d').date()
-                hoy = date.today()
-                dias_diff = (hoy - fecha_venc).days
-                cuenta_dict['dias_vencido'] = max(0, dias_diff)
-                
-                # Actualizar estado según días vencidos
-                if cuenta_dict['estado'] == 'pendiente' and dias_diff > 0:
-                    cuenta_dict['estado'] = 'vencido'
-                elif cuenta_dict['estado'] == 'vencido' and dias_diff <= 0:
-                    cuenta_dict['estado'] = 'pendiente'
-            except:
-                cuenta_dict['dias_vencido'] = 0
-        
-        cuentas_con_datos.append(cuenta_dict)
-    
-    conn.close()
-    return jsonify(cuentas_con_datos)
+    ''', [('fecha_vencimiento', 'fecha_vencimiento'), ('id', 'id')], 'cuentas_por_pagar',
+        lambda cuentas: [calcular_vencimiento(cuenta) for cuenta in cuentas],
+        calcular_stats=calcular_stats_cuentas_por_pagar)
 
 @app.route('/api/cuentas-por-pagar', methods=['POST'])
+@idempotente
 def crear_cuenta_por_pagar():
     data = request.json
     conn = get_db_connection()
@@ -698,23 +1417,7 @@ def crear_cuenta_por_pagar():
     
     try:
         # Auto-generar codigo_factura: BILL001, BILL002, etc
-        ultimo_codigo = cursor.execute('''
-            SELECT codigo_factura FROM cuentas_por_pagar 
-            WHERE codigo_factura LIKE 'BILL%' 
-            ORDER BY id DESC LIMIT 1
-        ''').fetchone()
-        
-        if ultimo_codigo:
-            # Extraer numero y sumar 1
-            numero_str = ultimo_codigo[0].replace('BILL', '')
-            try:
-                numero = int(numero_str) + 1
-            except:
-                numero = 1
-        else:
-            numero = 1
-        
-        codigo_factura = f"BILL{numero:03d}"
+        codigo_factura = siguiente_codigo(conn, 'BILL')
         
         # Calcular saldo inicial (monto - monto_pagado)
         monto = data['monto']
@@ -741,15 +1444,14 @@ def crear_cuenta_por_pagar():
         ))
         
         conn.commit()
-        conn.close()
         return jsonify({
             'mensaje': 'Cuenta por pagar creada',
+            'id': cursor.lastrowid,
             'codigo_factura': codigo_factura
         }), 201
         
     except Exception as e:
         conn.rollback()
-        conn.close()
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/cuentas-por-pagar/<int:id>', methods=['PUT'])
@@ -764,7 +1466,6 @@ def actualizar_cuenta_por_pagar(id):
             # Obtener datos actuales
             cuenta_actual = cursor.execute('SELECT * FROM cuentas_por_pagar WHERE id = ?', (id,)).fetchone()
             if not cuenta_actual:
-                conn.close()
                 return jsonify({'error': 'Cuenta no encontrada'}), 404
             
             # Calcular nuevo saldo
@@ -800,12 +1501,10 @@ def actualizar_cuenta_por_pagar(id):
             ))
         
         conn.commit()
-        conn.close()
         return jsonify({'mensaje': 'Cuenta por pagar actualizada'})
         
     except Exception as e:
         conn.rollback()
-        conn.close()
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/cuentas-por-pagar/<int:id>', methods=['DELETE'])
@@ -813,47 +1512,37 @@ def eliminar_cuenta_por_pagar(id):
     conn = get_db_connection()
     conn.execute('DELETE FROM cuentas_por_pagar WHERE id = ?', (id,))
     conn.commit()
-    conn.close()
     return jsonify({'mensaje': 'Cuenta por pagar eliminada'})
 
+def calcular_stats_cuentas_por_pagar(conn):
+    """Estadísticas de cuentas por pagar en una sola pasada (agregación condicional)"""
+    # Próximas a vencer (7 días)
+    fecha_limite = (datetime.now().date() + timedelta(days=7)).strftime('%Y-%m-%d')
+    fila = conn.execute('''
+        SELECT 
+            SUM(CASE WHEN estado != 'pagado' THEN saldo END) as total_por_pagar,
+            COUNT(CASE WHEN estado = 'pendiente' THEN 1 END) as facturas_pendientes,
+            COUNT(CASE WHEN estado = 'vencido' THEN 1 END) as facturas_vencidas,
+            COUNT(CASE WHEN estado = 'pendiente' AND fecha_vencimiento <= ? THEN 1 END) as proximas_vencer
+        FROM cuentas_por_pagar
+    ''', (fecha_limite,)).fetchone()
+    
+    return {
+        'total_por_pagar': fila['total_por_pagar'] or 0,
+        'facturas_pendientes': fila['facturas_pendientes'],
+        'facturas_vencidas': fila['facturas_vencidas'],
+        'proximas_vencer': fila['proximas_vencer']
+    }
+
 @app.route('/api/cuentas-por-pagar/stats', methods=['GET'])
+@etag_por_tablas('cuentas_por_pagar', por_dia=True)
 def estadisticas_cuentas_por_pagar():
     conn = get_db_connection()
-    cursor = conn.cursor()
     
     try:
-        # Total por pagar
-        total_result = cursor.execute('SELECT SUM(saldo) FROM cuentas_por_pagar WHERE estado != "pagado"').fetchone()
-        total_por_pagar = total_result[0] or 0
-        
-        # Facturas pendientes
-        pendientes_result = cursor.execute('SELECT COUNT(*) FROM cuentas_por_pagar WHERE estado = "pendiente"').fetchone()
-        facturas_pendientes = pendientes_result[0] or 0
-        
-        # Facturas vencidas
-        vencidas_result = cursor.execute('SELECT COUNT(*) FROM cuentas_por_pagar WHERE estado = "vencido"').fetchone()
-        facturas_vencidas = vencidas_result[0] or 0
-        
-        # Próximas a vencer (7 días)
-        from datetime import date, timedelta
-        fecha_limite = (date.today() + timedelta(days=7)).strftime('%Y-%m-%d')
-        proximas_result = cursor.execute('''
-            SELECT COUNT(*) FROM cuentas_por_pagar 
-            WHERE estado = "pendiente" AND fecha_vencimiento <= ?
-        ''', (fecha_limite,)).fetchone()
-        proximas_vencer = proximas_result[0] or 0
-        
-        conn.close()
-        
-        return jsonify({
-            'total_por_pagar': total_por_pagar,
-            'facturas_pendientes': facturas_pendientes,
-            'facturas_vencidas': facturas_vencidas,
-            'proximas_vencer': proximas_vencer
-        })
+        return jsonify(calcular_stats_cuentas_por_pagar(conn))
         
     except Exception as e:
-        conn.close()
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/cuentas-por-pagar/<int:id>/marcar-pagado', methods=['PUT'])
@@ -865,7 +1554,6 @@ def marcar_cuenta_por_pagar_como_pagada(id):
         # Obtener cuenta actual
         cuenta = cursor.execute('SELECT * FROM cuentas_por_pagar WHERE id = ?', (id,)).fetchone()
         if not cuenta:
-            conn.close()
             return jsonify({'error': 'Cuenta no encontrada'}), 404
         
         # Marcar como completamente pagada
@@ -876,12 +1564,10 @@ def marcar_cuenta_por_pagar_como_pagada(id):
         ''', (datetime.now().strftime("%Y-%m-%d %H:%M:%S"), id))
         
         conn.commit()
-        conn.close()
         return jsonify({'mensaje': 'Cuenta marcada como pagada'})
         
     except Exception as e:
         conn.rollback()
-        conn.close()
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/cuentas-por-cobrar/all', methods=['DELETE'])
@@ -891,11 +1577,9 @@ def delete_all_receivables():
     try:
         conn.execute('DELETE FROM cuentas_por_cobrar')
         conn.commit()
-        conn.close()
         return jsonify({'mensaje': 'Todas las cuentas por cobrar han sido eliminadas'})
     except Exception as e:
         conn.rollback()
-        conn.close()
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/cuentas-por-pagar/all', methods=['DELETE'])
@@ -904,12 +1588,12 @@ def delete_all_payables():
     conn = get_db_connection()
     try:
         conn.execute('DELETE FROM cuentas_por_pagar')
+        # Sin cuentas la serie vuelve a empezar en BILL001, como antes
+        conn.execute("UPDATE contadores SET valor = 0 WHERE serie = 'BILL'")
         conn.commit()
-        conn.close()
         return jsonify({'mensaje': 'Todas las cuentas por pagar han sido eliminadas'})
     except Exception as e:
         conn.rollback()
-        conn.close()
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/restore-productos-originales', methods=['POST'])
@@ -948,7 +1632,7 @@ def restore_productos_originales():
         ''', productos_originales)
         
         conn.commit()
-        conn.close()
+        catalogo_cache.invalidar()
         
         return jsonify({
             'success': True,
@@ -961,7 +1645,6 @@ def restore_productos_originales():
     except Exception as e:
         if conn:
             conn.rollback()
-            conn.close()
         return jsonify({'error': f'Error al restaurar productos: {str(e)}'}), 500
 
 @app.route('/api/reset-database', methods=['POST'])
@@ -976,6 +1659,7 @@ def reset_database_for_production():
         
         # BORRAR TODOS LOS DATOS
         cursor.execute('DELETE FROM ventas')
+        cursor.execute('DELETE FROM ventas_diarias')
         cursor.execute('DELETE FROM pedido_productos')
         cursor.execute('DELETE FROM pedidos') 
         cursor.execute('DELETE FROM clientes')
@@ -991,6 +1675,7 @@ def reset_database_for_production():
         cursor.execute('DELETE FROM sqlite_sequence WHERE name="productos"')
         cursor.execute('DELETE FROM sqlite_sequence WHERE name="cuentas_por_cobrar"')
         cursor.execute('DELETE FROM sqlite_sequence WHERE name="cuentas_por_pagar"')
+        cursor.execute('UPDATE contadores SET valor = 0')
         
         # INSERTAR DATOS EJEMPLO PARA DEMO
         # Productos ejemplo
@@ -1012,7 +1697,7 @@ def reset_database_for_production():
         ''')
         
         conn.commit()
-        conn.close()
+        catalogo_cache.invalidar()
         
         return jsonify({
             'success': True,
@@ -1025,7 +1710,6 @@ def reset_database_for_production():
     except Exception as e:
         if conn:
             conn.rollback()
-            conn.close()
         return jsonify({'error': f'Error al resetear base de datos: {str(e)}'}), 500
 
 # -------------------- RUTA DE INICIALIZACIÓN --------------------
@@ -1071,7 +1755,6 @@ def reset_sequences():
             cursor.execute(f"DELETE FROM sqlite_sequence WHERE name='{table}'")
         
         conn.commit()
-        conn.close()
         
         result = {
             'mensaje': f'Secuencias reseteadas para: {", ".join(tables_to_reset) if tables_to_reset else "ninguna tabla"}',
@@ -1085,7 +1768,6 @@ def reset_sequences():
         return jsonify(result)
     
     except Exception as e:
-        conn.close()
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/reset-sequences/<string:table_name>', methods=['POST'])
@@ -1097,7 +1779,6 @@ def reset_single_sequence(table_name):
     # Validar nombre de tabla
     valid_tables = ['productos', 'clientes', 'pedidos', 'ventas', 'pedido_productos']
     if table_name not in valid_tables:
-        conn.close()
         return jsonify({'error': f'Tabla inválida. Tablas válidas: {", ".join(valid_tables)}'}), 400
     
     try:
@@ -1108,7 +1789,6 @@ def reset_single_sequence(table_name):
         count = cursor.execute(f'SELECT COUNT(*) FROM {table_name}').fetchone()[0]
         
         if count > 0 and not force:
-            conn.close()
             return jsonify({
                 'error': f'La tabla {table_name} tiene {count} registros. Usa force=true para forzar el reseteo.',
                 'registros': count
@@ -1117,7 +1797,6 @@ def reset_single_sequence(table_name):
         # Resetear la secuencia
         cursor.execute(f"DELETE FROM sqlite_sequence WHERE name='{table_name}'")
         conn.commit()
-        conn.close()
         
         return jsonify({
             'mensaje': f'Secuencia de {table_name} reseteada correctamente',
@@ -1127,7 +1806,6 @@ def reset_single_sequence(table_name):
         })
     
     except Exception as e:
-        conn.close()
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/sequences/status', methods=['GET'])
@@ -1154,57 +1832,39 @@ def get_sequences_status():
                 'necesita_reset': count == 0 and seq_value > 0
             })
         
-        conn.close()
         return jsonify({
             'secuencias': status,
             'tablas_vacias_con_secuencia': [s for s in status if s['necesita_reset']]
         })
     
     except Exception as e:
-        conn.close()
         return jsonify({'error': str(e)}), 500
 
 # -------------------- FUNCIONES HELPER PARA REPORTES --------------------
-def get_periodo_fechas(periodo):
-    """Calcula fechas de inicio y fin según el periodo solicitado"""
-    hoy = datetime.now()
-    
-    if periodo == 'semana':
-        inicio = hoy - timedelta(days=7)
-        fin = hoy
-        periodo_anterior_inicio = inicio - timedelta(days=7)
-        periodo_anterior_fin = inicio
-    elif periodo == 'mes':
-        inicio = hoy.replace(day=1)
-        fin = hoy
-        if inicio.month == 1:
-            periodo_anterior_inicio = inicio.replace(year=inicio.year-1, month=12, day=1)
-            periodo_anterior_fin = inicio.replace(year=inicio.year-1, month=12, day=31)
-        else:
-            periodo_anterior_inicio = inicio.replace(month=inicio.month-1, day=1)
-            if inicio.month-1 in [1,3,5,7,8,10,12]:
-                periodo_anterior_fin = inicio.replace(month=inicio.month-1, day=31)
-            elif inicio.month-1 in [4,6,9,11]:
-                periodo_anterior_fin = inicio.replace(month=inicio.month-1, day=30)
-            else:
-                periodo_anterior_fin = inicio.replace(month=inicio.month-1, day=28)
-    elif periodo == 'trimestre':
-        inicio = hoy - timedelta(days=90)
-        fin = hoy
-        periodo_anterior_inicio = inicio - timedelta(days=90)
-        periodo_anterior_fin = inicio
-    elif periodo == 'ano':
-        inicio = hoy.replace(month=1, day=1)
-        fin = hoy
-        periodo_anterior_inicio = inicio.replace(year=inicio.year-1)
-        periodo_anterior_fin = inicio.replace(year=inicio.year-1, month=12, day=31)
-    else:
-        inicio = hoy.replace(day=1)
-        fin = hoy
-        periodo_anterior_inicio = inicio.replace(month=inicio.month-1, day=1)
-        periodo_anterior_fin = inicio.replace(month=inicio.month-1, day=31)
-    
-    return inicio.strftime('%Y-%m-%d'), fin.strftime('%Y-%m-%d'), periodo_anterior_inicio.strftime('%Y-%m-%d'), periodo_anterior_fin.strftime('%Y-%m-%d')
+# Columnas de dim_fecha para cada periodo del selector; uno desconocido usa mes
+PERIODOS_CALENDARIO = {'semana': 'semana', 'mes': 'mes', 'trimestre': 'trimestre', 'ano': 'anio'}
+# Rango cargado en dim_fecha por la migración 0013
+CALENDARIO_DESDE = date(2000, 1, 1)
+CALENDARIO_HASTA = date(2060, 12, 31)
+
+def get_periodo_fechas(conn, periodo, hoy=None):
+    """
+    Inicio del periodo en curso (semana ISO, mes, trimestre o año), hoy, y
+    los límites del periodo anterior completo, leídos de dim_fecha con una
+    búsqueda por clave primaria.
+    """
+    columna = PERIODOS_CALENDARIO.get(periodo, 'mes')
+    hoy = (hoy or date.today()).isoformat()
+    fila = conn.execute(f'''
+        SELECT d.inicio_{columna} AS inicio,
+               d.inicio_{columna}_anterior AS anterior_inicio,
+               (SELECT MAX(a.fecha) FROM dim_fecha a WHERE a.fecha < d.inicio_{columna}) AS anterior_fin
+        FROM dim_fecha d
+        WHERE d.fecha = ?
+    ''', (hoy,)).fetchone()
+    if fila is None:
+        raise ValueError(f'La fecha {hoy} está fuera del calendario dim_fecha')
+    return fila['inicio'], hoy, fila['anterior_inicio'], fila['anterior_fin']
 
 def calcular_crecimiento(actual, anterior):
     """Calcula el porcentaje de crecimiento entre dos periodos"""
@@ -1213,47 +1873,206 @@ def calcular_crecimiento(actual, anterior):
     return round(((actual - anterior) / anterior) * 100, 1)
 
 # -------------------- ENDPOINTS DE REPORTES --------------------
+MESES = {
+    '01': 'Enero', '02': 'Febrero', '03': 'Marzo', '04': 'Abril',
+    '05': 'Mayo', '06': 'Junio', '07': 'Julio', '08': 'Agosto',
+    '09': 'Septiembre', '10': 'Octubre', '11': 'Noviembre', '12': 'Diciembre'
+}
+
+def seccion_dashboard(conn):
+    """Estadisticas generales del modulo reportes"""
+    # Ventas totales de TODA la tabla (sin filtro de fecha), pedidos y
+    # nuevos clientes (todos los clientes para testing)
+    ventas_totales, total_pedidos, nuevos_clientes = conn.execute('''
+        SELECT (SELECT COALESCE(SUM(total), 0) FROM ventas),
+               (SELECT COUNT(*) FROM pedidos),
+               (SELECT COUNT(*) FROM clientes)
+    ''').fetchone()
+    
+    # Valor promedio
+    if total_pedidos > 0:
+        valor_promedio = ventas_totales / total_pedidos
+    else:
+        valor_promedio = 0
+    
+    return {
+        'ventas_totales': float(ventas_totales),
+        'total_pedidos': total_pedidos,
+        'valor_promedio': float(valor_promedio),
+        'nuevos_clientes': nuevos_clientes,
+        'crecimiento_ventas': 0,
+        'crecimiento_pedidos': 0,
+        'crecimiento_promedio': 0,
+        'crecimiento_clientes': 0
+    }
+
+# Etiqueta del grupo de ventas_diarias sin tipo (tipo = ''): líneas cuyo producto ya no existe
+TIPO_SIN_CLASIFICAR = 'Sin tipo'
+
+def seccion_ingresos_tipo(conn):
+    """Ingresos por tipo GFX/VFX, desde el resumen diario"""
+    ingresos_data = conn.execute('''
+        SELECT COALESCE(NULLIF(tipo, ''), ?) as tipo, SUM(total) as total_ingresos, SUM(ventas) as cantidad
+        FROM ventas_diarias
+        GROUP BY tipo
+        ORDER BY total_ingresos DESC
+    ''', (TIPO_SIN_CLASIFICAR,)).fetchall()
+    
+    # Calcular total general
+    total_general = sum(row[1] for row in ingresos_data) if ingresos_data else 1
+    
+    resultado = {}
+    for row in ingresos_data:
+        tipo = row[0]  # Ya viene en UPPER
+        total = float(row[1])
+        cantidad = row[2]
+        porcentaje = round((total / total_general * 100), 1) if total_general > 0 else 0
+        resultado[tipo] = {
+            'total': round(total, 2),
+            'porcentaje': porcentaje,
+            'cantidad': cantidad
+        }
+    
+    # Asegurar que siempre tengamos GFX y VFX
+    if 'GFX' not in resultado:
+        resultado['GFX'] = {'total': 0, 'porcentaje': 0, 'cantidad': 0}
+    if 'VFX' not in resultado:
+        resultado['VFX'] = {'total': 0, 'porcentaje': 0, 'cantidad': 0}
+    
+    return resultado
+
+# Series de tiempo: rango explícito de días y granularidad del bucket.
+# Cada granularidad agrupa por una clave entera de dim_fecha.
+GRANULARIDADES = {
+    'dia': ('dia_clave', 1),            # (columna, días mínimos por bucket)
+    'semana': ('semana_clave', 7),
+    'mes': ('mes_clave', 28),
+    'trimestre': ('trimestre_clave', 90),
+}
+GRANULARIDAD_POR_PERIODO = {'semana': 'dia', 'mes': 'semana', 'trimestre': 'mes', 'ano': 'mes'}
+MAX_PUNTOS_SERIE = 1000
+series_cache = CacheVersionada(max_entradas=64)
+
+def etiqueta_bucket(clave, granularidad):
+    if granularidad == 'dia':
+        return f'{clave % 100:02d}/{clave // 100 % 100:02d}/{clave // 10000}'
+    if granularidad == 'semana':
+        return f'Semana {clave % 100} {clave // 100}'
+    if granularidad == 'mes':
+        return f"{MESES[f'{clave % 100:02d}']} {clave // 100}"
+    return f'T{clave % 10} {clave // 10}'
+
+def calcular_serie(conn, desde, hasta, granularidad):
+    """
+    Una consulta por rango sobre dim_fecha con LEFT JOIN al resumen diario:
+    cada bucket del rango sale aunque no tenga ventas, y su inicio y fin son
+    los días del rango que cubre (el primero y el último quedan recortados).
+    """
+    columna, _ = GRANULARIDADES[granularidad]
+    filas = conn.execute(f'''
+        SELECT
+            d.{columna} as clave,
+            MIN(d.fecha) as inicio,
+            MAX(d.fecha) as fin,
+            COALESCE(SUM(CASE WHEN v.tipo = 'VFX' THEN v.total END), 0) as vfx,
+            COALESCE(SUM(CASE WHEN v.tipo = 'GFX' THEN v.total END), 0) as gfx,
+            COALESCE(SUM(v.total), 0) as total
+        FROM dim_fecha d
+        LEFT JOIN ventas_diarias v ON v.dia = d.fecha
+        WHERE d.fecha BETWEEN ? AND ?
+        GROUP BY d.{columna}
+        ORDER BY d.{columna}
+    ''', (desde.isoformat(), hasta.isoformat())).fetchall()
+    return [{
+        'periodo': etiqueta_bucket(fila['clave'], granularidad),
+        'inicio': fila['inicio'],
+        'fin': fila['fin'],
+        'vfx': round(fila['vfx'], 2),
+        'gfx': round(fila['gfx'], 2),
+        'total': round(fila['total'], 2)
+    } for fila in filas]
+
+def serie_tendencia(conn, desde, hasta, granularidad):
+    """Serie cacheada por (rango, granularidad) mientras ventas_diarias no cambie"""
+    version = version_datos(conn, ('ventas_diarias',))
+    serie, _ = series_cache.obtener((desde, hasta, granularidad), version,
+                                    lambda: calcular_serie(conn, desde, hasta, granularidad))
+    return serie
+
+def rango_por_periodo(conn, periodo):
+    """Rango y granularidad por defecto de la tendencia para un periodo del selector"""
+    inicio, fin, _, _ = get_periodo_fechas(conn, periodo)
+    return date.fromisoformat(inicio), date.fromisoformat(fin), GRANULARIDAD_POR_PERIODO.get(periodo, 'semana')
+
+def seccion_tendencia(conn, periodo):
+    """Tendencia del periodo seleccionado, con todos sus buckets aunque estén vacíos"""
+    return serie_tendencia(conn, *rango_por_periodo(conn, periodo))
+
+def seccion_productos_top(conn):
+    """Productos más vendidos, desde las líneas de venta"""
+    productos_data = conn.execute('''
+        SELECT p.nombre, vi.tipo, vi.pedidos, vi.ingresos
+        FROM (
+            SELECT producto_id, MAX(tipo) as tipo,
+                   COUNT(DISTINCT venta_id) as pedidos, SUM(total) as ingresos
+            FROM venta_items
+            GROUP BY producto_id
+        ) vi
+        JOIN productos p ON vi.producto_id = p.id
+        ORDER BY vi.ingresos DESC
+        LIMIT 10
+    ''').fetchall()
+    
+    resultado = []
+    for row in productos_data:
+        promedio = row[3] / row[2] if row[2] > 0 else 0
+        resultado.append({
+            'nombre': row[0],
+            'tipo': row[1].upper() if row[1] else 'N/A',
+            'pedidos': row[2],
+            'ingresos': round(float(row[3]), 2),
+            'promedio': round(float(promedio), 2)
+        })
+    
+    return resultado
+
+def seccion_clientes_top(conn):
+    """Mejores clientes"""
+    clientes_data = conn.execute('''
+        SELECT c.nombre, v.pedidos, v.ingresos, v.ultimo_pedido
+        FROM (
+            SELECT cliente_id, COUNT(*) as pedidos, SUM(total) as ingresos, MAX(fecha) as ultimo_pedido
+            FROM ventas
+            GROUP BY cliente_id
+        ) v
+        JOIN clientes c ON v.cliente_id = c.id
+        ORDER BY v.ingresos DESC
+        LIMIT 10
+    ''').fetchall()
+    
+    resultado = []
+    for row in clientes_data:
+        promedio = row[2] / row[1] if row[1] > 0 else 0
+        resultado.append({
+            'nombre': row[0],
+            'pedidos': row[1],
+            'ingresos': round(float(row[2]), 2),
+            'promedio': round(float(promedio), 2),
+            'ultimo_pedido': row[3]
+        })
+    
+    return resultado
+
 @app.route('/api/reportes/dashboard', methods=['GET'])
 def get_reporte_dashboard():
     """Estadisticas para modulo reportes"""
     try:
-        conn = sqlite3.connect('database.db')
-        cursor = conn.cursor()
-        
-        # Ventas totales de TODA la tabla (sin filtro de fecha)
-        cursor.execute('SELECT COALESCE(SUM(total), 0) FROM ventas')
-        ventas_totales = cursor.fetchone()[0]
-        
-        # Total pedidos de TODA la tabla
-        cursor.execute('SELECT COUNT(*) FROM pedidos')
-        total_pedidos = cursor.fetchone()[0]
-        
-        # Valor promedio
-        if total_pedidos > 0:
-            valor_promedio = ventas_totales / total_pedidos
-        else:
-            valor_promedio = 0
-        
-        # Nuevos clientes (todos los clientes para testing)
-        cursor.execute('SELECT COUNT(*) FROM clientes')
-        nuevos_clientes = cursor.fetchone()[0]
-        
-        conn.close()
-        
-        result = {
-            'ventas_totales': float(ventas_totales),
-            'total_pedidos': total_pedidos,
-            'valor_promedio': float(valor_promedio),
-            'nuevos_clientes': nuevos_clientes,
-            'crecimiento_ventas': 0,
-            'crecimiento_pedidos': 0,
-            'crecimiento_promedio': 0,
-            'crecimiento_clientes': 0
-        }
+        conn = get_db_connection()
+        result = seccion_dashboard(conn)
         
         print(f"📊 Reportes stats calculadas: {result}")
         return jsonify(result)
-        
+    
     except Exception as e:
         print(f"❌ Error en reportes stats: {str(e)}")
         return jsonify({'error': str(e)}), 500
@@ -1262,173 +2081,54 @@ def get_reporte_dashboard():
 def get_ingresos_tipo():
     """Endpoint para ingresos por tipo GFX/VFX"""
     try:
-        conn = sqlite3.connect('database.db')
-        cursor = conn.cursor()
-        
-        # PRIMERO: Intentar con VENTAS
-        cursor.execute('''
-            SELECT 
-                UPPER(p.tipo) as tipo,
-                COALESCE(SUM(v.total), 0) as total_ingresos,
-                COUNT(v.id) as cantidad
-            FROM ventas v
-            JOIN productos p ON v.producto_id = p.id
-            GROUP BY UPPER(p.tipo)
-            ORDER BY total_ingresos DESC
-        ''')
-        ingresos_data = cursor.fetchall()
-        
-        # FALLBACK: Si no hay ventas, usar PEDIDOS
-        if not ingresos_data:
-            cursor.execute('''
-                SELECT 
-                    UPPER(p.tipo) as tipo,
-                    COALESCE(SUM(pe.total), 0) as total_ingresos,
-                    COUNT(pe.id) as cantidad
-                FROM pedidos pe
-                JOIN productos p ON pe.producto_id = p.id
-                GROUP BY UPPER(p.tipo)
-                ORDER BY total_ingresos DESC
-            ''')
-            ingresos_data = cursor.fetchall()
-        
-        # Calcular total general
-        total_general = sum(row[1] for row in ingresos_data) if ingresos_data else 1
-        
-        resultado = {}
-        for row in ingresos_data:
-            tipo = row[0]  # Ya viene en UPPER desde la query
-            total = float(row[1])
-            cantidad = row[2]
-            porcentaje = round((total / total_general * 100), 1) if total_general > 0 else 0
-            resultado[tipo] = {
-                'total': round(total, 2),
-                'porcentaje': porcentaje,
-                'cantidad': cantidad
-            }
-        
-        # Asegurar que siempre tengamos GFX y VFX
-        if 'GFX' not in resultado:
-            resultado['GFX'] = {'total': 0, 'porcentaje': 0, 'cantidad': 0}
-        if 'VFX' not in resultado:
-            resultado['VFX'] = {'total': 0, 'porcentaje': 0, 'cantidad': 0}
+        conn = get_db_connection()
+        resultado = seccion_ingresos_tipo(conn)
         
-        conn.close()
         print(f"💰 Ingresos por tipo calculados: {resultado}")
         return jsonify(resultado)
-        
+    
     except Exception as e:
         print(f"❌ Error en ingresos-tipo: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/reportes/tendencia', methods=['GET'])
 def get_tendencia():
-    """Endpoint para tendencia temporal"""
+    """
+    Endpoint para tendencia temporal. Con desde/hasta (AAAA-MM-DD) y
+    granularidad (dia, semana, mes, trimestre) devuelve esa serie; si no,
+    la del periodo seleccionado.
+    """
+    conn = get_db_connection()
+    periodo = request.args.get('periodo', 'mes')
     try:
-        conn = sqlite3.connect('database.db')
-        cursor = conn.cursor()
-        
-        periodo = request.args.get('periodo', 'mes')
-        
-        # Simplificamos para mostrar datos sin filtros de fecha complicados
-        if periodo == 'semana':
-            # Agrupar por fecha simple
-            query = '''
-                SELECT 
-                    DATE(v.fecha) as fecha,
-                    COALESCE(SUM(CASE WHEN UPPER(p.tipo) = 'VFX' THEN v.total ELSE 0 END), 0) as vfx,
-                    COALESCE(SUM(CASE WHEN UPPER(p.tipo) = 'GFX' THEN v.total ELSE 0 END), 0) as gfx,
-                    COALESCE(SUM(v.total), 0) as total
-                FROM ventas v
-                JOIN productos p ON v.producto_id = p.id
-                GROUP BY DATE(v.fecha)
-                ORDER BY DATE(v.fecha) DESC
-                LIMIT 7
-            '''
-        else:
-            # Agrupar por mes (formato simple)
-            query = '''
-                SELECT 
-                    strftime('%Y-%m', v.fecha) as mes,
-                    COALESCE(SUM(CASE WHEN UPPER(p.tipo) = 'VFX' THEN v.total ELSE 0 END), 0) as vfx,
-                    COALESCE(SUM(CASE WHEN UPPER(p.tipo) = 'GFX' THEN v.total ELSE 0 END), 0) as gfx,
-                    COALESCE(SUM(v.total), 0) as total
-                FROM ventas v
-                JOIN productos p ON v.producto_id = p.id
-                GROUP BY strftime('%Y-%m', v.fecha)
-                ORDER BY strftime('%Y-%m', v.fecha) DESC
-                LIMIT 6
-            '''
-        
-        cursor.execute(query)
-        resultados = cursor.fetchall()
-        
-        # Si no hay ventas, usar pedidos como fallback
-        if not resultados:
-            if periodo == 'semana':
-                query_pedidos = '''
-                    SELECT 
-                        DATE(p.fecha) as fecha,
-                        COALESCE(SUM(CASE WHEN UPPER(pr.tipo) = 'VFX' THEN pp.assigned_payment ELSE 0 END), 0) as vfx,
-                        COALESCE(SUM(CASE WHEN UPPER(pr.tipo) = 'GFX' THEN pp.assigned_payment ELSE 0 END), 0) as gfx,
-                        COALESCE(SUM(pp.assigned_payment), 0) as total
-                    FROM pedidos p
-                    JOIN pedido_productos pp ON p.id = pp.pedido_id
-                    JOIN productos pr ON pp.producto_id = pr.id
-                    GROUP BY DATE(p.fecha)
-                    ORDER BY DATE(p.fecha) DESC
-                    LIMIT 7
-                '''
-            else:
-                query_pedidos = '''
-                    SELECT 
-                        strftime('%Y-%m', p.fecha) as mes,
-                        COALESCE(SUM(CASE WHEN UPPER(pr.tipo) = 'VFX' THEN pp.assigned_payment ELSE 0 END), 0) as vfx,
-                        COALESCE(SUM(CASE WHEN UPPER(pr.tipo) = 'GFX' THEN pp.assigned_payment ELSE 0 END), 0) as gfx,
-                        COALESCE(SUM(pp.assigned_payment), 0) as total
-                    FROM pedidos p
-                    JOIN pedido_productos pp ON p.id = pp.pedido_id
-                    JOIN productos pr ON pp.producto_id = pr.id
-                    GROUP BY strftime('%Y-%m', p.fecha)
-                    ORDER BY strftime('%Y-%m', p.fecha) DESC
-                    LIMIT 6
-                '''
-            cursor.execute(query_pedidos)
-            resultados = cursor.fetchall()
-        
-        # Formatear resultados
-        tendencia = []
-        for i, row in enumerate(resultados):
-            if periodo == 'semana':
-                periodo_nombre = f"Día {i+1}" if row[0] else f"Día {i+1}"
-            else:
-                # Convertir YYYY-MM a nombre más legible
-                if row[0]:
-                    try:
-                        año, mes = row[0].split('-')
-                        meses = {
-                            '01': 'Enero', '02': 'Febrero', '03': 'Marzo', '04': 'Abril',
-                            '05': 'Mayo', '06': 'Junio', '07': 'Julio', '08': 'Agosto',
-                            '09': 'Septiembre', '10': 'Octubre', '11': 'Noviembre', '12': 'Diciembre'
-                        }
-                        mes_nombre = meses.get(mes, f'Mes {mes}')
-                        periodo_nombre = f'{mes_nombre} {año}'
-                    except:
-                        periodo_nombre = f'Periodo {i+1}'
-                else:
-                    periodo_nombre = f'Periodo {i+1}'
-            
-            tendencia.append({
-                'periodo': periodo_nombre,
-                'vfx': float(row[1]) if row[1] else 0,
-                'gfx': float(row[2]) if row[2] else 0,
-                'total': float(row[3]) if row[3] else 0
-            })
+        desde = date.fromisoformat(request.args['desde']) if request.args.get('desde') else None
+        hasta = date.fromisoformat(request.args['hasta']) if request.args.get('hasta') else None
+    except ValueError:
+        return jsonify({'error': 'desde y hasta deben tener formato AAAA-MM-DD'}), 400
+    granularidad = request.args.get('granularidad') or GRANULARIDAD_POR_PERIODO.get(periodo, 'semana')
+    # El rango del periodo solo se busca si falta algún límite explícito
+    if desde is None or hasta is None:
+        try:
+            inicio, fin, _ = rango_por_periodo(conn, periodo)
+        except ValueError:
+            return jsonify({'error': f'El rango debe estar entre {CALENDARIO_DESDE} y {CALENDARIO_HASTA}'}), 400
+        desde = desde or inicio
+        hasta = hasta or fin
+    if granularidad not in GRANULARIDADES:
+        return jsonify({'error': f"Granularidad inválida, use: {', '.join(GRANULARIDADES)}"}), 400
+    if desde > hasta:
+        return jsonify({'error': 'desde no puede ser posterior a hasta'}), 400
+    if desde < CALENDARIO_DESDE or hasta > CALENDARIO_HASTA:
+        return jsonify({'error': f'El rango debe estar entre {CALENDARIO_DESDE} y {CALENDARIO_HASTA}'}), 400
+    if (hasta - desde).days // GRANULARIDADES[granularidad][1] > MAX_PUNTOS_SERIE:
+        return jsonify({'error': f'El rango genera más de {MAX_PUNTOS_SERIE} puntos, use una granularidad mayor'}), 400
+    
+    try:
+        tendencia = serie_tendencia(conn, desde, hasta, granularidad)
         
-        conn.close()
         print(f"📈 Tendencia calculada: {len(tendencia)} periodos")
         return jsonify(tendencia)
-        
+    
     except Exception as e:
         print(f"❌ Error en tendencia: {str(e)}")
         return jsonify({'error': str(e)}), 500
@@ -1437,55 +2137,12 @@ def get_tendencia():
 def get_productos_top():
     """Endpoint para productos más vendidos"""
     try:
-        conn = sqlite3.connect('database.db')
-        cursor = conn.cursor()
-        
-        # PRIMERO: Intentar con VENTAS (datos reales)
-        cursor.execute('''
-            SELECT 
-                p.nombre,
-                p.tipo,
-                COUNT(v.id) as pedidos,
-                COALESCE(SUM(v.total), 0) as ingresos
-            FROM ventas v
-            JOIN productos p ON v.producto_id = p.id
-            GROUP BY p.id, p.nombre, p.tipo
-            ORDER BY ingresos DESC
-            LIMIT 10
-        ''')
-        productos_data = cursor.fetchall()
-        
-        # FALLBACK: Si no hay ventas, usar PEDIDOS
-        if not productos_data:
-            cursor.execute('''
-                SELECT 
-                    p.nombre,
-                    p.tipo,
-                    COUNT(pe.id) as pedidos,
-                    COALESCE(SUM(pe.total), 0) as ingresos
-                FROM pedidos pe
-                JOIN productos p ON pe.producto_id = p.id
-                GROUP BY p.id, p.nombre, p.tipo
-                ORDER BY ingresos DESC
-                LIMIT 10
-            ''')
-            productos_data = cursor.fetchall()
-        
-        resultado = []
-        for row in productos_data:
-            promedio = row[3] / row[2] if row[2] > 0 else 0
-            resultado.append({
-                'nombre': row[0],
-                'tipo': row[1].upper() if row[1] else 'N/A',
-                'pedidos': row[2],
-                'ingresos': round(float(row[3]), 2),
-                'promedio': round(float(promedio), 2)
-            })
+        conn = get_db_connection()
+        resultado = seccion_productos_top(conn)
         
-        conn.close()
         print(f"📊 Productos más vendidos encontrados: {len(resultado)}")
         return jsonify(resultado)
-        
+    
     except Exception as e:
         print(f"❌ Error en productos-top: {str(e)}")
         return jsonify({'error': str(e)}), 500
@@ -1494,303 +2151,717 @@ def get_productos_top():
 def get_clientes_top():
     """Endpoint para mejores clientes"""
     try:
-        conn = sqlite3.connect('database.db')
-        cursor = conn.cursor()
-        
-        # PRIMERO: Intentar con VENTAS (datos reales)
-        cursor.execute('''
-            SELECT 
-                c.nombre,
-                COUNT(v.id) as pedidos,
-                COALESCE(SUM(v.total), 0) as ingresos,
-                MAX(v.fecha) as ultimo_pedido
-            FROM ventas v
-            JOIN clientes c ON v.cliente_id = c.id
-            GROUP BY c.id, c.nombre
-            ORDER BY ingresos DESC
-            LIMIT 10
-        ''')
-        clientes_data = cursor.fetchall()
-        
-        # FALLBACK: Si no hay ventas, usar PEDIDOS
-        if not clientes_data:
-            cursor.execute('''
-                SELECT 
-                    c.nombre,
-                    COUNT(pe.id) as pedidos,
-                    COALESCE(SUM(pe.total), 0) as ingresos,
-                    MAX(pe.fecha) as ultimo_pedido
-                FROM pedidos pe
-                JOIN clientes c ON pe.cliente_id = c.id
-                GROUP BY c.id, c.nombre
-                ORDER BY ingresos DESC
-                LIMIT 10
-            ''')
-            clientes_data = cursor.fetchall()
-        
-        resultado = []
-        for row in clientes_data:
-            promedio = row[2] / row[1] if row[1] > 0 else 0
-            resultado.append({
-                'nombre': row[0],
-                'pedidos': row[1],
-                'ingresos': round(float(row[2]), 2),
-                'promedio': round(float(promedio), 2),
-                'ultimo_pedido': row[3]
-            })
+        conn = get_db_connection()
+        resultado = seccion_clientes_top(conn)
         
-        conn.close()
         print(f"👥 Mejores clientes encontrados: {len(resultado)}")
         return jsonify(resultado)
-        
+    
     except Exception as e:
         print(f"❌ Error en clientes-top: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/reportes/bundle', methods=['GET'])
+def get_reportes_bundle():
+    """
+    Todas las secciones de la página de reportes en un solo request, con una
+    sola conexión: ahorra las idas y vueltas del frontend, no las consultas.
+    Cada sección corre su propia consulta agrupada y devuelve lo mismo que su
+    endpoint individual; periodo solo afecta a la tendencia (las demás
+    secciones son sobre todas las ventas). Si una sección falla, su clave
+    trae {'error': ...} y las demás se devuelven igual.
+    """
+    conn = get_db_connection()
+    periodo = request.args.get('periodo', 'mes')
+    
+    secciones = {
+        'dashboard': lambda: seccion_dashboard(conn),
+        'ingresos_tipo': lambda: seccion_ingresos_tipo(conn),
+        'tendencia': lambda: seccion_tendencia(conn, periodo),
+        'productos_top': lambda: seccion_productos_top(conn),
+        'clientes_top': lambda: seccion_clientes_top(conn)
+    }
+    
+    resultado = {}
+    for nombre, calcular in secciones.items():
+        try:
+            resultado[nombre] = calcular()
+        except Exception as e:
+            print(f"❌ Error en reportes bundle ({nombre}): {str(e)}")
+            resultado[nombre] = {'error': str(e)}
+    
+    print(f"📦 Reportes bundle calculado: {len(resultado)} secciones")
+    return jsonify(resultado)
+
+EXPORT_MIMETYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+# Hasta este tamaño el archivo se arma en memoria; más grande se vuelca a un temporal en disco
+EXPORT_SPOOL_MAX_BYTES = int(os.getenv('EXPORT_SPOOL_MAX_BYTES', 5 * 1024 * 1024))
+
+def agregar_encabezados(ws, titulos, fill=None):
+    """Fila de encabezados con estilo para una hoja write-only"""
+    fila = []
+    for titulo in titulos:
+        celda = WriteOnlyCell(ws, value=titulo)
+        celda.font = Font(bold=True)
+        if fill is not None:
+            celda.fill = fill
+        fila.append(celda)
+    ws.append(fila)
+
+def construir_reporte_excel(conn, periodo, destino, detalle=False):
+    """
+    Escribir el reporte del periodo en `destino` (archivo o file-like con seek).
+    Usa el modo write_only de openpyxl: las filas se agregan una a una y no se
+    guarda el workbook completo en memoria. Con detalle=True agrega la hoja
+    Transacciones con cada venta del periodo.
+    """
+    wb = Workbook(write_only=True)
+
+    # Obtener datos para todas las hojas
+    inicio, fin, _, _ = get_periodo_fechas(conn, periodo)
+
+    # Hoja 1: Resumen general
+    ws1 = wb.create_sheet("Resumen General")
+
+    # Headers con estilo
+    header_fill = PatternFill(start_color="CCCCCC", end_color="CCCCCC", fill_type="solid")
+    agregar_encabezados(ws1, ['Métrica', 'Valor'], header_fill)
+
+    # Datos del dashboard y clientes únicos del periodo
+    dashboard_data = conn.execute('''
+        SELECT
+            COALESCE(SUM(total), 0) as ventas_totales,
+            COUNT(*) as total_pedidos,
+            COUNT(DISTINCT cliente_id) as nuevos
+        FROM ventas
+        WHERE fecha >= ? AND fecha < date(?, '+1 day')
+    ''', (inicio, fin)).fetchone()
+
+    valor_promedio = dashboard_data['ventas_totales'] / dashboard_data['total_pedidos'] if dashboard_data['total_pedidos'] > 0 else 0
+    nuevos_clientes = dashboard_data['nuevos']
+
+    ws1.append(['Ventas Totales', f"${dashboard_data['ventas_totales']:.2f}"])
+    ws1.append(['Total Pedidos', dashboard_data['total_pedidos']])
+    ws1.append(['Valor Promedio', f"${valor_promedio:.2f}"])
+    ws1.append(['Nuevos Clientes', nuevos_clientes])
+
+    # Hoja 2: Ingresos por tipo
+    ws2 = wb.create_sheet("Ingresos por Tipo")
+    agregar_encabezados(ws2, ['Tipo', 'Ingresos', 'Porcentaje'])
+
+    # Ingresos por tipo, desde el resumen diario del periodo
+    ingresos_tipo = conn.execute('''
+        SELECT COALESCE(NULLIF(tipo, ''), ?) as tipo, SUM(total) as total_ingresos
+        FROM ventas_diarias
+        WHERE dia >= ? AND dia <= ?
+        GROUP BY tipo
+    ''', (TIPO_SIN_CLASIFICAR, inicio, fin)).fetchall()
+
+    total_general = sum(row['total_ingresos'] for row in ingresos_tipo)
+    for row in ingresos_tipo:
+        porcentaje = (row['total_ingresos'] / total_general * 100) if total_general > 0 else 0
+        ws2.append([row['tipo'], f"${row['total_ingresos']:.2f}", f"{porcentaje:.1f}%"])
+
+    # Hoja 3: Productos más vendidos
+    ws3 = wb.create_sheet("Productos Top")
+    agregar_encabezados(ws3, ['Producto', 'Tipo', 'Pedidos', 'Ingresos', 'Promedio'])
+
+    # Productos top, desde las líneas de venta del periodo
+    productos_top = conn.execute('''
+        SELECT p.nombre, vi.tipo, vi.pedidos, vi.ingresos
+        FROM (
+            SELECT producto_id, MAX(tipo) as tipo,
+                   COUNT(DISTINCT venta_id) as pedidos, SUM(total) as ingresos
+            FROM venta_items
+            WHERE fecha >= ? AND fecha < date(?, '+1 day')
+            GROUP BY producto_id
+        ) vi
+        JOIN productos p ON vi.producto_id = p.id
+        ORDER BY vi.ingresos DESC
+        LIMIT 10
+    ''', (inicio, fin)).fetchall()
+
+    for row in productos_top:
+        promedio = row['ingresos'] / row['pedidos'] if row['pedidos'] > 0 else 0
+        ws3.append([row['nombre'], row['tipo'].upper(), row['pedidos'],
+                    f"${row['ingresos']:.2f}", f"${promedio:.2f}"])
+
+    # Hoja 4: Mejores clientes
+    ws4 = wb.create_sheet("Mejores Clientes")
+    agregar_encabezados(ws4, ['Cliente', 'Pedidos', 'Ingresos', 'Promedio', 'Último Pedido'])
+
+    # Mejores clientes del periodo
+    clientes_top = conn.execute('''
+        SELECT
+            c.nombre,
+            COUNT(v.id) as pedidos,
+            COALESCE(SUM(v.total), 0) as ingresos,
+            MAX(v.fecha) as ultimo_pedido
+        FROM ventas v
+        JOIN clientes c ON v.cliente_id = c.id
+        WHERE v.fecha >= ? AND v.fecha < date(?, '+1 day')
+        GROUP BY c.id, c.nombre
+        ORDER BY ingresos DESC
+        LIMIT 10
+    ''', (inicio, fin)).fetchall()
+
+    for row in clientes_top:
+        promedio = row['ingresos'] / row['pedidos'] if row['pedidos'] > 0 else 0
+        ws4.append([row['nombre'], row['pedidos'], f"${row['ingresos']:.2f}",
+                    f"${promedio:.2f}", row['ultimo_pedido']])
+
+    # Hoja 5 (opcional): todas las ventas del periodo, leídas del cursor fila por fila
+    if detalle:
+        ws5 = wb.create_sheet("Transacciones")
+        agregar_encabezados(ws5, ['ID', 'Fecha', 'Cliente', 'Producto', 'Tipo', 'Cantidad',
+                                  'Total', 'Estado Pago', 'Pedido'])
+        transacciones = conn.execute('''
+            SELECT v.id, v.fecha, c.nombre as cliente, p.nombre as producto, p.tipo,
+                   v.cantidad, v.total, v.estado_pago, v.pedido_id
+            FROM ventas v
+            LEFT JOIN clientes c ON v.cliente_id = c.id
+            LEFT JOIN productos p ON v.producto_id = p.id
+            WHERE v.fecha >= ? AND v.fecha < date(?, '+1 day')
+            ORDER BY v.fecha, v.id
+        ''', (inicio, fin))
+        for row in transacciones:
+            ws5.append([row['id'], row['fecha'], row['cliente'], row['producto'],
+                        row['tipo'].upper() if row['tipo'] else None, row['cantidad'],
+                        row['total'], row['estado_pago'], row['pedido_id']])
+
+    wb.save(destino)
+
 @app.route('/api/reportes/exportar', methods=['GET'])
 def exportar_reporte():
     """Endpoint para exportar reportes a Excel"""
     periodo = request.args.get('periodo', 'mes')
     formato = request.args.get('formato', 'excel')
-    
+    detalle = request.args.get('detalle') in ('1', 'true')
+
     if formato != 'excel':
         return jsonify({'error': 'Solo se soporta formato Excel'}), 400
-    
+
     try:
-        # Crear workbook
-        wb = Workbook()
-        
-        # Obtener datos para todas las hojas
-        inicio, fin, _, _ = get_periodo_fechas(periodo)
         conn = get_db_connection()
-        
-        # Hoja 1: Resumen general
-        ws1 = wb.active
-        ws1.title = "Resumen General"
-        
-        # Headers con estilo
-        header_font = Font(bold=True)
-        header_fill = PatternFill(start_color="CCCCCC", end_color="CCCCCC", fill_type="solid")
-        
-        ws1['A1'] = 'Métrica'
-        ws1['B1'] = 'Valor'
-        ws1['A1'].font = header_font
-        ws1['B1'].font = header_font
-        ws1['A1'].fill = header_fill
-        ws1['B1'].fill = header_fill
-        
-        # Obtener datos del dashboard - PRIMERO INTENTAR CON VENTAS
-        dashboard_data = conn.execute('''
-            SELECT 
-                COALESCE(SUM(total), 0) as ventas_totales,
-                COUNT(*) as total_pedidos
-            FROM ventas 
-            WHERE fecha >= ? AND fecha <= ?
-        ''', (inicio, fin)).fetchone()
-        
-        # FALLBACK: Si no hay ventas, usar pedidos
-        if dashboard_data['total_pedidos'] == 0:
-            dashboard_data = conn.execute('''
-                SELECT 
-                    COALESCE(SUM(pp.assigned_payment), 0) as ventas_totales,
-                    COUNT(DISTINCT p.id) as total_pedidos
-                FROM pedidos p
-                LEFT JOIN pedido_productos pp ON p.id = pp.pedido_id
-                WHERE p.fecha >= ? AND p.fecha <= ?
-            ''', (inicio, fin)).fetchone()
-            
-        valor_promedio = dashboard_data['ventas_totales'] / dashboard_data['total_pedidos'] if dashboard_data['total_pedidos'] > 0 else 0
-        
-        # Clientes únicos - PRIMERO VENTAS, LUEGO PEDIDOS
-        nuevos_clientes_query = conn.execute('''
-            SELECT COUNT(DISTINCT cliente_id) as nuevos
-            FROM ventas 
-            WHERE fecha >= ? AND fecha <= ?
-        ''', (inicio, fin)).fetchone()
-        
-        nuevos_clientes = nuevos_clientes_query['nuevos']
-        if nuevos_clientes == 0:
-            nuevos_clientes_query = conn.execute('''
-                SELECT COUNT(DISTINCT cliente_id) as nuevos
-                FROM pedidos 
-                WHERE fecha >= ? AND fecha <= ?
-            ''', (inicio, fin)).fetchone()
-            nuevos_clientes = nuevos_clientes_query['nuevos']
-        
-        ws1['A2'] = 'Ventas Totales'
-        ws1['B2'] = f"${dashboard_data['ventas_totales']:.2f}"
-        ws1['A3'] = 'Total Pedidos'
-        ws1['B3'] = dashboard_data['total_pedidos']
-        ws1['A4'] = 'Valor Promedio'
-        ws1['B4'] = f"${valor_promedio:.2f}"
-        ws1['A5'] = 'Nuevos Clientes'
-        ws1['B5'] = nuevos_clientes
-        
-        # Hoja 2: Ingresos por tipo
-        ws2 = wb.create_sheet("Ingresos por Tipo")
-        ws2['A1'] = 'Tipo'
-        ws2['B1'] = 'Ingresos'
-        ws2['C1'] = 'Porcentaje'
-        ws2['A1'].font = header_font
-        ws2['B1'].font = header_font
-        ws2['C1'].font = header_font
-        
-        # Ingresos por tipo - PRIMERO VENTAS, LUEGO PEDIDOS
-        ingresos_tipo = conn.execute('''
-            SELECT 
-                p.tipo,
-                COALESCE(SUM(v.total), 0) as total_ingresos
-            FROM ventas v
-            JOIN productos p ON v.producto_id = p.id
-            WHERE v.fecha >= ? AND v.fecha <= ?
-            GROUP BY p.tipo
-        ''', (inicio, fin)).fetchall()
-        
-        # FALLBACK: Si no hay datos en ventas, usar pedidos
-        if not ingresos_tipo:
-            ingresos_tipo = conn.execute('''
-                SELECT 
-                    pr.tipo,
-                    COALESCE(SUM(pp.assigned_payment), 0) as total_ingresos
-                FROM pedidos p
-                JOIN pedido_productos pp ON p.id = pp.pedido_id
-                JOIN productos pr ON pp.producto_id = pr.id
-                WHERE p.fecha >= ? AND p.fecha <= ?
-                GROUP BY pr.tipo
-            ''', (inicio, fin)).fetchall()
-        
-        total_general = sum(row['total_ingresos'] for row in ingresos_tipo)
-        row_num = 2
-        for row in ingresos_tipo:
-            porcentaje = (row['total_ingresos'] / total_general * 100) if total_general > 0 else 0
-            ws2[f'A{row_num}'] = row['tipo'].upper()
-            ws2[f'B{row_num}'] = f"${row['total_ingresos']:.2f}"
-            ws2[f'C{row_num}'] = f"{porcentaje:.1f}%"
-            row_num += 1
-        
-        # Hoja 3: Productos más vendidos
-        ws3 = wb.create_sheet("Productos Top")
-        ws3['A1'] = 'Producto'
-        ws3['B1'] = 'Tipo'
-        ws3['C1'] = 'Pedidos'
-        ws3['D1'] = 'Ingresos'
-        ws3['E1'] = 'Promedio'
-        for col in ['A1', 'B1', 'C1', 'D1', 'E1']:
-            ws3[col].font = header_font
-        
-        # Productos top - PRIMERO VENTAS, LUEGO PEDIDOS
-        productos_top = conn.execute('''
-            SELECT 
-                p.nombre,
-                p.tipo,
-                COUNT(v.id) as pedidos,
-                COALESCE(SUM(v.total), 0) as ingresos
-            FROM ventas v
-            JOIN productos p ON v.producto_id = p.id
-            WHERE v.fecha >= ? AND v.fecha <= ?
-            GROUP BY p.id, p.nombre, p.tipo
-            ORDER BY ingresos DESC
-            LIMIT 10
-        ''', (inicio, fin)).fetchall()
-        
-        # FALLBACK: Si no hay ventas, usar pedidos
-        if not productos_top:
-            productos_top = conn.execute('''
-                SELECT 
-                    pr.nombre,
-                    pr.tipo,
-                    COUNT(p.id) as pedidos,
-                    COALESCE(SUM(pp.assigned_payment), 0) as ingresos
-                FROM pedidos p
-                JOIN pedido_productos pp ON p.id = pp.pedido_id
-                JOIN productos pr ON pp.producto_id = pr.id
-                WHERE p.fecha >= ? AND p.fecha <= ?
-                GROUP BY pr.id, pr.nombre, pr.tipo
-                ORDER BY ingresos DESC
-                LIMIT 10
-            ''', (inicio, fin)).fetchall()
-        
-        row_num = 2
-        for row in productos_top:
-            promedio = row['ingresos'] / row['pedidos'] if row['pedidos'] > 0 else 0
-            ws3[f'A{row_num}'] = row['nombre']
-            ws3[f'B{row_num}'] = row['tipo'].upper()
-            ws3[f'C{row_num}'] = row['pedidos']
-            ws3[f'D{row_num}'] = f"${row['ingresos']:.2f}"
-            ws3[f'E{row_num}'] = f"${promedio:.2f}"
-            row_num += 1
-        
-        # Hoja 4: Mejores clientes
-        ws4 = wb.create_sheet("Mejores Clientes")
-        ws4['A1'] = 'Cliente'
-        ws4['B1'] = 'Pedidos'
-        ws4['C1'] = 'Ingresos'
-        ws4['D1'] = 'Promedio'
-        ws4['E1'] = 'Último Pedido'
-        for col in ['A1', 'B1', 'C1', 'D1', 'E1']:
-            ws4[col].font = header_font
-        
-        # Mejores clientes - PRIMERO VENTAS, LUEGO PEDIDOS
-        clientes_top = conn.execute('''
-            SELECT 
-                c.nombre,
-                COUNT(v.id) as pedidos,
-                COALESCE(SUM(v.total), 0) as ingresos,
-                MAX(v.fecha) as ultimo_pedido
-            FROM ventas v
-            JOIN clientes c ON v.cliente_id = c.id
-            WHERE v.fecha >= ? AND v.fecha <= ?
-            GROUP BY c.id, c.nombre
-            ORDER BY ingresos DESC
-            LIMIT 10
-        ''', (inicio, fin)).fetchall()
-        
-        # FALLBACK: Si no hay ventas, usar pedidos
-        if not clientes_top:
-            clientes_top = conn.execute('''
-                SELECT 
-                    c.nombre,
-                    COUNT(p.id) as pedidos,
-                    COALESCE(SUM(pp.assigned_payment), 0) as ingresos,
-                    MAX(p.fecha) as ultimo_pedido
-                FROM pedidos p
-                LEFT JOIN pedido_productos pp ON p.id = pp.pedido_id
-                JOIN clientes c ON p.cliente_id = c.id
-                WHERE p.fecha >= ? AND p.fecha <= ?
-                GROUP BY c.id, c.nombre
-                ORDER BY ingresos DESC
-                LIMIT 10
-            ''', (inicio, fin)).fetchall()
-        
-        row_num = 2
-        for row in clientes_top:
-            promedio = row['ingresos'] / row['pedidos'] if row['pedidos'] > 0 else 0
-            ws4[f'A{row_num}'] = row['nombre']
-            ws4[f'B{row_num}'] = row['pedidos']
-            ws4[f'C{row_num}'] = f"${row['ingresos']:.2f}"
-            ws4[f'D{row_num}'] = f"${promedio:.2f}"
-            ws4[f'E{row_num}'] = row['ultimo_pedido']
-            row_num += 1
-        
-        conn.close()
-        
-        # Guardar en memoria
-        output = io.BytesIO()
-        wb.save(output)
+
+        # Archivo en memoria que pasa a disco si supera EXPORT_SPOOL_MAX_BYTES
+        output = tempfile.SpooledTemporaryFile(max_size=EXPORT_SPOOL_MAX_BYTES)
+        construir_reporte_excel(conn, periodo, output, detalle=detalle)
         output.seek(0)
-        
+
         filename = f"reporte_plusgraphics_{periodo}.xlsx"
-        
+
         return send_file(
             output,
-            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+            mimetype=EXPORT_MIMETYPE,
             as_attachment=True,
             download_name=filename
         )
-        
+
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+# -------------------- TRABAJOS DE EXPORTACIÓN EN SEGUNDO PLANO --------------------
+# Los reportes se generan en un pool acotado de hilos para no bloquear los
+# workers HTTP. Cada archivo queda en disco con nombre derivado de
+# (periodo, detalle, fecha, versión de datos), así que pedir otra vez el mismo
+# reporte sin cambios en las tablas lo sirve directamente del cache.
+EXPORT_WORKERS = int(os.getenv('EXPORT_WORKERS', 2))
+EXPORT_MAX_PENDIENTES = int(os.getenv('EXPORT_MAX_PENDIENTES', 20))
+EXPORT_CACHE_DIR = os.getenv('EXPORT_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'plusgraphics_exportes'))
+EXPORT_CACHE_MAX_BYTES = int(os.getenv('EXPORT_CACHE_MAX_BYTES', 200 * 1024 * 1024))
+EXPORT_MAX_TRABAJOS = 200
+EXPORT_TABLAS = ('ventas', 'venta_items', 'ventas_diarias', 'productos', 'clientes', 'pedidos', 'pedido_productos')
+
+_export_pool = ThreadPoolExecutor(max_workers=EXPORT_WORKERS, thread_name_prefix='exportar')
+_export_lock = threading.Lock()
+export_trabajos = OrderedDict()
+
+def clave_exportacion(conn, periodo, detalle):
+    """Clave del artefacto: los periodos son relativos a hoy, por eso entra la fecha"""
+    version = version_datos(conn, EXPORT_TABLAS)
+    base = f"{periodo}|{int(detalle)}|{datetime.now().strftime('%Y-%m-%d')}|{version}"
+    return hashlib.sha1(base.encode()).hexdigest()
+
+def ruta_exportacion(clave):
+    return os.path.join(EXPORT_CACHE_DIR, f'reporte_{clave}.xlsx')
+
+def podar_cache_exportaciones(conservar=None):
+    """Borrar los archivos usados hace más tiempo hasta quedar bajo EXPORT_CACHE_MAX_BYTES"""
+    archivos = []
+    for nombre in os.listdir(EXPORT_CACHE_DIR):
+        ruta = os.path.join(EXPORT_CACHE_DIR, nombre)
+        if not nombre.endswith('.xlsx') or ruta == conservar:
+            continue
+        try:
+            info = os.stat(ruta)
+        except FileNotFoundError:
+            continue
+        archivos.append((info.st_mtime, info.st_size, ruta))
+    total = sum(tamano for _, tamano, _ in archivos)
+    if conservar and os.path.exists(conservar):
+        total += os.path.getsize(conservar)
+    for _, tamano, ruta in sorted(archivos):
+        if total <= EXPORT_CACHE_MAX_BYTES:
+            break
+        try:
+            os.remove(ruta)
+        except FileNotFoundError:
+            pass
+        total -= tamano
+
+def trabajo_a_dict(trabajo):
+    datos = {
+        'id': trabajo['id'],
+        'periodo': trabajo['periodo'],
+        'detalle': trabajo['detalle'],
+        'estado': trabajo['estado'],
+        'creado': trabajo['creado'],
+        'terminado': trabajo['terminado'],
+        'error': trabajo['error']
+    }
+    if trabajo['estado'] == 'listo':
+        datos['descarga'] = f"/api/reportes/exportar/trabajos/{trabajo['id']}/descargar"
+    return datos
+
+def registrar_trabajo(trabajo):
+    """Guardar el trabajo y olvidar los terminados más viejos si hay demasiados"""
+    export_trabajos[trabajo['id']] = trabajo
+    for trabajo_id in list(export_trabajos):
+        if len(export_trabajos) <= EXPORT_MAX_TRABAJOS:
+            break
+        if export_trabajos[trabajo_id]['estado'] in ('listo', 'error'):
+            del export_trabajos[trabajo_id]
+
+def ejecutar_trabajo_exportacion(trabajo_id):
+    """Generar el archivo del trabajo con una conexión propia del pool"""
+    with _export_lock:
+        trabajo = export_trabajos[trabajo_id]
+        trabajo['estado'] = 'procesando'
+
+    conn = tomar_conexion()
+    try:
+        # Versión y datos se leen dentro de la misma transacción de lectura,
+        # así el archivo corresponde exactamente a la clave con que se guarda
+        conn.execute('BEGIN')
+        clave = clave_exportacion(conn, trabajo['periodo'], trabajo['detalle'])
+        ruta = ruta_exportacion(clave)
+        if not os.path.exists(ruta):
+            os.makedirs(EXPORT_CACHE_DIR, exist_ok=True)
+            temporal = f'{ruta}.{trabajo_id}.tmp'
+            try:
+                construir_reporte_excel(conn, trabajo['periodo'], temporal, detalle=trabajo['detalle'])
+                os.replace(temporal, ruta)
+            finally:
+                if os.path.exists(temporal):
+                    os.remove(temporal)
+        conn.rollback()
+        podar_cache_exportaciones(conservar=ruta)
+
+        with _export_lock:
+            trabajo.update(clave=clave, estado='listo', terminado=datetime.now().isoformat())
+    except Exception as e:
+        with _export_lock:
+            trabajo.update(estado='error', error=str(e), terminado=datetime.now().isoformat())
+    finally:
+        devolver_conexion(conn)
+
+@app.route('/api/reportes/exportar/trabajos', methods=['POST'])
+def crear_trabajo_exportacion():
+    """Encolar la generación del Excel y devolver el trabajo para consultar su estado"""
+    data = request.get_json(silent=True) or {}
+    periodo = data.get('periodo', request.args.get('periodo', 'mes'))
+    detalle = data.get('detalle', request.args.get('detalle') in ('1', 'true'))
+    detalle = detalle in (True, 1, '1', 'true')
+
+    conn = get_db_connection()
+    clave = clave_exportacion(conn, periodo, detalle)
+    ahora = datetime.now().isoformat()
+    trabajo = {
+        'id': clave[:12] + os.urandom(4).hex(),
+        'periodo': periodo,
+        'detalle': detalle,
+        'clave': clave,
+        'estado': 'pendiente',
+        'creado': ahora,
+        'terminado': None,
+        'error': None
+    }
+
+    with _export_lock:
+        # Mismo reporte ya en cola o generándose: reutilizar ese trabajo
+        for existente in export_trabajos.values():
+            if existente['clave'] == clave and existente['estado'] in ('pendiente', 'procesando'):
+                return jsonify(trabajo_a_dict(existente)), 202
+
+        ruta = ruta_exportacion(clave)
+        if os.path.exists(ruta):
+            trabajo.update(estado='listo', terminado=ahora)
+            registrar_trabajo(trabajo)
+            return jsonify(trabajo_a_dict(trabajo)), 200
+
+        activos = sum(1 for t in export_trabajos.values() if t['estado'] in ('pendiente', 'procesando'))
+        if activos >= EXPORT_MAX_PENDIENTES:
+            return jsonify({'error': 'Demasiadas exportaciones en curso, intente de nuevo en unos segundos'}), 503
+
+        registrar_trabajo(trabajo)
+
+    _export_pool.submit(ejecutar_trabajo_exportacion, trabajo['id'])
+    return jsonify(trabajo_a_dict(trabajo)), 202
+
+@app.route('/api/reportes/exportar/trabajos/<trabajo_id>', methods=['GET'])
+def estado_trabajo_exportacion(trabajo_id):
+    with _export_lock:
+        trabajo = export_trabajos.get(trabajo_id)
+        if trabajo is None:
+            return jsonify({'error': 'Trabajo de exportación no encontrado'}), 404
+        return jsonify(trabajo_a_dict(trabajo))
+
+@app.route('/api/reportes/exportar/trabajos/<trabajo_id>/descargar', methods=['GET'])
+def descargar_trabajo_exportacion(trabajo_id):
+    with _export_lock:
+        trabajo = export_trabajos.get(trabajo_id)
+        if trabajo is None:
+            return jsonify({'error': 'Trabajo de exportación no encontrado'}), 404
+        if trabajo['estado'] != 'listo':
+            return jsonify({'error': 'El reporte todavía no está listo', 'estado': trabajo['estado']}), 409
+        ruta = ruta_exportacion(trabajo['clave'])
+        periodo = trabajo['periodo']
+
+    try:
+        # Marcar como usado recientemente para la poda por tamaño
+        os.utime(ruta)
+        return send_file(
+            ruta,
+            mimetype=EXPORT_MIMETYPE,
+            as_attachment=True,
+            download_name=f"reporte_plusgraphics_{periodo}.xlsx"
+        )
+    except FileNotFoundError:
+        return jsonify({'error': 'El archivo fue eliminado del cache, cree un nuevo trabajo'}), 410
+
+# -------------------- EXPORTACIÓN MASIVA DE DATOS --------------------
+# Tablas disponibles: SQL base y columna de fecha usada por el filtro desde/hasta
+# (None = la tabla se exporta completa).
+EXPORTACION_TABLAS = OrderedDict([
+    ('clientes', ('SELECT * FROM clientes', None, 'id')),
+    ('ventas', ('SELECT * FROM ventas', 'fecha', 'id')),
+    ('pedidos', ('SELECT * FROM pedidos', 'fecha', 'id')),
+    ('pedido_productos', ('''
+        SELECT pp.*, pr.nombre AS producto, pr.tipo, pr.precio
+        FROM pedido_productos pp
+        JOIN pedidos p ON p.id = pp.pedido_id
+        LEFT JOIN productos pr ON pr.id = pp.producto_id
+    ''', 'p.fecha', 'pp.id')),
+    ('cuentas_por_cobrar', ('SELECT * FROM cuentas_por_cobrar', 'fecha_creacion', 'id')),
+    ('cuentas_por_pagar', ('SELECT * FROM cuentas_por_pagar', 'fecha_creacion', 'id')),
+])
+EXPORTACION_LOTE = 500
+
+class SalidaStreaming(io.RawIOBase):
+    """
+    Destino de escritura para zipfile/gzip que acumula los bytes comprimidos
+    hasta que el generador los cede al cliente. No es seekable, así zipfile
+    escribe cada entrada con data descriptor en lugar de volver atrás.
+    """
+    def __init__(self):
+        self._partes = []
+
+    def writable(self):
+        return True
+
+    def write(self, datos):
+        self._partes.append(bytes(datos))
+        return len(datos)
+
+    def vaciar(self):
+        datos = b''.join(self._partes)
+        self._partes = []
+        return datos
+
+def leer_rango_fechas():
+    """desde/hasta (YYYY-MM-DD, ambos incluidos) del query string; hasta se convierte en límite exclusivo"""
+    desde = request.args.get('desde')
+    hasta = request.args.get('hasta')
+    try:
+        if desde:
+            datetime.strptime(desde, '%Y-%m-%d')
+        if hasta:
+            hasta = (datetime.strptime(hasta, '%Y-%m-%d') + timedelta(days=1)).strftime('%Y-%m-%d')
+    except ValueError:
+        raise ValueError('Las fechas deben tener formato YYYY-MM-DD')
+    return desde, hasta
+
+def bloques_csv(conn, tabla, desde, hasta):
+    """CSV de una tabla en bloques de bytes, leyendo el cursor por lotes"""
+    select_sql, columna_fecha, orden = EXPORTACION_TABLAS[tabla]
+    condiciones = []
+    params = []
+    if columna_fecha and desde:
+        condiciones.append(f'{columna_fecha} >= ?')
+        params.append(desde)
+    if columna_fecha and hasta:
+        condiciones.append(f'{columna_fecha} < ?')
+        params.append(hasta)
+    where = f"WHERE {' AND '.join(condiciones)}" if condiciones else ''
+    cursor = conn.execute(f'{select_sql} {where} ORDER BY {orden}', params)
+
+    texto = io.StringIO()
+    escritor = csv.writer(texto)
+    # BOM para que Excel abra los acentos correctamente
+    texto.write('\ufeff')
+    escritor.writerow([columna[0] for columna in cursor.description])
+    while True:
+        filas = cursor.fetchmany(EXPORTACION_LOTE)
+        if not filas:
+            break
+        escritor.writerows(tuple(fila) for fila in filas)
+        yield texto.getvalue().encode('utf-8')
+        texto.seek(0)
+        texto.truncate()
+    if texto.tell():
+        yield texto.getvalue().encode('utf-8')
+
+def generar_exportacion(tablas, formato, desde, hasta):
+    """
+    Generador del archivo exportado. Usa una conexión propia dentro de una sola
+    transacción de lectura, así todas las tablas salen del mismo snapshot.
+    """
+    conn = tomar_conexion()
+    try:
+        conn.execute('BEGIN')
+        salida = SalidaStreaming()
+        if formato == 'zip':
+            with zipfile.ZipFile(salida, 'w', zipfile.ZIP_DEFLATED) as archivo_zip:
+                for tabla in tablas:
+                    with archivo_zip.open(f'{tabla}.csv', 'w') as destino:
+                        for bloque in bloques_csv(conn, tabla, desde, hasta):
+                            destino.write(bloque)
+                            datos = salida.vaciar()
+                            if datos:
+                                yield datos
+        elif formato == 'gzip':
+            with gzip.GzipFile(fileobj=salida, mode='wb') as archivo_gz:
+                for bloque in bloques_csv(conn, tablas[0], desde, hasta):
+                    archivo_gz.write(bloque)
+                    datos = salida.vaciar()
+                    if datos:
+                        yield datos
+        else:
+            yield from bloques_csv(conn, tablas[0], desde, hasta)
+        datos = salida.vaciar()
+        if datos:
+            yield datos
+    finally:
+        devolver_conexion(conn)
+
+@app.route('/api/exportar/datos', methods=['GET'])
+def exportar_datos():
+    """
+    Exportar tablas completas como CSV, en streaming.
+    Parámetros: tablas (lista separada por comas, por defecto todas),
+    formato (zip | gzip | csv; gzip y csv admiten una sola tabla),
+    desde / hasta (YYYY-MM-DD).
+    """
+    formato = request.args.get('formato', 'zip')
+    tablas = [t.strip() for t in request.args.get('tablas', '').split(',') if t.strip()]
+    tablas = tablas or list(EXPORTACION_TABLAS)
+
+    if formato not in ('zip', 'gzip', 'csv'):
+        return jsonify({'error': 'Formato no soportado, use zip, gzip o csv'}), 400
+    desconocidas = [t for t in tablas if t not in EXPORTACION_TABLAS]
+    if desconocidas:
+        return jsonify({'error': f"Tablas no exportables: {', '.join(desconocidas)}"}), 400
+    if formato != 'zip' and len(tablas) != 1:
+        return jsonify({'error': 'Los formatos gzip y csv exportan una sola tabla, use formato=zip para varias'}), 400
+    try:
+        desde, hasta = leer_rango_fechas()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    sufijo = f"_{request.args['desde']}" if request.args.get('desde') else ''
+    sufijo += f"_{request.args['hasta']}" if request.args.get('hasta') else ''
+    if formato == 'zip':
+        nombre, mimetype = f'plusgraphics_datos{sufijo}.zip', 'application/zip'
+    elif formato == 'gzip':
+        nombre, mimetype = f'{tablas[0]}{sufijo}.csv.gz', 'application/gzip'
+    else:
+        nombre, mimetype = f'{tablas[0]}{sufijo}.csv', 'text/csv'
+
+    respuesta = app.response_class(generar_exportacion(tablas, formato, desde, hasta), mimetype=mimetype)
+    respuesta.headers['Content-Disposition'] = f'attachment; filename={nombre}'
+    return respuesta
+
+# -------------------- OPERACIONES EN LOTE --------------------
+LOTE_MAX_OPERACIONES = 100
+REFERENCIA_RE = re.compile(r'\$(\w+)\.(\w+)')
+
+class ErrorLote(ValueError):
+    pass
+
+def resolver_referencias(valor, resultados):
+    """
+    Reemplazar referencias $<operación>.<campo> por el valor devuelto por una
+    operación anterior. <operación> es el índice o el 'ref' que se le dio.
+    Si el string es solo la referencia se conserva el tipo (ej. un id entero).
+    """
+    if isinstance(valor, dict):
+        return {clave: resolver_referencias(v, resultados) for clave, v in valor.items()}
+    if isinstance(valor, list):
+        return [resolver_referencias(v, resultados) for v in valor]
+    if not isinstance(valor, str) or '$' not in valor:
+        return valor
+
+    def buscar(match):
+        operacion, campo = match.groups()
+        cuerpo = resultados.get(operacion)
+        if cuerpo is None:
+            raise ErrorLote(f'Referencia a una operación inexistente o posterior: {match.group(0)}')
+        if not isinstance(cuerpo, dict) or campo not in cuerpo:
+            raise ErrorLote(f'La operación {operacion} no devolvió el campo {campo}')
+        return cuerpo[campo]
+
+    completa = REFERENCIA_RE.fullmatch(valor)
+    if completa:
+        return buscar(completa)
+    return REFERENCIA_RE.sub(lambda match: str(buscar(match)), valor)
+
+def ejecutar_operacion(adaptador, metodo, ruta, cuerpo):
+    """Despachar una operación a la vista que corresponde, dentro del request actual"""
+    try:
+        endpoint, argumentos = adaptador.match(ruta, method=metodo)
+    except NotFound:
+        raise ErrorLote(f'Ruta no encontrada: {metodo} {ruta}')
+    except MethodNotAllowed:
+        raise ErrorLote(f'Método no permitido: {metodo} {ruta}')
+    if endpoint == 'ejecutar_lote':
+        raise ErrorLote('Un lote no puede contener otro lote')
+
+    with app.test_request_context(ruta, method=metodo, json=cuerpo):
+        respuesta = app.make_response(app.view_functions[endpoint](**argumentos))
+    return respuesta.status_code, respuesta.get_json(silent=True)
+
+@app.route('/api/batch', methods=['POST'])
+def ejecutar_lote():
+    """
+    Ejecutar varias operaciones en una sola transacción.
+    Cuerpo: {"operaciones": [{"metodo": "POST", "ruta": "/api/clientes",
+    "cuerpo": {...}, "ref": "cliente"}, ...]}. Las operaciones posteriores
+    pueden usar $cliente.id (o $0.id) en la ruta y el cuerpo. Si alguna
+    falla se deshace todo el lote.
+    """
+    data = request.get_json(silent=True) or {}
+    operaciones = data.get('operaciones')
+    if not isinstance(operaciones, list) or not operaciones:
+        return jsonify({'error': 'Se requiere una lista de operaciones'}), 400
+    if len(operaciones) > LOTE_MAX_OPERACIONES:
+        return jsonify({'error': f'Máximo {LOTE_MAX_OPERACIONES} operaciones por lote'}), 400
+
+    conn = get_db_connection()
+    lote = ConexionLote(conn)
+    adaptador = app.url_map.bind('')
+    resultados = {}
+    respuestas = []
+
+    # Tomar el lock de escritura desde el inicio para no fallar a mitad del lote
+    conn.execute('BEGIN IMMEDIATE')
+    g.db = lote
+    try:
+        for indice, operacion in enumerate(operaciones):
+            try:
+                if not isinstance(operacion, dict) or 'ruta' not in operacion:
+                    raise ErrorLote('Cada operación necesita al menos una ruta')
+                metodo = str(operacion.get('metodo', 'POST')).upper()
+                ruta = resolver_referencias(operacion['ruta'], resultados)
+                cuerpo = resolver_referencias(operacion.get('cuerpo'), resultados)
+                status, respuesta = ejecutar_operacion(adaptador, metodo, ruta, cuerpo)
+            except ErrorLote as e:
+                status, respuesta = 400, {'error': str(e)}
+            except HTTPException as e:
+                # Errores HTTP de la vista (cuerpo JSON inválido, abort...) con su propio status
+                status, respuesta = e.code or 500, {'error': e.description}
+            except Exception as e:
+                status, respuesta = 500, {'error': str(e)}
+
+            respuestas.append({'status': status, 'cuerpo': respuesta})
+            if status >= 400 or lote.rollback_pedido:
+                conn.rollback()
+                return jsonify({
+                    'error': f'La operación {indice} falló, no se aplicó ningún cambio',
+                    'indice': indice,
+                    'resultados': respuestas
+                }), status if status >= 400 else 500
+
+            resultados[str(indice)] = respuesta
+            if operacion.get('ref'):
+                resultados[str(operacion['ref'])] = respuesta
+
+        conn.commit()
+    finally:
+        g.db = conn
+        if conn.in_transaction:
+            conn.rollback()
+
+    return jsonify({'resultados': respuestas})
+
+# -------------------- BÚSQUEDA --------------------
+PAGINA_BUSQUEDA = 20
+TIPOS_BUSQUEDA = ('cliente', 'producto', 'pedido', 'cuenta_por_cobrar', 'cuenta_por_pagar')
+TOKEN_BUSQUEDA_RE = re.compile(r'\w+')
+
+def consulta_fts(texto):
+    """
+    Convertir el texto del usuario en una consulta FTS5: cada palabra como
+    prefijo entre comillas (sin operadores ni sintaxis especial) y todas
+    deben aparecer. "fac-12" busca documentos con "fac*" y "12*".
+    """
+    palabras = TOKEN_BUSQUEDA_RE.findall(texto.lower())[:10]
+    return ' '.join(f'"{palabra}"*' for palabra in palabras)
+
+@app.route('/api/search', methods=['GET'])
+@etag_por_tablas('clientes', 'productos', 'pedidos', 'cuentas_por_cobrar', 'cuentas_por_pagar')
+def buscar():
+    """
+    Búsqueda de texto completo sobre clientes, productos, notas de pedidos y
+    códigos de factura. Resultados ordenados por relevancia (bm25, el título
+    pesa más que el detalle) y paginados con limit/cursor.
+    Parámetros: q, tipo (lista separada por comas), limit, cursor.
+    """
+    consulta = consulta_fts(request.args.get('q', ''))
+    if not consulta:
+        return jsonify({'error': 'Parámetro q requerido'}), 400
+
+    tipos = [t.strip() for t in request.args.get('tipo', '').split(',') if t.strip()]
+    desconocidos = [t for t in tipos if t not in TIPOS_BUSQUEDA]
+    if desconocidos:
+        return jsonify({'error': f"Tipos de búsqueda inválidos: {', '.join(desconocidos)}"}), 400
+    filtro_tipo = ''
+    params = [consulta]
+    if tipos:
+        filtro_tipo = 'AND tipo IN (SELECT value FROM json_each(?))'
+        params.append(json.dumps(tipos))
+
+    paginacion = leer_paginacion() or (PAGINA_BUSQUEDA, None)
+    conn = get_db_connection()
+    filas, siguiente = consulta_paginada(conn, f'''
+        SELECT * FROM (
+            SELECT tipo, ref_id AS id, titulo,
+                   snippet(busqueda, 3, '', '', '…', 12) AS fragmento,
+                   bm25(busqueda, 0, 0, 10.0, 1.0) AS puntaje,
+                   rowid AS documento
+            FROM busqueda
+            WHERE busqueda MATCH ? {filtro_tipo}
+        )
+    ''', [('puntaje', 'puntaje'), ('documento', 'documento')], paginacion, params=params)
+
+    items = []
+    for fila in filas:
+        item = dict(fila)
+        del item['documento']
+        item['fragmento'] = (item['fragmento'] or '').strip()
+        items.append(item)
+    return jsonify({'items': items, 'next_cursor': siguiente, 'limit': paginacion[0]})
+
 @app.route('/')
 def landing():
     """Landing page mientras se carga frontend"""
@@ -1841,124 +2912,114 @@ def landing():
     </html>
     '''
 
+# Tablas de las que dependen las estadísticas del dashboard
+DASHBOARD_TABLAS = ('ventas', 'pedidos', 'productos', 'clientes', 'cuentas_por_pagar', 'cuentas_por_cobrar')
+dashboard_cache = CacheVersionada(max_entradas=1)
+
+def calcular_dashboard_stats(conn):
+    """
+    Calcular las estadisticas del dashboard. El esquema lo garantizan las
+    migraciones, así que un error en una consulta llega a la ruta como 500
+    en vez de devolverse (y cachearse) como ceros.
+    """
+    cursor = conn.cursor()
+    
+    # 1. Ganancias totales (suma de TODAS las ventas)
+    cursor.execute('SELECT COALESCE(SUM(total), 0) FROM ventas')
+    ganancias_totales = cursor.fetchone()[0]
+    
+    # 2. Entregas pendientes (pedidos NO completados)
+    cursor.execute('''
+        SELECT COUNT(*) FROM pedidos 
+        WHERE estado NOT IN ("completado", "entregado", "finalizado")
+    ''')
+    entregas_pendientes = cursor.fetchone()[0] or 0
+    
+    # 3. Servicios disponibles (productos) - SIN FILTRO ESTADO
+    cursor.execute('SELECT COUNT(*) FROM productos')
+    servicios_disponibles = cursor.fetchone()[0] or 0
+    print(f"📦 Productos encontrados: {servicios_disponibles}")
+    
+    # 4. Total por pagar
+    cursor.execute('''
+        SELECT COALESCE(SUM(saldo), 0) FROM cuentas_por_pagar 
+        WHERE estado = "pendiente"
+    ''')
+    total_por_pagar = cursor.fetchone()[0] or 0
+    
+    # 5. Total por cobrar
+    cursor.execute('''
+        SELECT COALESCE(SUM(saldo), 0) FROM cuentas_por_cobrar 
+        WHERE estado = "pendiente"
+    ''')
+    total_por_cobrar = cursor.fetchone()[0] or 0
+    
+    # 6. Facturas vencidas
+    cursor.execute('''
+        SELECT COUNT(*) FROM cuentas_por_pagar 
+        WHERE estado = "pendiente" AND fecha_vencimiento < date('now')
+    ''')
+    facturas_vencidas = cursor.fetchone()[0] or 0
+    
+    # 7. Pedidos recientes, con el primer producto de cada uno
+    cursor.execute('''
+        SELECT p.id, c.nombre,
+               (SELECT pr.nombre FROM pedido_productos pp
+                JOIN productos pr ON pp.producto_id = pr.id
+                WHERE pp.pedido_id = p.id ORDER BY pp.id LIMIT 1),
+               p.total, p.fecha, p.estado, p.item_count
+        FROM pedidos p 
+        LEFT JOIN clientes c ON p.cliente_id = c.id
+        ORDER BY p.fecha DESC LIMIT 5
+    ''')
+    pedidos_recientes = [
+        {
+            'id': row[0],
+            'cliente': row[1] or 'Sin nombre',
+            'producto': row[2] or 'Sin producto',
+            'total': float(row[3]) if row[3] else 0,
+            'fecha': row[4],
+            'estado': row[5] or 'pendiente',
+            'item_count': row[6] or 0
+        } for row in cursor.fetchall()
+    ]
+    
+    result = {
+        'ganancias_totales': float(ganancias_totales),
+        'entregas_pendientes': entregas_pendientes,
+        'servicios_disponibles': servicios_disponibles,
+        'total_por_pagar': float(total_por_pagar),
+        'total_por_cobrar': float(total_por_cobrar),
+        'facturas_vencidas': facturas_vencidas,
+        'pedidos_recientes': pedidos_recientes
+    }
+    
+    print(f"📊 Dashboard stats calculadas: {result}")
+    return result
+
 @app.route('/api/dashboard/stats', methods=['GET'])
 def get_dashboard_stats():
-    """Estadisticas dashboard - DATOS REALES"""
+    """Estadisticas dashboard - DATOS REALES, recalculadas solo cuando cambian los datos"""
     try:
-        conn = sqlite3.connect('database.db')
-        cursor = conn.cursor()
-        
-        # Verificar si las tablas existen primero
-        cursor.execute("SELECT name FROM sqlite_master WHERE type='table'")
-        tables = [row[0] for row in cursor.fetchall()]
-        print(f"📋 Tablas encontradas: {tables}")
-        
-        # 1. Ganancias totales (suma de TODAS las ventas)
-        ganancias_totales = 0
-        if 'ventas' in tables:
-            cursor.execute('SELECT COALESCE(SUM(total), 0) FROM ventas')
-            ganancias_totales = cursor.fetchone()[0]
-        
-        # 2. Entregas pendientes (pedidos NO completados)
-        entregas_pendientes = 0
-        if 'pedidos' in tables:
-            cursor.execute('''
-                SELECT COUNT(*) FROM pedidos 
-                WHERE estado NOT IN ("completado", "entregado", "finalizado")
-            ''')
-            entregas_pendientes = cursor.fetchone()[0] or 0
-        
-        # 3. Servicios disponibles (productos) - SIN FILTRO ESTADO
-        servicios_disponibles = 0
-        if 'productos' in tables:
-            cursor.execute('SELECT COUNT(*) FROM productos')
-            servicios_disponibles = cursor.fetchone()[0] or 0
-            print(f"📦 Productos encontrados: {servicios_disponibles}")
-        
-        # 4. Total por pagar (solo si tabla existe)
-        total_por_pagar = 0
-        if 'cuentas_por_pagar' in tables:
-            try:
-                cursor.execute('''
-                    SELECT COALESCE(SUM(saldo), 0) FROM cuentas_por_pagar 
-                    WHERE estado = "pendiente"
-                ''')
-                total_por_pagar = cursor.fetchone()[0] or 0
-            except Exception as e:
-                print(f"⚠️ Error en cuentas_por_pagar: {str(e)}")
-                total_por_pagar = 0
-        
-        # 5. Total por cobrar (solo si tabla existe)
-        total_por_cobrar = 0
-        if 'cuentas_por_cobrar' in tables:
-            try:
-                cursor.execute('''
-                    SELECT COALESCE(SUM(saldo), 0) FROM cuentas_por_cobrar 
-                    WHERE estado = "pendiente"
-                ''')
-                total_por_cobrar = cursor.fetchone()[0] or 0
-            except Exception as e:
-                print(f"⚠️ Error en cuentas_por_cobrar: {str(e)}")
-                total_por_cobrar = 0
-        
-        # 6. Facturas vencidas (solo si tabla existe)
-        facturas_vencidas = 0
-        if 'cuentas_por_pagar' in tables:
-            try:
-                cursor.execute('''
-                    SELECT COUNT(*) FROM cuentas_por_pagar 
-                    WHERE estado = "pendiente" AND fecha_vencimiento < date('now')
-                ''')
-                facturas_vencidas = cursor.fetchone()[0] or 0
-            except Exception as e:
-                print(f"⚠️ Error calculando facturas vencidas: {str(e)}")
-                facturas_vencidas = 0
-        
-        # 7. Pedidos recientes (solo si tablas existen)
-        pedidos_recientes = []
-        if 'pedidos' in tables and 'clientes' in tables and 'productos' in tables:
-            try:
-                cursor.execute('''
-                    SELECT p.id, c.nombre, pr.nombre, p.total, p.fecha, p.estado
-                    FROM pedidos p 
-                    LEFT JOIN clientes c ON p.cliente_id = c.id
-                    LEFT JOIN productos pr ON p.producto_id = pr.id
-                    ORDER BY p.fecha DESC LIMIT 5
-                ''')
-                pedidos_data = cursor.fetchall()
-                pedidos_recientes = [
-                    {
-                        'id': row[0],
-                        'cliente': row[1] or 'Sin nombre',
-                        'producto': row[2] or 'Sin producto',
-                        'total': float(row[3]) if row[3] else 0,
-                        'fecha': row[4],
-                        'estado': row[5] or 'pendiente'
-                    } for row in pedidos_data
-                ]
-            except Exception as e:
-                print(f"⚠️ Error en pedidos recientes: {str(e)}")
-                pedidos_recientes = []
-        
-        conn.close()
+        conn = get_db_connection()
         
-        result = {
-            'ganancias_totales': float(ganancias_totales),
-            'entregas_pendientes': entregas_pendientes,
-            'servicios_disponibles': servicios_disponibles,
-            'total_por_pagar': float(total_por_pagar),
-            'total_por_cobrar': float(total_por_cobrar),
-            'facturas_vencidas': facturas_vencidas,
-            'pedidos_recientes': pedidos_recientes
-        }
+        # facturas_vencidas compara contra date('now') (UTC), así que el día entra en la versión
+        version = version_datos(conn, DASHBOARD_TABLAS) + (datetime.now(timezone.utc).strftime('%Y-%m-%d'),)
+        result, hit = dashboard_cache.obtener('stats', version, lambda: calcular_dashboard_stats(conn))
         
-        print(f"📊 Dashboard stats calculadas: {result}")
-        return jsonify(result)
+        response = jsonify(result)
+        response.headers['X-Cache'] = 'HIT' if hit else 'MISS'
+        return response
         
     except Exception as e:
         print(f"❌ Error en dashboard stats: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/dashboard/stats/cache', methods=['GET'])
+def get_dashboard_stats_cache():
+    """Aciertos y fallos del cache de estadisticas del dashboard"""
+    return jsonify(dashboard_cache.estadisticas())
+
 @app.route('/api/debug/database', methods=['GET'])
 def debug_database():
     """Debug: verificar contenido base de datos"""
@@ -1981,8 +3042,6 @@ def debug_database():
         cursor.execute('SELECT * FROM pedidos LIMIT 3')
         pedidos_sample = cursor.fetchall()
         
-        conn.close()
-        
         return jsonify({
             'tabla_counts': counts,
             'ventas_sample': [dict(row) for row in ventas_sample],
@@ -1997,7 +3056,7 @@ def debug_database():
 def system_diagnosis():
     """Diagnostico completo del sistema"""
     try:
-        conn = sqlite3.connect('database.db')
+        conn = get_db_connection()
         cursor = conn.cursor()
         
         # Verificar todas las tablas y contenido
@@ -2026,14 +3085,14 @@ def system_diagnosis():
         diagnosis['clientes_sample'] = [{'id': r[0], 'nombre': r[1]} for r in clientes_data]
         
         # PRODUCTOS
-        cursor.execute('SELECT id, nombre, precio, estado FROM productos LIMIT 5')
+        cursor.execute('SELECT id, nombre, precio, tipo FROM productos LIMIT 5')
         productos_data = cursor.fetchall()
-        diagnosis['productos_sample'] = [{'id': r[0], 'nombre': r[1], 'precio': r[2], 'estado': r[3]} for r in productos_data]
+        diagnosis['productos_sample'] = [{'id': r[0], 'nombre': r[1], 'precio': r[2], 'tipo': r[3]} for r in productos_data]
         
         # PEDIDOS
-        cursor.execute('SELECT id, cliente_id, producto_id, total, estado, fecha FROM pedidos ORDER BY id DESC LIMIT 5')
+        cursor.execute('SELECT id, cliente_id, item_count, total, estado, fecha FROM pedidos ORDER BY id DESC LIMIT 5')
         pedidos_data = cursor.fetchall()
-        diagnosis['pedidos_sample'] = [{'id': r[0], 'cliente_id': r[1], 'producto_id': r[2], 'total': r[3], 'estado': r[4], 'fecha': r[5]} for r in pedidos_data]
+        diagnosis['pedidos_sample'] = [{'id': r[0], 'cliente_id': r[1], 'item_count': r[2], 'total': r[3], 'estado': r[4], 'fecha': r[5]} for r in pedidos_data]
         
         # VENTAS
         cursor.execute('SELECT id, cliente_id, producto_id, total, fecha FROM ventas ORDER BY id DESC LIMIT 5')
@@ -2046,8 +3105,8 @@ def system_diagnosis():
         cursor.execute('SELECT SUM(total) FROM ventas')
         total_ventas = cursor.fetchone()[0] or 0
         
-        # Total productos activos
-        cursor.execute('SELECT COUNT(*) FROM productos WHERE estado = "activo" OR estado = "Activo"')
+        # Total productos (la tabla no tiene columna estado)
+        cursor.execute('SELECT COUNT(*) FROM productos')
         productos_activos = cursor.fetchone()[0] or 0
         
         # Pedidos pendientes
@@ -2070,8 +3129,6 @@ def system_diagnosis():
             'total_por_cobrar': total_por_cobrar
         }
         
-        conn.close()
-        
         return jsonify(diagnosis)
         
     except Exception as e:
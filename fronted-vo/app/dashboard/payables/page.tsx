@@ -13,6 +13,7 @@ import { useState, useEffect } from "react"
 
 // API Configuration
 const API_BASE_URL = process.env.NEXT_PUBLIC_API_URL || 'https://plus-graphics.onrender.com'
+const PAGE_SIZE = 100
 
 interface CuentaPorPagar {
   id: number
@@ -44,6 +45,8 @@ export default function PayablesPage() {
     proximas_vencer: 0
   })
   const [loading, setLoading] = useState(true)
+  const [nextCursor, setNextCursor] = useState<string | null>(null)
+  const [loadingMore, setLoadingMore] = useState(false)
   const [isDialogOpen, setIsDialogOpen] = useState(false)
   const [selectedAccount, setSelectedAccount] = useState<CuentaPorPagar | null>(null)
   
@@ -62,16 +65,13 @@ export default function PayablesPage() {
 
   const loadData = async () => {
     try {
-      const [payablesRes, statsRes] = await Promise.all([
-        fetch(`${API_BASE_URL}/api/cuentas-por-pagar`),
-        fetch(`${API_BASE_URL}/api/cuentas-por-pagar/stats`)
-      ])
-      
+      // Primera página y estadísticas en una sola respuesta
+      const payablesRes = await fetch(`${API_BASE_URL}/api/cuentas-por-pagar?limit=${PAGE_SIZE}&stats=1`)
       const payablesData = await payablesRes.json()
-      const statsData = await statsRes.json()
       
-      setPayables(payablesData)
-      setStats(statsData)
+      setPayables(payablesData.items)
+      setNextCursor(payablesData.next_cursor)
+      setStats(payablesData.stats)
     } catch (error) {
       console.error('Error cargando datos:', error)
     } finally {
@@ -79,6 +79,21 @@ export default function PayablesPage() {
     }
   }
 
+  const loadMore = async () => {
+    if (!nextCursor) return
+    setLoadingMore(true)
+    try {
+      const response = await fetch(`${API_BASE_URL}/api/cuentas-por-pagar?limit=${PAGE_SIZE}&cursor=${encodeURIComponent(nextCursor)}`)
+      const data = await response.json()
+      setPayables((prev) => [...prev, ...data.items])
+      setNextCursor(data.next_cursor)
+    } catch (error) {
+      console.error('Error cargando más cuentas:', error)
+    } finally {
+      setLoadingMore(false)
+    }
+  }
+
   const handleMarcarPagado = async (id: number) => {
     try {
       const response = await fetch(`${API_BASE_URL}/api/cuentas-por-pagar/${id}/marcar-pagado`, {
@@ -352,6 +367,13 @@ export default function PayablesPage() {
               )}
             </TableBody>
           </Table>
+          {nextCursor && (
+            <div className="flex justify-center pt-4">
+              <Button variant="outline" onClick={loadMore} disabled={loadingMore}>
+                {loadingMore ? 'Cargando...' : 'Cargar más'}
+              </Button>
+            </div>
+          )}
         </CardContent>
       </Card>
 
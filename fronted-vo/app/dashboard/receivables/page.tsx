@@ -14,6 +14,7 @@ import { useState, useEffect } from "react"
 
 // API Configuration
 const API_BASE_URL = process.env.NEXT_PUBLIC_API_URL || 'https://plus-graphics.onrender.com'
+const PAGE_SIZE = 100
 
 interface CuentaPorCobrar {
   id: number
@@ -53,6 +54,8 @@ export default function ReceivablesPage() {
     total_facturas: 0
   })
   const [loading, setLoading] = useState(true)
+  const [nextCursor, setNextCursor] = useState<string | null>(null)
+  const [loadingMore, setLoadingMore] = useState(false)
   const [isDialogOpen, setIsDialogOpen] = useState(false)
   
   // Estados para formulario de nueva cuenta
@@ -73,16 +76,13 @@ export default function ReceivablesPage() {
 
   const loadData = async () => {
     try {
-      const [receivablesRes, statsRes] = await Promise.all([
-        fetch(`${API_BASE_URL}/api/cuentas-por-cobrar`),
-        fetch(`${API_BASE_URL}/api/cuentas-por-cobrar/stats`)
-      ])
-      
+      // Primera página y estadísticas en una sola respuesta
+      const receivablesRes = await fetch(`${API_BASE_URL}/api/cuentas-por-cobrar?limit=${PAGE_SIZE}&stats=1`)
       const receivablesData = await receivablesRes.json()
-      const statsData = await statsRes.json()
       
-      setReceivables(receivablesData)
-      setStats(statsData)
+      setReceivables(receivablesData.items)
+      setNextCursor(receivablesData.next_cursor)
+      setStats(receivablesData.stats)
     } catch (error) {
       console.error('Error cargando datos:', error)
     } finally {
@@ -100,6 +100,21 @@ export default function ReceivablesPage() {
     }
   }
 
+  const loadMore = async () => {
+    if (!nextCursor) return
+    setLoadingMore(true)
+    try {
+      const response = await fetch(`${API_BASE_URL}/api/cuentas-por-cobrar?limit=${PAGE_SIZE}&cursor=${encodeURIComponent(nextCursor)}`)
+      const data = await response.json()
+      setReceivables((prev) => [...prev, ...data.items])
+      setNextCursor(data.next_cursor)
+    } catch (error) {
+      console.error('Error cargando más cuentas:', error)
+    } finally {
+      setLoadingMore(false)
+    }
+  }
+
   const handleMarcarPagado = async (id: number) => {
     try {
       const response = await fetch(`${API_BASE_URL}/api/cuentas-por-cobrar/${id}/marcar-pagado`, {
@@ -380,6 +395,13 @@ export default function ReceivablesPage() {
               )}
             </TableBody>
           </Table>
+          {nextCursor && (
+            <div className="flex justify-center pt-4">
+              <Button variant="outline" onClick={loadMore} disabled={loadingMore}>
+                {loadingMore ? 'Cargando...' : 'Cargar más'}
+              </Button>
+            </div>
+          )}
         </CardContent>
       </Card>
     </div>
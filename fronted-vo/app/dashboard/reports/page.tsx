@@ -72,31 +72,20 @@ export default function ReportsPage() {
     try {
       console.log('🔄 Cargando datos de reportes para periodo:', periodoSeleccionado)
       
-      const endpoints = [
-        `${API_BASE_URL}/api/reportes/dashboard?periodo=${periodoSeleccionado}`,
-        `${API_BASE_URL}/api/reportes/ingresos-tipo?periodo=${periodoSeleccionado}`,
-        `${API_BASE_URL}/api/reportes/tendencia?periodo=${periodoSeleccionado}`,
-        `${API_BASE_URL}/api/reportes/productos-top?periodo=${periodoSeleccionado}`,
-        `${API_BASE_URL}/api/reportes/clientes-top?periodo=${periodoSeleccionado}`
-      ]
-      
-      const responses = await Promise.all(
-        endpoints.map(url => fetch(url).then(res => res.json()))
-      )
+      // Todas las secciones en un solo request
+      const response = await fetch(`${API_BASE_URL}/api/reportes/bundle?periodo=${periodoSeleccionado}`)
+      if (!response.ok) {
+        throw new Error(`HTTP error! status: ${response.status}`)
+      }
+      const bundle = await response.json()
       
-      console.log('📊 Datos de reportes cargados:', {
-        dashboard: responses[0],
-        ingresos: responses[1],
-        tendencia: responses[2],
-        productos: responses[3],
-        clientes: responses[4]
-      })
+      console.log('📊 Datos de reportes cargados:', bundle)
       
-      setDashboardData(responses[0])
-      setIngresosData(responses[1])
-      setTendenciaData(responses[2] || [])
-      setProductosTop(responses[3] || [])
-      setClientesTop(responses[4] || [])
+      setDashboardData(bundle.dashboard)
+      setIngresosData(bundle.ingresos_tipo)
+      setTendenciaData(bundle.tendencia || [])
+      setProductosTop(bundle.productos_top || [])
+      setClientesTop(bundle.clientes_top || [])
       
     } catch (err) {
       setError('Error al cargar los datos de reportes')
@@ -109,7 +98,29 @@ export default function ReportsPage() {
   // Función para exportar
   const exportarReporte = async () => {
     try {
-      const response = await fetch(`${API_BASE_URL}/api/reportes/exportar?periodo=${periodo}&formato=excel`)
+      // Crear el trabajo de exportación y esperar a que el archivo esté listo
+      const jobResponse = await fetch(`${API_BASE_URL}/api/reportes/exportar/trabajos`, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ periodo })
+      })
+      if (!jobResponse.ok) {
+        setError('Error al exportar el reporte')
+        return
+      }
+      let trabajo = await jobResponse.json()
+      while (trabajo.estado === 'pendiente' || trabajo.estado === 'procesando') {
+        await new Promise(resolve => setTimeout(resolve, 1000))
+        const statusResponse = await fetch(`${API_BASE_URL}/api/reportes/exportar/trabajos/${trabajo.id}`)
+        if (!statusResponse.ok) break
+        trabajo = await statusResponse.json()
+      }
+      if (trabajo.estado !== 'listo') {
+        setError('Error al exportar el reporte')
+        return
+      }
+      
+      const response = await fetch(`${API_BASE_URL}${trabajo.descarga}`)
       
       if (response.ok) {
         const blob = await response.blob()
@@ -1,6 +1,6 @@
 "use client"
 
-import { useState, useEffect } from "react"
+import { useState, useEffect, useRef } from "react"
 import { Button } from "@/components/ui/button"
 import { Card, CardContent, CardHeader, CardTitle } from "@/components/ui/card"
 import { Input } from "@/components/ui/input"
@@ -38,6 +38,13 @@ export default function SalesPage() {
   const [loading, setLoading] = useState(true)
   const [isProcessing, setIsProcessing] = useState(false)
   const [error, setError] = useState("")
+  // Identificador de la venta en curso: se reutiliza en los reintentos para
+  // que el backend no registre dos veces el mismo item
+  const checkoutIdRef = useRef<string | null>(null)
+
+  useEffect(() => {
+    checkoutIdRef.current = null
+  }, [cart, selectedCustomer, estadoPago])
 
   // Cargar datos del backend
   const loadData = async () => {
@@ -125,6 +132,9 @@ export default function SalesPage() {
     if (cart.length === 0 || !selectedCustomer) return
 
     setIsProcessing(true)
+    if (!checkoutIdRef.current) {
+      checkoutIdRef.current = crypto.randomUUID()
+    }
 
     try {
       // Buscar cliente por nombre
@@ -146,7 +156,7 @@ export default function SalesPage() {
           estado_pago: estadoPago
         }
 
-        const response = await api.registrarVenta(ventaData)
+        const response = await api.registrarVenta(ventaData, `${checkoutIdRef.current}-${item.id}`)
         
         if (!response.ok) {
           throw new Error(`Error al registrar venta de ${item.nombre}`)
@@ -157,11 +157,16 @@ export const api = {
     return makeRequest('/ventas')
   },
 
-  registrarVenta: async (venta) => {
-    return makeRequest('/ventas', {
+  registrarVenta: async (venta, idempotencyKey) => {
+    const options = {
       method: 'POST',
       body: JSON.stringify(venta)
-    })
+    }
+    // Misma clave en los reintentos = el backend devuelve la venta ya registrada
+    if (idempotencyKey) {
+      options.headers = { 'Content-Type': 'application/json', 'Idempotency-Key': idempotencyKey }
+    }
+    return makeRequest('/ventas', options)
   },
 
   eliminarVenta: async (id) => {
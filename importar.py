@@ -0,0 +1,446 @@
+#!/usr/bin/env python3
+"""
+Importación masiva de datos.
+
+- clientes / productos desde CSV: lee el archivo fila por fila, valida cada
+  registro, descarta duplicados (contra la base y dentro del mismo archivo)
+  y guarda en lotes con executemany, haciendo commit al final de cada lote.
+- ventas históricas desde Excel: recorre la hoja en modo read_only, resuelve
+  clientes y productos por nombre y confirma por lotes guardando un
+  checkpoint en la tabla importaciones, así una corrida interrumpida retoma
+  desde el último lote confirmado. Igual que en la API, cada venta con
+  estado_pago 'pendiente' crea su cuenta por cobrar (número de la serie FAC,
+  vencimiento a 30 días de la fecha de la venta).
+
+Uso:
+    python importar.py clientes clientes.csv
+    python importar.py productos productos.csv --lote 1000
+    python importar.py ventas historico.xlsx [--hoja Ventas] [--lote 1000] [--crear-clientes]
+"""
+
+import csv
+import hashlib
+import os
+import re
+import sqlite3
+import sys
+from datetime import date, datetime
+
+from openpyxl import load_workbook
+
+from mantenimiento import acumular_ventas_diarias, recalcular_totales_pedidos, reservar_codigos
+
+TAMANO_LOTE = 500
+MAX_ERRORES_REPORTADOS = 500
+TIPOS_PRODUCTO = ('gfx', 'vfx')
+EMAIL_RE = re.compile(r'^[^@\s]+@[^@\s]+\.[^@\s]+$')
+
+def normalizar(valor):
+    return (valor or '').strip()
+
+def validar_cliente(fila):
+    """
+    Devuelve (registro, claves de duplicado) o lanza ValueError. La fila es
+    duplicada si ya se vio su primera clave; todas quedan marcadas como vistas.
+    """
+    nombre = normalizar(fila.get('nombre'))
+    email = normalizar(fila.get('email')).lower()
+    if not nombre:
+        raise ValueError('El nombre es obligatorio')
+    if email and not EMAIL_RE.match(email):
+        raise ValueError(f'Email inválido: {email}')
+    registro = (nombre, email, normalizar(fila.get('telefono')),
+                normalizar(fila.get('direccion')), normalizar(fila.get('notas')))
+    # Con email se deduplica por email; sin email, por nombre (contra todos
+    # los clientes, tengan email o no)
+    if email:
+        return registro, (('email', email), ('nombre', nombre.lower()))
+    return registro, (('nombre', nombre.lower()),)
+
+def validar_producto(fila):
+    nombre = normalizar(fila.get('nombre'))
+    tipo = normalizar(fila.get('tipo')).lower()
+    if not nombre:
+        raise ValueError('El nombre es obligatorio')
+    if tipo not in TIPOS_PRODUCTO:
+        raise ValueError(f"Tipo inválido: '{tipo}' (use {' o '.join(TIPOS_PRODUCTO)})")
+    try:
+        precio = float(normalizar(fila.get('precio')).replace('$', '').replace(',', ''))
+    except ValueError:
+        raise ValueError(f"Precio inválido: '{fila.get('precio')}'")
+    if precio < 0:
+        raise ValueError('El precio no puede ser negativo')
+    registro = (nombre, tipo, precio, normalizar(fila.get('descripcion')))
+    return registro, (('nombre', nombre.lower()),)
+
+def claves_clientes(conn):
+    claves = set()
+    for nombre, email in conn.execute('SELECT nombre, email FROM clientes'):
+        if email:
+            claves.add(('email', email.strip().lower()))
+        claves.add(('nombre', (nombre or '').strip().lower()))
+    return claves
+
+def claves_productos(conn):
+    return {('nombre', (nombre or '').strip().lower()) for (nombre,) in conn.execute('SELECT nombre FROM productos')}
+
+IMPORTADORES = {
+    'clientes': {
+        'columnas': ('nombre',),
+        'validar': validar_cliente,
+        'existentes': claves_clientes,
+        'insert': 'INSERT INTO clientes (nombre, email, telefono, direccion, notas) VALUES (?, ?, ?, ?, ?)'
+    },
+    'productos': {
+        'columnas': ('nombre', 'tipo', 'precio'),
+        'validar': validar_producto,
+        'existentes': claves_productos,
+        'insert': 'INSERT INTO productos (nombre, tipo, precio, descripcion) VALUES (?, ?, ?, ?)'
+    }
+}
+
+def importar_csv(conn, tabla, archivo, tamano_lote=TAMANO_LOTE):
+    """
+    Importar el CSV `archivo` (objeto de texto) en `tabla`.
+    Devuelve un resumen con insertados, duplicados y los errores por fila
+    (número de línea del CSV, contando el encabezado como línea 1). Si el
+    archivo no se puede seguir leyendo (codificación o CSV mal formado), la
+    importación se corta ahí: los lotes ya confirmados quedan, el lote en
+    curso se descarta y el motivo va en resumen['error'].
+    """
+    importador = IMPORTADORES[tabla]
+    lector = csv.DictReader(archivo)
+    encabezados = [normalizar(c).lower() for c in (lector.fieldnames or [])]
+    faltantes = [c for c in importador['columnas'] if c not in encabezados]
+    if faltantes:
+        raise ValueError(f"Faltan columnas en el CSV: {', '.join(faltantes)}")
+    lector.fieldnames = encabezados
+
+    vistas = importador['existentes'](conn)
+    resumen = {'tabla': tabla, 'procesadas': 0, 'insertados': 0, 'duplicados': 0,
+               'total_errores': 0, 'errores': []}
+    lote = []
+
+    def guardar_lote():
+        conn.executemany(importador['insert'], lote)
+        conn.commit()
+        resumen['insertados'] += len(lote)
+        lote.clear()
+
+    try:
+        for fila in lector:
+            resumen['procesadas'] += 1
+            linea = lector.line_num
+            try:
+                registro, claves = importador['validar'](fila)
+            except ValueError as e:
+                resumen['total_errores'] += 1
+                if len(resumen['errores']) < MAX_ERRORES_REPORTADOS:
+                    resumen['errores'].append({'linea': linea, 'error': str(e)})
+                continue
+            if claves[0] in vistas:
+                resumen['duplicados'] += 1
+                continue
+            vistas.update(claves)
+            lote.append(registro)
+            if len(lote) >= tamano_lote:
+                guardar_lote()
+    except (UnicodeDecodeError, csv.Error) as e:
+        resumen['error'] = f'Importación interrumpida después de la línea {lector.line_num}: {e}'
+        return resumen
+
+    if lote:
+        guardar_lote()
+    return resumen
+
+# -------------------- VENTAS HISTÓRICAS DESDE EXCEL --------------------
+TAMANO_LOTE_VENTAS = 1000
+COLUMNAS_VENTAS = ('fecha', 'cliente', 'producto')
+ESTADOS_PAGO = ('pagado', 'pendiente')
+DIAS_VENCIMIENTO = 30
+FORMATOS_FECHA = ('%Y-%m-%d %H:%M:%S', '%Y-%m-%d', '%d/%m/%Y %H:%M', '%d/%m/%Y')
+
+def huella_archivo(ruta):
+    """sha1 del contenido, leído por bloques, para reconocer el archivo al reanudar"""
+    huella = hashlib.sha1()
+    with open(ruta, 'rb') as archivo:
+        for bloque in iter(lambda: archivo.read(1024 * 1024), b''):
+            huella.update(bloque)
+    return huella.hexdigest()
+
+def normalizar_fecha(valor):
+    if isinstance(valor, datetime):
+        return valor.strftime('%Y-%m-%d %H:%M:%S')
+    if isinstance(valor, date):
+        return valor.strftime('%Y-%m-%d 00:00:00')
+    texto = normalizar(str(valor) if valor is not None else '')
+    for formato in FORMATOS_FECHA:
+        try:
+            return datetime.strptime(texto, formato).strftime('%Y-%m-%d %H:%M:%S')
+        except ValueError:
+            pass
+    raise ValueError(f"Fecha inválida: '{texto}'")
+
+def leer_numero(valor, campo):
+    """Número de una celda; None si está vacía"""
+    if valor is None or isinstance(valor, (int, float)):
+        return valor
+    texto = normalizar(str(valor)).replace('$', '').replace(',', '')
+    if not texto:
+        return None
+    try:
+        return float(texto)
+    except ValueError:
+        raise ValueError(f"{campo} inválido: '{valor}'")
+
+def texto_celda(valor):
+    return normalizar(str(valor)) if valor is not None else ''
+
+def crear_cuentas_pendientes(conn, ultimo_id):
+    """
+    Cuentas por cobrar de las ventas pendientes con id mayor a `ultimo_id`,
+    como las que crea registrar_venta: saldo igual al total y vencimiento a
+    DIAS_VENCIMIENTO de la venta. Los números FAC se reservan de una vez.
+    """
+    pendientes = conn.execute(
+        "SELECT id, cliente_id, pedido_id, total, fecha FROM ventas WHERE id > ? AND estado_pago = 'pendiente' ORDER BY id",
+        (ultimo_id,)
+    ).fetchall()
+    if not pendientes:
+        return
+    codigos = reservar_codigos(conn, 'FAC', len(pendientes))
+    conn.executemany('''
+        INSERT INTO cuentas_por_cobrar
+        (numero_factura, cliente_id, venta_id, pedido_id, monto, saldo, fecha_vencimiento, estado)
+        VALUES (?, ?, ?, ?, ?, ?, DATE(?, ?), 'pendiente')
+    ''', [(codigo, cliente_id, venta_id, pedido_id, total, total, fecha, f'+{DIAS_VENCIMIENTO} days')
+          for codigo, (venta_id, cliente_id, pedido_id, total, fecha) in zip(codigos, pendientes)])
+
+def importar_ventas_excel(conn, ruta, hoja=None, tamano_lote=TAMANO_LOTE_VENTAS, crear_clientes=False):
+    """
+    Importar ventas históricas desde la hoja `hoja` (por defecto la primera).
+    Columnas: fecha, cliente, producto y opcionalmente cantidad, total,
+    estado_pago y pedido. Las filas con la misma referencia de pedido se
+    agrupan en un pedido completado con sus líneas en pedido_productos.
+    Cada lote se confirma junto con su checkpoint; si el archivo ya se
+    importó parcialmente se continúa desde la última fila confirmada.
+    """
+    huella = huella_archivo(ruta)
+    wb = load_workbook(ruta, read_only=True, data_only=True)
+    try:
+        ws = wb[hoja] if hoja else wb.worksheets[0]
+        encabezado = next(ws.iter_rows(max_row=1, values_only=True), ())
+        columnas = {texto_celda(c).lower(): i for i, c in enumerate(encabezado) if c is not None}
+        faltantes = [c for c in COLUMNAS_VENTAS if c not in columnas]
+        if faltantes:
+            raise ValueError(f"Faltan columnas en la hoja: {', '.join(faltantes)}")
+
+        importacion = conn.execute(
+            'SELECT id, filas_procesadas, estado FROM importaciones WHERE huella = ? AND hoja = ?',
+            (huella, ws.title)
+        ).fetchone()
+        if importacion is None:
+            importacion_id = conn.execute(
+                'INSERT INTO importaciones (archivo, huella, hoja) VALUES (?, ?, ?)',
+                (os.path.basename(ruta), huella, ws.title)
+            ).lastrowid
+            conn.commit()
+            ya_procesadas, estado = 0, 'en_proceso'
+        else:
+            importacion_id, ya_procesadas, estado = importacion
+
+        resumen = {'importacion_id': importacion_id, 'hoja': ws.title, 'reanudada_desde': ya_procesadas,
+                   'filas_procesadas': ya_procesadas, 'insertados': 0, 'pedidos_creados': 0,
+                   'clientes_creados': 0, 'total_errores': 0, 'errores': [],
+                   'completada': False, 'ya_importada': estado == 'completada'}
+        if resumen['ya_importada']:
+            resumen['completada'] = True
+            return resumen
+
+        # Mapas de búsqueda por nombre; ante nombres repetidos gana el id más bajo
+        clientes = {}
+        for cliente_id, nombre in conn.execute('SELECT id, nombre FROM clientes ORDER BY id'):
+            clientes.setdefault(normalizar(nombre).lower(), cliente_id)
+        productos = {}
+        for producto_id, nombre, precio in conn.execute('SELECT id, nombre, precio FROM productos ORDER BY id'):
+            productos.setdefault(normalizar(nombre).lower(), (producto_id, precio))
+        pedidos = dict(conn.execute(
+            'SELECT referencia, pedido_id FROM importacion_pedidos WHERE importacion_id = ?', (importacion_id,)
+        ))
+
+        def celda(valores, columna):
+            indice = columnas.get(columna)
+            return valores[indice] if indice is not None and indice < len(valores) else None
+
+        ventas = []
+        lineas = []
+        errores_lote = 0
+
+        def guardar_lote():
+            nonlocal errores_lote
+            # Con el lock de escritura tomado, las ventas del lote son las de id
+            # mayor al último que había antes de insertarlas
+            if not conn.in_transaction:
+                conn.execute('BEGIN IMMEDIATE')
+            ultimo_id = conn.execute('SELECT COALESCE(MAX(id), 0) FROM ventas').fetchone()[0]
+            conn.executemany('''
+                INSERT INTO ventas (cliente_id, producto_id, cantidad, total, fecha, pedido_id, estado_pago)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', ventas)
+            # Cada fila es una venta de un producto: una línea con el total del archivo
+            if ventas:
+                conn.execute('''
+                    INSERT INTO venta_items (venta_id, producto_id, tipo, precio_unitario, cantidad, total, fecha)
+                    SELECT v.id, v.producto_id, UPPER(p.tipo),
+                           CASE WHEN v.cantidad > 0 THEN v.total / v.cantidad ELSE v.total END,
+                           v.cantidad, v.total, v.fecha
+                    FROM ventas v
+                    JOIN productos p ON v.producto_id = p.id
+                    WHERE v.id > ?
+                ''', (ultimo_id,))
+                acumular_ventas_diarias(conn, [fila[0] for fila in conn.execute(
+                    'SELECT id FROM ventas WHERE id > ?', (ultimo_id,))])
+                crear_cuentas_pendientes(conn, ultimo_id)
+            conn.executemany('''
+                INSERT INTO pedido_productos (pedido_id, producto_id, cantidad, assigned_payment)
+                VALUES (?, ?, ?, ?)
+            ''', lineas)
+            recalcular_totales_pedidos(conn, {linea[0] for linea in lineas})
+            # El checkpoint va en la misma transacción que las filas del lote
+            conn.execute('''
+                UPDATE importaciones
+                SET filas_procesadas = ?, insertados = insertados + ?, errores = errores + ?,
+                    actualizado = CURRENT_TIMESTAMP
+                WHERE id = ?
+            ''', (resumen['filas_procesadas'], len(ventas), errores_lote, importacion_id))
+            conn.commit()
+            resumen['insertados'] += len(ventas)
+            ventas.clear()
+            lineas.clear()
+            errores_lote = 0
+
+        filas_lote = 0
+        primera = 2 + ya_procesadas
+        for linea, valores in enumerate(ws.iter_rows(min_row=primera, values_only=True), start=primera):
+            resumen['filas_procesadas'] += 1
+            filas_lote += 1
+            if any(texto_celda(v) for v in valores):
+                try:
+                    fecha = normalizar_fecha(celda(valores, 'fecha'))
+
+                    nombre_cliente = texto_celda(celda(valores, 'cliente'))
+                    cliente_id = clientes.get(nombre_cliente.lower())
+                    if cliente_id is None:
+                        if not nombre_cliente or not crear_clientes:
+                            raise ValueError(f"Cliente no encontrado: '{nombre_cliente}'")
+                        cliente_id = conn.execute('INSERT INTO clientes (nombre) VALUES (?)', (nombre_cliente,)).lastrowid
+                        clientes[nombre_cliente.lower()] = cliente_id
+                        resumen['clientes_creados'] += 1
+
+                    nombre_producto = texto_celda(celda(valores, 'producto'))
+                    if nombre_producto.lower() not in productos:
+                        raise ValueError(f"Producto no encontrado: '{nombre_producto}'")
+                    producto_id, precio = productos[nombre_producto.lower()]
+
+                    cantidad = int(leer_numero(celda(valores, 'cantidad'), 'Cantidad') or 1)
+                    total = leer_numero(celda(valores, 'total'), 'Total')
+                    if total is None:
+                        total = precio * cantidad
+                    estado_pago = (texto_celda(celda(valores, 'estado_pago')) or 'pagado').lower()
+                    if estado_pago not in ESTADOS_PAGO:
+                        raise ValueError(f"Estado de pago inválido: '{estado_pago}'")
+                except ValueError as e:
+                    resumen['total_errores'] += 1
+                    errores_lote += 1
+                    if len(resumen['errores']) < MAX_ERRORES_REPORTADOS:
+                        resumen['errores'].append({'linea': linea, 'error': str(e)})
+                else:
+                    pedido_id = None
+                    referencia = texto_celda(celda(valores, 'pedido'))
+                    if referencia:
+                        pedido_id = pedidos.get(referencia)
+                        if pedido_id is None:
+                            pedido_id = conn.execute('''
+                                INSERT INTO pedidos (cliente_id, fecha, pago_realizado, notas, estado, estado_pago)
+                                VALUES (?, ?, ?, ?, 'completado', ?)
+                            ''', (cliente_id, fecha, estado_pago == 'pagado',
+                                  f'Importado de {os.path.basename(ruta)}: {referencia}', estado_pago)).lastrowid
+                            conn.execute(
+                                'INSERT INTO importacion_pedidos (importacion_id, referencia, pedido_id) VALUES (?, ?, ?)',
+                                (importacion_id, referencia, pedido_id)
+                            )
+                            pedidos[referencia] = pedido_id
+                            resumen['pedidos_creados'] += 1
+                        lineas.append((pedido_id, producto_id, cantidad, total))
+                    ventas.append((cliente_id, producto_id, cantidad, total, fecha, pedido_id, estado_pago))
+
+            if filas_lote >= tamano_lote:
+                guardar_lote()
+                filas_lote = 0
+
+        guardar_lote()
+        conn.execute("UPDATE importaciones SET estado = 'completada' WHERE id = ?", (importacion_id,))
+        conn.commit()
+        resumen['completada'] = True
+        return resumen
+    finally:
+        wb.close()
+
+def extraer_opcion(args, nombre, por_defecto=None):
+    if nombre not in args:
+        return por_defecto
+    posicion = args.index(nombre)
+    valor = args[posicion + 1]
+    del args[posicion:posicion + 2]
+    return valor
+
+def main():
+    args = sys.argv[1:]
+    crear_clientes = '--crear-clientes' in args
+    if crear_clientes:
+        args.remove('--crear-clientes')
+    hoja = extraer_opcion(args, '--hoja')
+    tamano_lote = extraer_opcion(args, '--lote')
+    if len(args) != 2 or args[0] not in (*IMPORTADORES, 'ventas'):
+        print("Uso: python importar.py {clientes|productos} archivo.csv [--lote N]")
+        print("     python importar.py ventas archivo.xlsx [--hoja H] [--lote N] [--crear-clientes]")
+        sys.exit(1)
+
+    tabla, ruta = args
+    if tabla == 'ventas':
+        # La tabla de checkpoints viene de las migraciones
+        from models import init_db
+        init_db()
+    conn = sqlite3.connect('database.db')
+    try:
+        if tabla == 'ventas':
+            resumen = importar_ventas_excel(conn, ruta, hoja, int(tamano_lote or TAMANO_LOTE_VENTAS), crear_clientes)
+        else:
+            with open(ruta, newline='', encoding='utf-8-sig') as archivo:
+                resumen = importar_csv(conn, tabla, archivo, int(tamano_lote or TAMANO_LOTE))
+    except (ValueError, KeyError) as e:
+        print(f"ERROR {e}")
+        sys.exit(1)
+    finally:
+        conn.close()
+
+    if tabla == 'ventas':
+        if resumen['ya_importada']:
+            print(f"INFO La hoja '{resumen['hoja']}' de este archivo ya fue importada (importación {resumen['importacion_id']})")
+            return
+        if resumen['reanudada_desde']:
+            print(f"INFO Reanudada desde la fila {resumen['reanudada_desde']} de la hoja '{resumen['hoja']}'")
+        print(f"OK {resumen['insertados']} ventas insertadas, {resumen['pedidos_creados']} pedidos "
+              f"y {resumen['clientes_creados']} clientes creados ({resumen['filas_procesadas']} filas)")
+    else:
+        print(f"OK {resumen['insertados']} {tabla} insertados de {resumen['procesadas']} filas")
+        print(f"INFO {resumen['duplicados']} duplicados omitidos")
+        if resumen.get('error'):
+            print(f"ERROR {resumen['error']}")
+    if resumen['total_errores']:
+        print(f"WARNING {resumen['total_errores']} filas con errores:")
+        for error in resumen['errores']:
+            print(f"  línea {error['linea']}: {error['error']}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+Tareas de mantenimiento de datos derivados.
+
+- totales-pedidos: recalcula subtotal, item_count y total de los pedidos a
+  partir de sus productos y los precios actuales del catálogo (los pedidos
+  importados usan los montos del archivo). Sirve para pedidos creados por
+  fuera de la API o para corregir datos viejos.
+- ventas-diarias: reconstruye el resumen ventas_diarias desde venta_items,
+  completo o para un rango de días (después de cargar o corregir ventas
+  directamente en la base).
+
+Uso:
+    python mantenimiento.py totales-pedidos [--lote 1000]
+    python mantenimiento.py ventas-diarias [--desde 2024-01-01] [--hasta 2024-12-31]
+"""
+
+import json
+import sqlite3
+import sys
+
+TAMANO_LOTE = 1000
+
+def recalcular_totales_pedidos(conn, pedido_ids):
+    """
+    Recalcular los totales de los pedidos indicados con un solo UPDATE. Los
+    pedidos creados por la API se valúan con los precios del catálogo; los
+    importados (en importacion_pedidos) conservan los montos del archivo,
+    guardados en assigned_payment. No hace commit: corre dentro de la
+    transacción de quien llama.
+    """
+    conn.execute('''
+        WITH importados AS (
+            SELECT DISTINCT pedido_id FROM importacion_pedidos
+            WHERE pedido_id IN (SELECT value FROM json_each(?1))
+        ),
+        lineas AS (
+            SELECT pp.pedido_id,
+                   SUM(CASE WHEN i.pedido_id IS NOT NULL THEN COALESCE(pp.assigned_payment, 0)
+                            ELSE pp.cantidad * pr.precio END) AS subtotal,
+                   SUM(pp.cantidad) AS item_count
+            FROM pedido_productos pp
+            LEFT JOIN importados i ON pp.pedido_id = i.pedido_id
+            LEFT JOIN productos pr ON pp.producto_id = pr.id
+            WHERE pp.pedido_id IN (SELECT value FROM json_each(?1))
+              AND (i.pedido_id IS NOT NULL OR pr.id IS NOT NULL)
+            GROUP BY pp.pedido_id
+        )
+        UPDATE pedidos SET
+            subtotal = COALESCE((SELECT subtotal FROM lineas WHERE lineas.pedido_id = pedidos.id), 0),
+            item_count = COALESCE((SELECT item_count FROM lineas WHERE lineas.pedido_id = pedidos.id), 0),
+            total = COALESCE((SELECT subtotal FROM lineas WHERE lineas.pedido_id = pedidos.id), 0)
+        WHERE id IN (SELECT value FROM json_each(?1))
+    ''', (json.dumps(list(pedido_ids)),))
+
+def recalcular_todos_los_totales(conn, tamano_lote=TAMANO_LOTE):
+    """Recorrer todos los pedidos por id, con un commit por lote. Devuelve cuántos se recalcularon."""
+    procesados = 0
+    ultimo = 0
+    while True:
+        ids = [fila[0] for fila in conn.execute(
+            'SELECT id FROM pedidos WHERE id > ? ORDER BY id LIMIT ?', (ultimo, tamano_lote))]
+        if not ids:
+            return procesados
+        recalcular_totales_pedidos(conn, ids)
+        conn.commit()
+        procesados += len(ids)
+        ultimo = ids[-1]
+
+def acumular_ventas_diarias(conn, venta_ids, signo=1):
+    """
+    Sumar (signo=1) o restar (signo=-1) las líneas de las ventas indicadas
+    en ventas_diarias. Para restar hay que llamarla antes de borrar la venta.
+    No hace commit: corre dentro de la transacción de quien llama.
+    """
+    conn.execute('''
+        INSERT INTO ventas_diarias (dia, tipo, cliente_id, total, cantidad, ventas)
+        SELECT DATE(vi.fecha), COALESCE(vi.tipo, ''), COALESCE(v.cliente_id, 0),
+               ?2 * SUM(vi.total), ?2 * SUM(vi.cantidad), ?2 * COUNT(DISTINCT vi.venta_id)
+        FROM venta_items vi
+        JOIN ventas v ON vi.venta_id = v.id
+        WHERE vi.venta_id IN (SELECT value FROM json_each(?1)) AND vi.fecha IS NOT NULL
+        GROUP BY DATE(vi.fecha), COALESCE(vi.tipo, ''), COALESCE(v.cliente_id, 0)
+        ON CONFLICT (dia, tipo, cliente_id) DO UPDATE SET
+            total = total + excluded.total,
+            cantidad = cantidad + excluded.cantidad,
+            ventas = ventas + excluded.ventas
+    ''', (json.dumps(list(venta_ids)), signo))
+    if signo < 0:
+        conn.execute('DELETE FROM ventas_diarias WHERE ventas <= 0')
+
+def reconstruir_ventas_diarias(conn, desde=None, hasta=None):
+    """
+    Volver a calcular ventas_diarias desde venta_items para los días entre
+    desde y hasta (inclusive; sin límites, la tabla completa). Hace commit.
+    """
+    desde = desde or '0000-01-01'
+    hasta = hasta or '9999-12-31'
+    conn.execute('DELETE FROM ventas_diarias WHERE dia BETWEEN ? AND ?', (desde, hasta))
+    conn.execute('''
+        INSERT INTO ventas_diarias (dia, tipo, cliente_id, total, cantidad, ventas)
+        SELECT DATE(vi.fecha), COALESCE(vi.tipo, ''), COALESCE(v.cliente_id, 0),
+               SUM(vi.total), SUM(vi.cantidad), COUNT(DISTINCT vi.venta_id)
+        FROM venta_items vi
+        JOIN ventas v ON vi.venta_id = v.id
+        WHERE DATE(vi.fecha) BETWEEN ? AND ?
+        GROUP BY DATE(vi.fecha), COALESCE(vi.tipo, ''), COALESCE(v.cliente_id, 0)
+    ''', (desde, hasta))
+    filas = conn.execute('SELECT COUNT(*) FROM ventas_diarias WHERE dia BETWEEN ? AND ?',
+                         (desde, hasta)).fetchone()[0]
+    conn.commit()
+    return filas
+
+# Contadores de series de documentos, compartidos por la API y la importación.
+# Formato de cada serie; una serie nueva solo necesita su entrada aquí
+SERIES_DOCUMENTOS = {
+    'BILL': 'BILL{:03d}',
+    'FAC': 'FAC-{:04d}',
+}
+
+def reservar_numeros(conn, serie, cantidad=1):
+    """
+    Reservar `cantidad` números consecutivos de la serie con un solo upsert
+    atómico y devolver el primero. El UPDATE toma el lock de escritura, así
+    dos transacciones nunca reciben el mismo número; si la transacción que
+    llama se deshace, la reserva se deshace con ella.
+    """
+    fila = conn.execute('''
+        INSERT INTO contadores (serie, valor) VALUES (?, ?)
+        ON CONFLICT (serie) DO UPDATE SET valor = valor + excluded.valor
+        RETURNING valor
+    ''', (serie, cantidad)).fetchone()
+    return fila[0] - cantidad + 1
+
+def reservar_codigos(conn, serie, cantidad=1):
+    """Códigos formateados para un rango reservado (útil en importaciones masivas)"""
+    primero = reservar_numeros(conn, serie, cantidad)
+    formato = SERIES_DOCUMENTOS[serie]
+    return [formato.format(numero) for numero in range(primero, primero + cantidad)]
+
+def extraer_opcion(args, nombre, por_defecto=None):
+    if nombre not in args:
+        return por_defecto
+    posicion = args.index(nombre)
+    valor = args[posicion + 1]
+    del args[posicion:posicion + 2]
+    return valor
+
+def main():
+    args = sys.argv[1:]
+    tamano_lote = int(extraer_opcion(args, '--lote', TAMANO_LOTE))
+    desde = extraer_opcion(args, '--desde')
+    hasta = extraer_opcion(args, '--hasta')
+    if args not in (['totales-pedidos'], ['ventas-diarias']):
+        print("Uso: python mantenimiento.py totales-pedidos [--lote N]")
+        print("     python mantenimiento.py ventas-diarias [--desde AAAA-MM-DD] [--hasta AAAA-MM-DD]")
+        sys.exit(1)
+
+    # Las tablas y columnas vienen de las migraciones
+    from models import init_db
+    init_db()
+    conn = sqlite3.connect('database.db')
+    try:
+        if args == ['totales-pedidos']:
+            procesados = recalcular_todos_los_totales(conn, tamano_lote)
+            print(f"OK Totales recalculados en {procesados} pedidos")
+        else:
+            filas = reconstruir_ventas_diarias(conn, desde, hasta)
+            print(f"OK ventas_diarias reconstruida: {filas} filas")
+    finally:
+        conn.close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+-- Esquema base del sistema Plus Graphics
+
+-- Tabla de usuarios - Simplificada
+CREATE TABLE IF NOT EXISTS usuarios (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL,
+    email TEXT UNIQUE NOT NULL,
+    password TEXT NOT NULL,
+    role TEXT DEFAULT 'employee',
+    created_at TEXT DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Tabla de productos con tipo y descripción
+CREATE TABLE IF NOT EXISTS productos (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    nombre TEXT NOT NULL,
+    tipo TEXT NOT NULL,
+    precio REAL NOT NULL,
+    descripcion TEXT
+);
+
+-- Tabla de clientes
+CREATE TABLE IF NOT EXISTS clientes (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    nombre TEXT NOT NULL,
+    email TEXT,
+    telefono TEXT,
+    direccion TEXT,
+    notas TEXT
+);
+
+-- Tabla de pedidos con cliente, fecha, encargado, pago y notas
+CREATE TABLE IF NOT EXISTS pedidos (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    cliente_id INTEGER,
+    fecha TEXT NOT NULL,
+    encargado_principal TEXT,
+    pago_realizado BOOLEAN DEFAULT FALSE,
+    notas TEXT,
+    estado TEXT DEFAULT 'pendiente',
+    FOREIGN KEY (cliente_id) REFERENCES clientes(id)
+);
+
+-- Tabla intermedia para productos/servicios en pedidos (relación muchos a muchos)
+CREATE TABLE IF NOT EXISTS pedido_productos (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    pedido_id INTEGER,
+    producto_id INTEGER,
+    cantidad INTEGER DEFAULT 1,
+    FOREIGN KEY (pedido_id) REFERENCES pedidos(id),
+    FOREIGN KEY (producto_id) REFERENCES productos(id)
+);
+
+-- Tabla de ventas con cliente
+CREATE TABLE IF NOT EXISTS ventas (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    cliente_id INTEGER,
+    producto_id INTEGER,
+    cantidad INTEGER,
+    total REAL,
+    fecha TEXT,
+    FOREIGN KEY (cliente_id) REFERENCES clientes(id),
+    FOREIGN KEY (producto_id) REFERENCES productos(id)
+);
+
+-- Tabla de cuentas por cobrar
+CREATE TABLE IF NOT EXISTS cuentas_por_cobrar (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    numero_factura TEXT UNIQUE NOT NULL,
+    cliente_id INTEGER NOT NULL,
+    pedido_id INTEGER,
+    monto REAL NOT NULL,
+    monto_pagado REAL DEFAULT 0,
+    saldo REAL NOT NULL,
+    fecha_vencimiento DATE NOT NULL,
+    estado TEXT DEFAULT 'pendiente',
+    dias_vencido INTEGER DEFAULT 0,
+    fecha_creacion TEXT DEFAULT CURRENT_TIMESTAMP,
+    notas TEXT,
+    FOREIGN KEY (cliente_id) REFERENCES clientes(id),
+    FOREIGN KEY (pedido_id) REFERENCES pedidos(id)
+);
+
+-- Tabla de cuentas por pagar
+CREATE TABLE IF NOT EXISTS cuentas_por_pagar (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    codigo_factura TEXT UNIQUE NOT NULL,
+    proveedor TEXT NOT NULL,
+    monto REAL NOT NULL,
+    monto_pagado REAL DEFAULT 0,
+    saldo REAL NOT NULL,
+    fecha_vencimiento DATE NOT NULL,
+    estado TEXT DEFAULT 'pendiente',
+    descripcion TEXT,
+    fecha_creacion TEXT DEFAULT CURRENT_TIMESTAMP,
+    fecha_pago TEXT,
+    dias_vencido INTEGER DEFAULT 0
+);
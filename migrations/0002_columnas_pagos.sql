@@ -0,0 +1,17 @@
+-- Columnas de pago y relaciones entre pedidos, ventas y cuentas por cobrar
+-- (antes en add_missing_columns). El runner omite ADD COLUMN si la columna ya existe.
+
+ALTER TABLE pedido_productos ADD COLUMN assigned_payment REAL DEFAULT 0;
+
+-- estado_pago en pedidos (más específico que pago_realizado)
+ALTER TABLE pedidos ADD COLUMN estado_pago TEXT DEFAULT 'no_pagado';
+
+-- pedido_id en ventas para conectar con pedidos
+ALTER TABLE ventas ADD COLUMN pedido_id INTEGER;
+CREATE INDEX IF NOT EXISTS idx_ventas_pedido_id ON ventas(pedido_id);
+
+ALTER TABLE ventas ADD COLUMN estado_pago TEXT DEFAULT 'pagado';
+
+-- venta_id en cuentas_por_cobrar para conectar con ventas
+ALTER TABLE cuentas_por_cobrar ADD COLUMN venta_id INTEGER;
+CREATE INDEX IF NOT EXISTS idx_cuentas_venta_id ON cuentas_por_cobrar(venta_id);
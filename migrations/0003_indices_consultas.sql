@@ -0,0 +1,7 @@
+-- Índices para los joins de pedidos y las consultas de reportes y cuentas
+
+CREATE INDEX IF NOT EXISTS idx_pedido_productos_pedido_id ON pedido_productos(pedido_id);
+CREATE INDEX IF NOT EXISTS idx_ventas_fecha ON ventas(fecha);
+CREATE INDEX IF NOT EXISTS idx_ventas_cliente_id ON ventas(cliente_id);
+CREATE INDEX IF NOT EXISTS idx_cuentas_cobrar_estado_vencimiento ON cuentas_por_cobrar(estado, fecha_vencimiento);
+CREATE INDEX IF NOT EXISTS idx_cuentas_pagar_estado_vencimiento ON cuentas_por_pagar(estado, fecha_vencimiento);
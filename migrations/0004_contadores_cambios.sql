@@ -0,0 +1,114 @@
+-- Contador de cambios por tabla. Los triggers lo incrementan en cada escritura,
+-- así los caches y validadores HTTP saben si los datos cambiaron con un solo SELECT.
+
+CREATE TABLE IF NOT EXISTS cambios_tablas (
+    tabla TEXT PRIMARY KEY,
+    version INTEGER NOT NULL DEFAULT 0
+);
+
+INSERT OR IGNORE INTO cambios_tablas (tabla, version) VALUES
+    ('clientes', 0),
+    ('productos', 0),
+    ('pedidos', 0),
+    ('pedido_productos', 0),
+    ('ventas', 0),
+    ('cuentas_por_cobrar', 0),
+    ('cuentas_por_pagar', 0);
+
+-- clientes
+CREATE TRIGGER IF NOT EXISTS trg_clientes_cambios_insert AFTER INSERT ON clientes
+BEGIN
+    UPDATE cambios_tablas SET version = version + 1 WHERE tabla = 'clientes';
+END;
+CREATE TRIGGER IF NOT EXISTS trg_clientes_cambios_update AFTER UPDATE ON clientes
+BEGIN
+    UPDATE cambios_tablas SET version = version + 1 WHERE tabla = 'clientes';
+END;
+CREATE TRIGGER IF NOT EXISTS trg_clientes_cambios_delete AFTER DELETE ON clientes
+BEGIN
+    UPDATE cambios_tablas SET version = version + 1 WHERE tabla = 'clientes';
+END;
+
+-- productos
+CREATE TRIGGER IF NOT EXISTS trg_productos_cambios_insert AFTER INSERT ON productos
+BEGIN
+    UPDATE cambios_tablas SET version = version + 1 WHERE tabla = 'productos';
+END;
+CREATE TRIGGER IF NOT EXISTS trg_productos_cambios_update AFTER UPDATE ON productos
+BEGIN
+    UPDATE cambios_tablas SET version = version + 1 WHERE tabla = 'productos';
+END;
+CREATE TRIGGER IF NOT EXISTS trg_productos_cambios_delete AFTER DELETE ON productos
+BEGIN
+    UPDATE cambios_tablas SET version = version + 1 WHERE tabla = 'productos';
+END;
+
+-- pedidos
+CREATE TRIGGER IF NOT EXISTS trg_pedidos_cambios_insert AFTER INSERT ON pedidos
+BEGIN
+    UPDATE cambios_tablas SET version = version + 1 WHERE tabla = 'pedidos';
+END;
+CREATE TRIGGER IF NOT EXISTS trg_pedidos_cambios_update AFTER UPDATE ON pedidos
+BEGIN
+    UPDATE cambios_tablas SET version = version + 1 WHERE tabla = 'pedidos';
+END;
+CREATE TRIGGER IF NOT EXISTS trg_pedidos_cambios_delete AFTER DELETE ON pedidos
+BEGIN
+    UPDATE cambios_tablas SET version = version + 1 WHERE tabla = 'pedidos';
+END;
+
+-- pedido_productos
+CREATE TRIGGER IF NOT EXISTS trg_pedido_productos_cambios_insert AFTER INSERT ON pedido_productos
+BEGIN
+    UPDATE cambios_tablas SET version = version + 1 WHERE tabla = 'pedido_productos';
+END;
+CREATE TRIGGER IF NOT EXISTS trg_pedido_productos_cambios_update AFTER UPDATE ON pedido_productos
+BEGIN
+    UPDATE cambios_tablas SET version = version + 1 WHERE tabla = 'pedido_productos';
+END;
+CREATE TRIGGER IF NOT EXISTS trg_pedido_productos_cambios_delete AFTER DELETE ON pedido_productos
+BEGIN
+    UPDATE cambios_tablas SET version = version + 1 WHERE tabla = 'pedido_productos';
+END;
+
+-- ventas
+CREATE TRIGGER IF NOT EXISTS trg_ventas_cambios_insert AFTER INSERT ON ventas
+BEGIN
+    UPDATE cambios_tablas SET version = version + 1 WHERE tabla = 'ventas';
+END;
+CREATE TRIGGER IF NOT EXISTS trg_ventas_cambios_update AFTER UPDATE ON ventas
+BEGIN
+    UPDATE cambios_tablas SET version = version + 1 WHERE tabla = 'ventas';
+END;
+CREATE TRIGGER IF NOT EXISTS trg_ventas_cambios_delete AFTER DELETE ON ventas
+BEGIN
+    UPDATE cambios_tablas SET version = version + 1 WHERE tabla = 'ventas';
+END;
+
+-- cuentas_por_cobrar
+CREATE TRIGGER IF NOT EXISTS trg_cuentas_por_cobrar_cambios_insert AFTER INSERT ON cuentas_por_cobrar
+BEGIN
+    UPDATE cambios_tablas SET version = version + 1 WHERE tabla = 'cuentas_por_cobrar';
+END;
+CREATE TRIGGER IF NOT EXISTS trg_cuentas_por_cobrar_cambios_update AFTER UPDATE ON cuentas_por_cobrar
+BEGIN
+    UPDATE cambios_tablas SET version = version + 1 WHERE tabla = 'cuentas_por_cobrar';
+END;
+CREATE TRIGGER IF NOT EXISTS trg_cuentas_por_cobrar_cambios_delete AFTER DELETE ON cuentas_por_cobrar
+BEGIN
+    UPDATE cambios_tablas SET version = version + 1 WHERE tabla = 'cuentas_por_cobrar';
+END;
+
+-- cuentas_por_pagar
+CREATE TRIGGER IF NOT EXISTS trg_cuentas_por_pagar_cambios_insert AFTER INSERT ON cuentas_por_pagar
+BEGIN
+    UPDATE cambios_tablas SET version = version + 1 WHERE tabla = 'cuentas_por_pagar';
+END;
+CREATE TRIGGER IF NOT EXISTS trg_cuentas_por_pagar_cambios_update AFTER UPDATE ON cuentas_por_pagar
+BEGIN
+    UPDATE cambios_tablas SET version = version + 1 WHERE tabla = 'cuentas_por_pagar';
+END;
+CREATE TRIGGER IF NOT EXISTS trg_cuentas_por_pagar_cambios_delete AFTER DELETE ON cuentas_por_pagar
+BEGIN
+    UPDATE cambios_tablas SET version = version + 1 WHERE tabla = 'cuentas_por_pagar';
+END;
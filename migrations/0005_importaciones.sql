@@ -0,0 +1,27 @@
+-- Checkpoints de importaciones de ventas históricas. Cada archivo (por huella
+-- de contenido y hoja) guarda cuántas filas ya quedaron confirmadas, así una
+-- importación interrumpida retoma desde el último lote con commit.
+
+CREATE TABLE IF NOT EXISTS importaciones (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    archivo TEXT NOT NULL,
+    huella TEXT NOT NULL,
+    hoja TEXT NOT NULL,
+    filas_procesadas INTEGER DEFAULT 0,
+    insertados INTEGER DEFAULT 0,
+    errores INTEGER DEFAULT 0,
+    estado TEXT DEFAULT 'en_proceso',
+    iniciado TEXT DEFAULT CURRENT_TIMESTAMP,
+    actualizado TEXT,
+    UNIQUE (huella, hoja)
+);
+
+-- Pedidos creados por una importación, por su referencia en el archivo
+CREATE TABLE IF NOT EXISTS importacion_pedidos (
+    importacion_id INTEGER NOT NULL,
+    referencia TEXT NOT NULL,
+    pedido_id INTEGER NOT NULL,
+    PRIMARY KEY (importacion_id, referencia),
+    FOREIGN KEY (importacion_id) REFERENCES importaciones(id),
+    FOREIGN KEY (pedido_id) REFERENCES pedidos(id)
+);
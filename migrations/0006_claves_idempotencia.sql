@@ -0,0 +1,17 @@
+-- Respuestas guardadas por Idempotency-Key. Un reintento con la misma clave
+-- devuelve la respuesta original sin volver a ejecutar la escritura.
+
+CREATE TABLE IF NOT EXISTS claves_idempotencia (
+    clave TEXT NOT NULL,
+    metodo TEXT NOT NULL,
+    ruta TEXT NOT NULL,
+    huella_cuerpo TEXT NOT NULL,
+    status INTEGER NOT NULL,
+    respuesta TEXT NOT NULL,
+    mimetype TEXT,
+    creada TEXT DEFAULT CURRENT_TIMESTAMP,
+    expira TEXT NOT NULL,
+    PRIMARY KEY (clave, metodo, ruta)
+);
+
+CREATE INDEX IF NOT EXISTS idx_claves_idempotencia_expira ON claves_idempotencia(expira);
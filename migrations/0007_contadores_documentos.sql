@@ -0,0 +1,21 @@
+-- Contadores de series de documentos (BILL para cuentas por pagar, FAC para
+-- cuentas por cobrar). El siguiente número se reserva con un solo
+-- UPDATE ... RETURNING dentro de la transacción que crea el documento.
+
+CREATE TABLE IF NOT EXISTS contadores (
+    serie TEXT PRIMARY KEY,
+    valor INTEGER NOT NULL DEFAULT 0
+);
+
+-- Continuar desde los códigos que ya existen
+INSERT OR IGNORE INTO contadores (serie, valor)
+SELECT 'BILL', COALESCE(MAX(CAST(SUBSTR(codigo_factura, 5) AS INTEGER)), 0)
+FROM cuentas_por_pagar
+WHERE codigo_factura LIKE 'BILL%';
+
+INSERT OR IGNORE INTO contadores (serie, valor)
+SELECT 'FAC', MAX(
+    (SELECT COALESCE(MAX(CAST(SUBSTR(numero_factura, 5) AS INTEGER)), 0)
+     FROM cuentas_por_cobrar WHERE numero_factura LIKE 'FAC-%'),
+    (SELECT COALESCE(MAX(id), 0) FROM ventas)
+);
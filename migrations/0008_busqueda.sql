@@ -0,0 +1,135 @@
+-- Índice de búsqueda de texto completo (FTS5) sobre clientes, productos,
+-- notas de pedidos y códigos de factura. El rowid de cada documento es
+-- id * 8 + tipo (1 cliente, 2 producto, 3 pedido, 4 cuenta por cobrar,
+-- 5 cuenta por pagar), así los triggers actualizan y borran por rowid.
+
+CREATE VIRTUAL TABLE IF NOT EXISTS busqueda USING fts5(
+    tipo UNINDEXED,
+    ref_id UNINDEXED,
+    titulo,
+    detalle,
+    tokenize = 'unicode61 remove_diacritics 2',
+    prefix = '2 3'
+);
+
+-- Carga inicial
+INSERT INTO busqueda (rowid, tipo, ref_id, titulo, detalle)
+SELECT id * 8 + 1, 'cliente', id, nombre,
+       COALESCE(email, '') || ' ' || COALESCE(telefono, '') || ' ' || COALESCE(notas, '')
+FROM clientes;
+
+INSERT INTO busqueda (rowid, tipo, ref_id, titulo, detalle)
+SELECT id * 8 + 2, 'producto', id, nombre, descripcion
+FROM productos;
+
+INSERT INTO busqueda (rowid, tipo, ref_id, titulo, detalle)
+SELECT id * 8 + 3, 'pedido', id, 'Pedido ' || id, notas
+FROM pedidos;
+
+INSERT INTO busqueda (rowid, tipo, ref_id, titulo, detalle)
+SELECT id * 8 + 4, 'cuenta_por_cobrar', id, numero_factura, notas
+FROM cuentas_por_cobrar;
+
+INSERT INTO busqueda (rowid, tipo, ref_id, titulo, detalle)
+SELECT id * 8 + 5, 'cuenta_por_pagar', id, codigo_factura,
+       COALESCE(proveedor, '') || ' ' || COALESCE(descripcion, '')
+FROM cuentas_por_pagar;
+
+-- clientes
+CREATE TRIGGER IF NOT EXISTS trg_clientes_busqueda_insert AFTER INSERT ON clientes
+BEGIN
+    INSERT INTO busqueda (rowid, tipo, ref_id, titulo, detalle)
+    VALUES (NEW.id * 8 + 1, 'cliente', NEW.id, NEW.nombre,
+            COALESCE(NEW.email, '') || ' ' || COALESCE(NEW.telefono, '') || ' ' || COALESCE(NEW.notas, ''));
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_clientes_busqueda_update AFTER UPDATE ON clientes
+BEGIN
+    DELETE FROM busqueda WHERE rowid = OLD.id * 8 + 1;
+    INSERT INTO busqueda (rowid, tipo, ref_id, titulo, detalle)
+    VALUES (NEW.id * 8 + 1, 'cliente', NEW.id, NEW.nombre,
+            COALESCE(NEW.email, '') || ' ' || COALESCE(NEW.telefono, '') || ' ' || COALESCE(NEW.notas, ''));
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_clientes_busqueda_delete AFTER DELETE ON clientes
+BEGIN
+    DELETE FROM busqueda WHERE rowid = OLD.id * 8 + 1;
+END;
+
+-- productos
+CREATE TRIGGER IF NOT EXISTS trg_productos_busqueda_insert AFTER INSERT ON productos
+BEGIN
+    INSERT INTO busqueda (rowid, tipo, ref_id, titulo, detalle)
+    VALUES (NEW.id * 8 + 2, 'producto', NEW.id, NEW.nombre, NEW.descripcion);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_productos_busqueda_update AFTER UPDATE ON productos
+BEGIN
+    DELETE FROM busqueda WHERE rowid = OLD.id * 8 + 2;
+    INSERT INTO busqueda (rowid, tipo, ref_id, titulo, detalle)
+    VALUES (NEW.id * 8 + 2, 'producto', NEW.id, NEW.nombre, NEW.descripcion);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_productos_busqueda_delete AFTER DELETE ON productos
+BEGIN
+    DELETE FROM busqueda WHERE rowid = OLD.id * 8 + 2;
+END;
+
+-- pedidos: solo cambia el índice si cambian las notas
+CREATE TRIGGER IF NOT EXISTS trg_pedidos_busqueda_insert AFTER INSERT ON pedidos
+BEGIN
+    INSERT INTO busqueda (rowid, tipo, ref_id, titulo, detalle)
+    VALUES (NEW.id * 8 + 3, 'pedido', NEW.id, 'Pedido ' || NEW.id, NEW.notas);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_pedidos_busqueda_update AFTER UPDATE OF notas ON pedidos
+BEGIN
+    DELETE FROM busqueda WHERE rowid = OLD.id * 8 + 3;
+    INSERT INTO busqueda (rowid, tipo, ref_id, titulo, detalle)
+    VALUES (NEW.id * 8 + 3, 'pedido', NEW.id, 'Pedido ' || NEW.id, NEW.notas);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_pedidos_busqueda_delete AFTER DELETE ON pedidos
+BEGIN
+    DELETE FROM busqueda WHERE rowid = OLD.id * 8 + 3;
+END;
+
+-- cuentas por cobrar
+CREATE TRIGGER IF NOT EXISTS trg_cuentas_por_cobrar_busqueda_insert AFTER INSERT ON cuentas_por_cobrar
+BEGIN
+    INSERT INTO busqueda (rowid, tipo, ref_id, titulo, detalle)
+    VALUES (NEW.id * 8 + 4, 'cuenta_por_cobrar', NEW.id, NEW.numero_factura, NEW.notas);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_cuentas_por_cobrar_busqueda_update AFTER UPDATE OF numero_factura, notas ON cuentas_por_cobrar
+BEGIN
+    DELETE FROM busqueda WHERE rowid = OLD.id * 8 + 4;
+    INSERT INTO busqueda (rowid, tipo, ref_id, titulo, detalle)
+    VALUES (NEW.id * 8 + 4, 'cuenta_por_cobrar', NEW.id, NEW.numero_factura, NEW.notas);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_cuentas_por_cobrar_busqueda_delete AFTER DELETE ON cuentas_por_cobrar
+BEGIN
+    DELETE FROM busqueda WHERE rowid = OLD.id * 8 + 4;
+END;
+
+-- cuentas por pagar
+CREATE TRIGGER IF NOT EXISTS trg_cuentas_por_pagar_busqueda_insert AFTER INSERT ON cuentas_por_pagar
+BEGIN
+    INSERT INTO busqueda (rowid, tipo, ref_id, titulo, detalle)
+    VALUES (NEW.id * 8 + 5, 'cuenta_por_pagar', NEW.id, NEW.codigo_factura,
+            COALESCE(NEW.proveedor, '') || ' ' || COALESCE(NEW.descripcion, ''));
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_cuentas_por_pagar_busqueda_update AFTER UPDATE OF codigo_factura, proveedor, descripcion ON cuentas_por_pagar
+BEGIN
+    DELETE FROM busqueda WHERE rowid = OLD.id * 8 + 5;
+    INSERT INTO busqueda (rowid, tipo, ref_id, titulo, detalle)
+    VALUES (NEW.id * 8 + 5, 'cuenta_por_pagar', NEW.id, NEW.codigo_factura,
+            COALESCE(NEW.proveedor, '') || ' ' || COALESCE(NEW.descripcion, ''));
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_cuentas_por_pagar_busqueda_delete AFTER DELETE ON cuentas_por_pagar
+BEGIN
+    DELETE FROM busqueda WHERE rowid = OLD.id * 8 + 5;
+END;
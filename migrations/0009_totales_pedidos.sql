@@ -0,0 +1,31 @@
+-- Totales de cada pedido guardados en la fila: subtotal (cantidad * precio de
+-- sus productos), item_count (unidades) y total. Los mantienen crear_pedido y
+-- actualizar_pedido; `python mantenimiento.py totales-pedidos` los recalcula.
+
+ALTER TABLE pedidos ADD COLUMN subtotal REAL DEFAULT 0;
+ALTER TABLE pedidos ADD COLUMN item_count INTEGER DEFAULT 0;
+ALTER TABLE pedidos ADD COLUMN total REAL DEFAULT 0;
+
+-- Carga inicial con los precios actuales; los pedidos importados conservan
+-- los montos del archivo (assigned_payment de sus líneas)
+UPDATE pedidos SET
+    subtotal = COALESCE((
+        SELECT SUM(pp.cantidad * pr.precio)
+        FROM pedido_productos pp JOIN productos pr ON pp.producto_id = pr.id
+        WHERE pp.pedido_id = pedidos.id), 0),
+    item_count = COALESCE((
+        SELECT SUM(pp.cantidad)
+        FROM pedido_productos pp JOIN productos pr ON pp.producto_id = pr.id
+        WHERE pp.pedido_id = pedidos.id), 0)
+WHERE id NOT IN (SELECT pedido_id FROM importacion_pedidos);
+UPDATE pedidos SET
+    subtotal = COALESCE((
+        SELECT SUM(COALESCE(pp.assigned_payment, 0))
+        FROM pedido_productos pp WHERE pp.pedido_id = pedidos.id), 0),
+    item_count = COALESCE((
+        SELECT SUM(pp.cantidad)
+        FROM pedido_productos pp WHERE pp.pedido_id = pedidos.id), 0)
+WHERE id IN (SELECT pedido_id FROM importacion_pedidos);
+UPDATE pedidos SET total = subtotal;
+
+CREATE INDEX IF NOT EXISTS idx_pedidos_cliente_id ON pedidos(cliente_id);
@@ -0,0 +1,83 @@
+-- Líneas de cada venta con el producto, tipo, precio unitario, cantidad y
+-- total tal como eran al momento de la venta. Una venta de un producto
+-- tiene una línea; una venta desde un pedido, una por producto del pedido.
+-- Los reportes por tipo, producto y tendencia agrupan sobre esta tabla.
+
+CREATE TABLE IF NOT EXISTS venta_items (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    venta_id INTEGER NOT NULL,
+    producto_id INTEGER,
+    tipo TEXT,
+    precio_unitario REAL NOT NULL,
+    cantidad INTEGER NOT NULL,
+    total REAL NOT NULL,
+    fecha TEXT,
+    FOREIGN KEY (venta_id) REFERENCES ventas(id),
+    FOREIGN KEY (producto_id) REFERENCES productos(id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_venta_items_venta_id ON venta_items(venta_id);
+CREATE INDEX IF NOT EXISTS idx_venta_items_tipo ON venta_items(tipo, total);
+CREATE INDEX IF NOT EXISTS idx_venta_items_producto ON venta_items(producto_id, total);
+CREATE INDEX IF NOT EXISTS idx_venta_items_fecha ON venta_items(fecha, tipo, total);
+
+-- Carga inicial. Ventas de un producto (y ventas sin líneas de pedido): una
+-- línea con el total guardado en la venta. Si el producto ya no existe, la
+-- línea queda sin producto ni tipo, pero su monto sigue contando.
+INSERT INTO venta_items (venta_id, producto_id, tipo, precio_unitario, cantidad, total, fecha)
+SELECT v.id, p.id, UPPER(p.tipo),
+       CASE WHEN v.cantidad > 0 THEN v.total / v.cantidad ELSE COALESCE(v.total, 0) END,
+       COALESCE(v.cantidad, 1), COALESCE(v.total, 0), v.fecha
+FROM ventas v
+LEFT JOIN productos p ON v.producto_id = p.id
+WHERE v.producto_id IS NOT NULL
+   OR NOT EXISTS (SELECT 1 FROM pedido_productos pp WHERE pp.pedido_id = v.pedido_id);
+
+-- Ventas desde pedidos: el total de la venta se reparte entre las líneas del
+-- pedido como en lineas_venta_pedido (app.py). El peso de cada línea es su
+-- monto en el archivo para pedidos importados y cantidad * precio actual para
+-- los demás; si todos pesan 0 se reparte por cantidad. La última línea se
+-- lleva el redondeo, así la suma es siempre ventas.total.
+INSERT INTO venta_items (venta_id, producto_id, tipo, precio_unitario, cantidad, total, fecha)
+WITH lineas AS (
+    SELECT v.id AS venta_id, COALESCE(v.total, 0) AS venta_total, v.fecha, pp.id AS linea_id,
+           p.id AS producto_id, UPPER(p.tipo) AS tipo, pp.cantidad,
+           CASE WHEN EXISTS (SELECT 1 FROM importacion_pedidos i WHERE i.pedido_id = v.pedido_id)
+                THEN COALESCE(pp.assigned_payment, 0)
+                ELSE COALESCE(p.precio, 0) * pp.cantidad END AS peso
+    FROM ventas v
+    JOIN pedido_productos pp ON pp.pedido_id = v.pedido_id
+    LEFT JOIN productos p ON pp.producto_id = p.id
+    WHERE v.producto_id IS NULL
+),
+pesos AS (
+    SELECT *,
+           SUM(peso) OVER (PARTITION BY venta_id) AS suma_pesos,
+           SUM(COALESCE(NULLIF(cantidad, 0), 1)) OVER (PARTITION BY venta_id) AS suma_cantidades,
+           ROW_NUMBER() OVER (PARTITION BY venta_id ORDER BY linea_id DESC) AS desde_el_final
+    FROM lineas
+),
+parciales AS (
+    SELECT *,
+           CASE WHEN suma_pesos > 0 THEN ROUND(venta_total * peso / suma_pesos, 2)
+                ELSE ROUND(venta_total * COALESCE(NULLIF(cantidad, 0), 1) / suma_cantidades, 2) END AS parcial
+    FROM pesos
+),
+montos AS (
+    SELECT *,
+           CASE WHEN desde_el_final = 1
+                THEN ROUND(venta_total - (SUM(parcial) OVER (PARTITION BY venta_id) - parcial), 2)
+                ELSE parcial END AS monto
+    FROM parciales
+)
+SELECT venta_id, producto_id, tipo,
+       CASE WHEN cantidad THEN monto / cantidad ELSE monto END,
+       cantidad, monto, fecha
+FROM montos
+ORDER BY venta_id, linea_id;
+
+-- Borrar una venta borra sus líneas
+CREATE TRIGGER IF NOT EXISTS trg_ventas_items_delete AFTER DELETE ON ventas
+BEGIN
+    DELETE FROM venta_items WHERE venta_id = OLD.id;
+END;
@@ -0,0 +1,25 @@
+-- Resumen diario de ventas por (día, tipo, cliente), armado desde
+-- venta_items. Lo mantienen registrar_venta y eliminar_venta en la misma
+-- transacción que la venta; `python mantenimiento.py ventas-diarias` lo
+-- reconstruye. cliente_id 0 agrupa las ventas sin cliente.
+
+CREATE TABLE IF NOT EXISTS ventas_diarias (
+    dia TEXT NOT NULL,
+    tipo TEXT NOT NULL,
+    cliente_id INTEGER NOT NULL DEFAULT 0,
+    total REAL NOT NULL DEFAULT 0,
+    cantidad INTEGER NOT NULL DEFAULT 0,
+    ventas INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (dia, tipo, cliente_id)
+) WITHOUT ROWID;
+
+CREATE INDEX IF NOT EXISTS idx_ventas_diarias_cliente ON ventas_diarias(cliente_id, dia);
+
+-- Carga inicial
+INSERT INTO ventas_diarias (dia, tipo, cliente_id, total, cantidad, ventas)
+SELECT DATE(vi.fecha), COALESCE(vi.tipo, ''), COALESCE(v.cliente_id, 0),
+       SUM(vi.total), SUM(vi.cantidad), COUNT(DISTINCT vi.venta_id)
+FROM venta_items vi
+JOIN ventas v ON vi.venta_id = v.id
+WHERE vi.fecha IS NOT NULL
+GROUP BY DATE(vi.fecha), COALESCE(vi.tipo, ''), COALESCE(v.cliente_id, 0);
@@ -0,0 +1,17 @@
+-- ventas_diarias también lleva contador de cambios, así el cache de series
+-- de tiempo se invalida con las ventas y con las reconstrucciones del resumen.
+
+INSERT OR IGNORE INTO cambios_tablas (tabla, version) VALUES ('ventas_diarias', 0);
+
+CREATE TRIGGER IF NOT EXISTS trg_ventas_diarias_cambios_insert AFTER INSERT ON ventas_diarias
+BEGIN
+    UPDATE cambios_tablas SET version = version + 1 WHERE tabla = 'ventas_diarias';
+END;
+CREATE TRIGGER IF NOT EXISTS trg_ventas_diarias_cambios_update AFTER UPDATE ON ventas_diarias
+BEGIN
+    UPDATE cambios_tablas SET version = version + 1 WHERE tabla = 'ventas_diarias';
+END;
+CREATE TRIGGER IF NOT EXISTS trg_ventas_diarias_cambios_delete AFTER DELETE ON ventas_diarias
+BEGIN
+    UPDATE cambios_tablas SET version = version + 1 WHERE tabla = 'ventas_diarias';
+END;
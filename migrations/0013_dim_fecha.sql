@@ -0,0 +1,62 @@
+-- Calendario precalculado, un registro por día de 2000 a 2060. Los periodos
+-- de los reportes (semana ISO, mes, trimestre, año y su periodo anterior) se
+-- leen de aquí en vez de calcularse con aritmética de fechas, y las series
+-- de tiempo agrupan por las claves enteras (semana_clave = año ISO * 100 +
+-- semana ISO, mes_clave = AAAAMM, trimestre_clave = AAAA * 10 + trimestre).
+
+CREATE TABLE IF NOT EXISTS dim_fecha (
+    fecha TEXT PRIMARY KEY,
+    dia_clave INTEGER NOT NULL,
+    anio INTEGER NOT NULL,
+    mes INTEGER NOT NULL,
+    dia INTEGER NOT NULL,
+    dia_semana INTEGER NOT NULL,          -- 1 lunes ... 7 domingo
+    semana_clave INTEGER NOT NULL,
+    mes_clave INTEGER NOT NULL,
+    trimestre_clave INTEGER NOT NULL,
+    inicio_semana TEXT NOT NULL,
+    inicio_mes TEXT NOT NULL,
+    inicio_trimestre TEXT NOT NULL,
+    inicio_anio TEXT NOT NULL,
+    inicio_semana_anterior TEXT NOT NULL,
+    inicio_mes_anterior TEXT NOT NULL,
+    inicio_trimestre_anterior TEXT NOT NULL,
+    inicio_anio_anterior TEXT NOT NULL
+) WITHOUT ROWID;
+
+INSERT OR IGNORE INTO dim_fecha
+WITH RECURSIVE dias(fecha) AS (
+    SELECT '2000-01-01'
+    UNION ALL
+    SELECT date(fecha, '+1 day') FROM dias WHERE fecha < '2060-12-31'
+),
+base AS (
+    SELECT fecha,
+           CAST(strftime('%Y', fecha) AS INTEGER) AS anio,
+           CAST(strftime('%m', fecha) AS INTEGER) AS mes,
+           CAST(strftime('%d', fecha) AS INTEGER) AS dia,
+           -- El jueves de la semana ISO decide su año y su número
+           date(fecha, '-3 days', 'weekday 4') AS jueves,
+           date(fecha, '-6 days', 'weekday 1') AS inicio_semana
+    FROM dias
+),
+calendario AS (
+    SELECT *, date(fecha, 'start of month', '-' || ((mes - 1) % 3) || ' months') AS inicio_trimestre
+    FROM base
+)
+SELECT fecha,
+       anio * 10000 + mes * 100 + dia,
+       anio, mes, dia,
+       (CAST(strftime('%w', fecha) AS INTEGER) + 6) % 7 + 1,
+       CAST(strftime('%Y', jueves) AS INTEGER) * 100 + (CAST(strftime('%j', jueves) AS INTEGER) - 1) / 7 + 1,
+       anio * 100 + mes,
+       anio * 10 + (mes - 1) / 3 + 1,
+       inicio_semana,
+       date(fecha, 'start of month'),
+       inicio_trimestre,
+       date(fecha, 'start of year'),
+       date(inicio_semana, '-7 days'),
+       date(fecha, 'start of month', '-1 month'),
+       date(inicio_trimestre, '-3 months'),
+       date(fecha, 'start of year', '-1 year')
+FROM calendario;
@@ -0,0 +1,17 @@
+-- venta_items también lleva contador de cambios: el reporte Excel la lee, así
+-- una corrección directa de las líneas cambia la clave de los exportes cacheados.
+
+INSERT OR IGNORE INTO cambios_tablas (tabla, version) VALUES ('venta_items', 0);
+
+CREATE TRIGGER IF NOT EXISTS trg_venta_items_cambios_insert AFTER INSERT ON venta_items
+BEGIN
+    UPDATE cambios_tablas SET version = version + 1 WHERE tabla = 'venta_items';
+END;
+CREATE TRIGGER IF NOT EXISTS trg_venta_items_cambios_update AFTER UPDATE ON venta_items
+BEGIN
+    UPDATE cambios_tablas SET version = version + 1 WHERE tabla = 'venta_items';
+END;
+CREATE TRIGGER IF NOT EXISTS trg_venta_items_cambios_delete AFTER DELETE ON venta_items
+BEGIN
+    UPDATE cambios_tablas SET version = version + 1 WHERE tabla = 'venta_items';
+END;
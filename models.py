@@ -1,168 +1,98 @@
 import sqlite3
+import os
+import re
 
-def init_db():
-    conn = sqlite3.connect('database.db')
-    cursor = conn.cursor()
-    
-    # Tabla de usuarios (NUEVA) - Simplificada
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS usuarios (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT NOT NULL,
-            email TEXT UNIQUE NOT NULL,
-            password TEXT NOT NULL,
-            role TEXT DEFAULT 'employee',
-            created_at TEXT DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-    
-    # Tabla de productos actualizada con tipo y descripción
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS productos (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            nombre TEXT NOT NULL,
-            tipo TEXT NOT NULL,
-            precio REAL NOT NULL,
-            descripcion TEXT
-        )
-    ''')
-    
-    # Tabla de clientes actualizada con todos los campos
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS clientes (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            nombre TEXT NOT NULL,
-            email TEXT,
-            telefono TEXT,
-            direccion TEXT,
-            notas TEXT
-        )
-    ''')
-    
-    # Tabla de pedidos actualizada con cliente, fecha, encargado, pago y notas
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS pedidos (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            cliente_id INTEGER,
-            fecha TEXT NOT NULL,
-            encargado_principal TEXT,
-            pago_realizado BOOLEAN DEFAULT FALSE,
-            notas TEXT,
-            estado TEXT DEFAULT 'pendiente',
-            FOREIGN KEY (cliente_id) REFERENCES clientes(id)
-        )
-    ''')
-    
-    # Tabla intermedia para productos/servicios en pedidos (relación muchos a muchos)
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS pedido_productos (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            pedido_id INTEGER,
-            producto_id INTEGER,
-            cantidad INTEGER DEFAULT 1,
-            FOREIGN KEY (pedido_id) REFERENCES pedidos(id),
-            FOREIGN KEY (producto_id) REFERENCES productos(id)
-        )
-    ''')
-    
-    # Tabla de ventas actualizada con cliente
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS ventas (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            cliente_id INTEGER,
-            producto_id INTEGER,
-            cantidad INTEGER,
-            total REAL,
-            fecha TEXT,
-            FOREIGN KEY (cliente_id) REFERENCES clientes(id),
-            FOREIGN KEY (producto_id) REFERENCES productos(id)
-        )
-    ''')
-    
-    # Tabla de cuentas por cobrar
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS cuentas_por_cobrar (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            numero_factura TEXT UNIQUE NOT NULL,
-            cliente_id INTEGER NOT NULL,
-            pedido_id INTEGER,
-            monto REAL NOT NULL,
-            monto_pagado REAL DEFAULT 0,
-            saldo REAL NOT NULL,
-            fecha_vencimiento DATE NOT NULL,
-            estado TEXT DEFAULT 'pendiente',
-            dias_vencido INTEGER DEFAULT 0,
-            fecha_creacion TEXT DEFAULT CURRENT_TIMESTAMP,
-            notas TEXT,
-            FOREIGN KEY (cliente_id) REFERENCES clientes(id),
-            FOREIGN KEY (pedido_id) REFERENCES pedidos(id)
-        )
-    ''')
-    
-    # Tabla de cuentas por pagar
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS cuentas_por_pagar (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            codigo_factura TEXT UNIQUE NOT NULL,
-            proveedor TEXT NOT NULL,
-            monto REAL NOT NULL,
-            monto_pagado REAL DEFAULT 0,
-            saldo REAL NOT NULL,
-            fecha_vencimiento DATE NOT NULL,
-            estado TEXT DEFAULT 'pendiente',
-            descripcion TEXT,
-            fecha_creacion TEXT DEFAULT CURRENT_TIMESTAMP,
-            fecha_pago TEXT,
-            dias_vencido INTEGER DEFAULT 0
-        )
-    ''')
-    
-    # Agregar columnas faltantes
-    add_missing_columns(cursor)
-    
-    # Insertar usuarios por defecto si no existen
-    seed_users(cursor)
-    
-    conn.commit()
-    conn.close()
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations')
 
-def add_missing_columns(cursor):
-    """Agrega columnas que puedan faltar"""
-    try:
-        cursor.execute("ALTER TABLE pedido_productos ADD COLUMN assigned_payment REAL DEFAULT 0")
-        print("OK Agregada columna assigned_payment a pedido_productos")
-    except sqlite3.OperationalError:
-        pass  # Ya existe
-    
-    # Agregar estado_pago a pedidos (más específico que pago_realizado)
-    try:
-        cursor.execute("ALTER TABLE pedidos ADD COLUMN estado_pago TEXT DEFAULT 'no_pagado'")
-        print("OK Agregada columna estado_pago a pedidos")
-    except sqlite3.OperationalError:
-        pass  # Ya existe
-    
-    # Agregar pedido_id a ventas para conectar con pedidos
-    try:
-        cursor.execute("ALTER TABLE ventas ADD COLUMN pedido_id INTEGER")
-        cursor.execute("CREATE INDEX IF NOT EXISTS idx_ventas_pedido_id ON ventas(pedido_id)")
-        print("OK Agregada columna pedido_id a ventas")
-    except sqlite3.OperationalError:
-        pass  # Ya existe
-    
-    # Agregar estado_pago a ventas
+ADD_COLUMN_RE = re.compile(r'ALTER\s+TABLE\s+(\w+)\s+ADD\s+COLUMN\s+(\w+)', re.IGNORECASE)
+
+def cargar_migraciones():
+    """Migraciones disponibles como lista ordenada de (version, nombre, ruta)"""
+    migraciones = []
+    for archivo in sorted(os.listdir(MIGRATIONS_DIR)):
+        if not archivo.endswith('.sql'):
+            continue
+        version = int(archivo.split('_', 1)[0])
+        migraciones.append((version, archivo, os.path.join(MIGRATIONS_DIR, archivo)))
+    return migraciones
+
+def version_actual(conn):
+    """Versión de esquema aplicada; 0 si la base nunca pasó por el runner"""
     try:
-        cursor.execute("ALTER TABLE ventas ADD COLUMN estado_pago TEXT DEFAULT 'pagado'")
-        print("OK Agregada columna estado_pago a ventas")
+        return conn.execute('SELECT MAX(version) FROM schema_version').fetchone()[0] or 0
     except sqlite3.OperationalError:
-        pass  # Ya existe
-    
-    # Agregar venta_id a cuentas_por_cobrar para conectar con ventas
+        return 0
+
+def separar_sentencias(sql):
+    """Partir un archivo de migración en sentencias completas"""
+    sentencias = []
+    actual = ''
+    for linea in sql.splitlines(keepends=True):
+        actual += linea
+        if sqlite3.complete_statement(actual):
+            sentencias.append(actual.strip())
+            actual = ''
+    if actual.strip():
+        sentencias.append(actual.strip())
+    return sentencias
+
+def columna_existe(cursor, tabla, columna):
+    return any(fila[1] == columna for fila in cursor.execute(f'PRAGMA table_info({tabla})'))
+
+def aplicar_migracion(cursor, sql):
+    for sentencia in separar_sentencias(sql):
+        # Bases creadas antes del runner ya pueden tener la columna
+        sin_comentarios = '\n'.join(l for l in sentencia.splitlines() if not l.strip().startswith('--'))
+        add_column = ADD_COLUMN_RE.search(sin_comentarios)
+        if add_column and columna_existe(cursor, *add_column.groups()):
+            continue
+        cursor.execute(sentencia)
+
+def init_db():
+    """
+    Aplicar las migraciones pendientes. Con el esquema al día solo cuesta
+    un SELECT sobre schema_version.
+    """
+    conn = sqlite3.connect('database.db', isolation_level=None)
+    cursor = conn.cursor()
     try:
-        cursor.execute("ALTER TABLE cuentas_por_cobrar ADD COLUMN venta_id INTEGER")
-        cursor.execute("CREATE INDEX IF NOT EXISTS idx_cuentas_venta_id ON cuentas_por_cobrar(venta_id)")
-        print("OK Agregada columna venta_id a cuentas_por_cobrar")
-    except sqlite3.OperationalError:
-        pass  # Ya existe
+        actual = version_actual(conn)
+        pendientes = [m for m in cargar_migraciones() if m[0] > actual]
+        if not pendientes:
+            return
+        
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS schema_version (
+                version INTEGER PRIMARY KEY,
+                nombre TEXT NOT NULL,
+                aplicada_en TEXT DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        
+        # Cada migración y su registro en schema_version van en una transacción
+        for version, nombre, ruta in pendientes:
+            with open(ruta, encoding='utf-8') as archivo:
+                sql = archivo.read()
+            cursor.execute('BEGIN IMMEDIATE')
+            if version_actual(conn) >= version:
+                # Otro proceso la aplicó mientras esperábamos el lock
+                cursor.execute('COMMIT')
+                continue
+            try:
+                aplicar_migracion(cursor, sql)
+                cursor.execute('INSERT INTO schema_version (version, nombre) VALUES (?, ?)', (version, nombre))
+                cursor.execute('COMMIT')
+            except Exception:
+                cursor.execute('ROLLBACK')
+                raise
+            print(f"OK Migracion aplicada: {nombre}")
+        
+        # Insertar usuarios por defecto si no existen
+        cursor.execute('BEGIN')
+        seed_users(cursor)
+        cursor.execute('COMMIT')
+    finally:
+        conn.close()
 
 def seed_users(cursor):
     """Poblar con usuarios predefinidos para Plus Graphics"""
@@ -0,0 +1,70 @@
+"""
+Fixtures comunes: cada test corre contra una base SQLite nueva en un
+directorio temporal, con todas las migraciones aplicadas. Las rutas de la
+base son relativas ('database.db'), por eso se cambia el directorio actual.
+"""
+
+import os
+import sqlite3
+import sys
+
+import pytest
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if RAIZ not in sys.path:
+    sys.path.insert(0, RAIZ)
+
+import app as appmod
+import models
+
+
+def vaciar_pool():
+    while not appmod._db_pool.empty():
+        appmod._db_pool.get_nowait().close()
+
+
+@pytest.fixture
+def base(tmp_path, monkeypatch):
+    """Directorio de trabajo con una database.db recién migrada"""
+    monkeypatch.chdir(tmp_path)
+    models.init_db()
+    # El pool y los caches en memoria pueden venir de la base de otro test
+    vaciar_pool()
+    for cache in (appmod.catalogo_cache, appmod.series_cache, appmod.dashboard_cache):
+        cache.invalidar()
+    for indice in appmod.INDICES_AUTOCOMPLETADO.values():
+        indice.version = None
+    yield tmp_path
+    vaciar_pool()
+
+
+@pytest.fixture
+def conn(base):
+    conexion = sqlite3.connect('database.db')
+    conexion.row_factory = sqlite3.Row
+    yield conexion
+    conexion.close()
+
+
+@pytest.fixture
+def cliente_http(base):
+    return appmod.app.test_client()
+
+
+def crear_ventas(conn, filas):
+    """
+    Insertar ventas directas (cliente, producto, cantidad, total, fecha) con su
+    línea en venta_items, como lo hace la API. Devuelve los ids creados.
+    """
+    ids = []
+    for cliente_id, producto_id, cantidad, total, fecha in filas:
+        venta_id = conn.execute('''
+            INSERT INTO ventas (cliente_id, producto_id, cantidad, total, fecha, estado_pago)
+            VALUES (?, ?, ?, ?, ?, 'pagado')
+        ''', (cliente_id, producto_id, cantidad, total, fecha)).lastrowid
+        conn.execute('''
+            INSERT INTO venta_items (venta_id, producto_id, tipo, precio_unitario, cantidad, total, fecha)
+            SELECT ?, id, UPPER(tipo), ? / ?, ?, ?, ? FROM productos WHERE id = ?
+        ''', (venta_id, total, cantidad, cantidad, total, fecha, producto_id))
+        ids.append(venta_id)
+    return ids
@@ -0,0 +1,38 @@
+import sqlite3
+
+from mantenimiento import reservar_codigos, reservar_numeros
+
+
+def test_reservas_consecutivas_sin_solaparse(conn):
+    assert reservar_numeros(conn, 'FAC') == 1
+    assert reservar_numeros(conn, 'FAC', 10) == 2
+    assert reservar_numeros(conn, 'FAC') == 12
+    # Cada serie lleva su propio contador
+    assert reservar_numeros(conn, 'BILL', 3) == 1
+    conn.commit()
+    assert conn.execute("SELECT valor FROM contadores WHERE serie = 'FAC'").fetchone()[0] == 12
+
+
+def test_reserva_deshecha_con_la_transaccion(conn):
+    reservar_numeros(conn, 'FAC', 5)
+    conn.commit()
+    reservar_numeros(conn, 'FAC', 5)
+    conn.rollback()
+    assert reservar_numeros(conn, 'FAC') == 6
+
+
+def test_dos_conexiones_no_reciben_el_mismo_numero(conn):
+    otra = sqlite3.connect('database.db')
+    try:
+        primero = reservar_numeros(conn, 'BILL', 2)
+        conn.commit()
+        segundo = reservar_numeros(otra, 'BILL', 2)
+        otra.commit()
+    finally:
+        otra.close()
+    assert segundo == primero + 2
+
+
+def test_codigos_con_formato_de_la_serie(conn):
+    assert reservar_codigos(conn, 'BILL', 2) == ['BILL001', 'BILL002']
+    assert reservar_codigos(conn, 'FAC') == ['FAC-0001']
@@ -0,0 +1,40 @@
+def contar(conn, tabla):
+    return conn.execute(f'SELECT COUNT(*) FROM {tabla}').fetchone()[0]
+
+
+def test_reintento_devuelve_la_respuesta_guardada(cliente_http, conn):
+    conn.execute("INSERT INTO clientes (nombre) VALUES ('Ana')")
+    conn.execute("INSERT INTO productos (nombre, tipo, precio) VALUES ('Logo', 'gfx', 100.0)")
+    conn.commit()
+    cuerpo = {'cliente_id': 1, 'producto_id': 1, 'cantidad': 2, 'estado_pago': 'pendiente'}
+    headers = {'Idempotency-Key': 'venta-1'}
+
+    primera = cliente_http.post('/api/ventas', json=cuerpo, headers=headers)
+    segunda = cliente_http.post('/api/ventas', json=cuerpo, headers=headers)
+    assert primera.status_code == segunda.status_code == 201
+    assert 'Idempotent-Replayed' not in primera.headers
+    assert segunda.headers['Idempotent-Replayed'] == 'true'
+    assert segunda.get_json() == primera.get_json()
+    # Ni la venta ni su cuenta por cobrar se duplican
+    assert contar(conn, 'ventas') == 1
+    assert contar(conn, 'cuentas_por_cobrar') == 1
+
+
+def test_misma_clave_con_otro_cuerpo(cliente_http, conn):
+    headers = {'Idempotency-Key': 'cliente-1'}
+    assert cliente_http.post('/api/clientes', json={'nombre': 'Ana'}, headers=headers).status_code == 201
+    respuesta = cliente_http.post('/api/clientes', json={'nombre': 'Beto'}, headers=headers)
+    assert respuesta.status_code == 422
+    assert contar(conn, 'clientes') == 1
+
+
+def test_un_error_no_se_guarda(cliente_http, conn):
+    headers = {'Idempotency-Key': 'venta-2'}
+    cuerpo = {'producto_id': 1, 'cantidad': 1, 'estado_pago': 'pagado'}
+    assert cliente_http.post('/api/ventas', json=cuerpo, headers=headers).status_code == 404
+
+    conn.execute("INSERT INTO productos (nombre, tipo, precio) VALUES ('Logo', 'gfx', 100.0)")
+    conn.commit()
+    respuesta = cliente_http.post('/api/ventas', json=cuerpo, headers=headers)
+    assert respuesta.status_code == 201
+    assert 'Idempotent-Replayed' not in respuesta.headers
@@ -0,0 +1,105 @@
+import sqlite3
+from datetime import datetime
+
+import pytest
+from openpyxl import Workbook
+
+import importar
+
+
+class Interrupcion(Exception):
+    pass
+
+
+@pytest.fixture
+def planilla(conn, base):
+    """
+    Hoja de 25 filas: 24 ventas válidas (algunas agrupadas en pedidos y
+    algunas pendientes) y una con un producto inexistente.
+    """
+    conn.executemany('INSERT INTO clientes (nombre) VALUES (?)', [('Ana',), ('Beto',)])
+    conn.executemany('INSERT INTO productos (nombre, tipo, precio) VALUES (?, ?, ?)',
+                     [('Logo', 'gfx', 100.0), ('Intro', 'vfx', 250.0)])
+    conn.commit()
+
+    wb = Workbook()
+    ws = wb.active
+    ws.title = 'Ventas'
+    ws.append(['fecha', 'cliente', 'producto', 'cantidad', 'total', 'estado_pago', 'pedido'])
+    for i in range(25):
+        producto = 'No existe' if i == 13 else ('Logo', 'Intro')[i % 2]
+        ws.append([datetime(2025, 1 + i % 12, 1 + i), ('Ana', 'Beto')[i % 2], producto, 1 + i % 3,
+                   10.0 * (i + 1), 'pendiente' if i % 5 == 0 else 'pagado', f'P{i // 6}' if i % 3 == 0 else None])
+    ruta = str(base / 'historico.xlsx')
+    wb.save(ruta)
+    return ruta
+
+
+def totales(conn):
+    return tuple(conn.execute('''
+        SELECT (SELECT COUNT(*) FROM ventas), (SELECT SUM(total) FROM ventas),
+               (SELECT SUM(total) FROM venta_items), (SELECT SUM(total) FROM ventas_diarias),
+               (SELECT COUNT(*) FROM cuentas_por_cobrar), (SELECT COUNT(*) FROM pedidos)
+    ''').fetchone())
+
+
+def test_importacion_completa_cuadra(conn, planilla):
+    resumen = importar.importar_ventas_excel(conn, planilla, tamano_lote=10)
+    assert resumen['completada'] and not resumen['ya_importada']
+    assert resumen['insertados'] == 24
+    assert resumen['total_errores'] == 1
+    assert resumen['errores'][0]['linea'] == 15
+    cantidad, ventas, items, diarias, cuentas, pedidos = totales(conn)
+    esperado = sum(10.0 * (i + 1) for i in range(25) if i != 13)
+    assert (cantidad, ventas, items, diarias) == (24, esperado, esperado, esperado)
+    assert cuentas == 5
+    assert pedidos == resumen['pedidos_creados'] == 5
+
+
+def test_reanuda_desde_el_ultimo_lote_confirmado(conn, planilla, monkeypatch):
+    original = importar.crear_cuentas_pendientes
+    llamadas = []
+
+    def fallar_en_el_segundo_lote(conn, ultimo_id):
+        llamadas.append(ultimo_id)
+        if len(llamadas) == 2:
+            raise Interrupcion()
+        return original(conn, ultimo_id)
+
+    monkeypatch.setattr(importar, 'crear_cuentas_pendientes', fallar_en_el_segundo_lote)
+    with pytest.raises(Interrupcion):
+        importar.importar_ventas_excel(conn, planilla, tamano_lote=10)
+    # El proceso murió: lo que no se confirmó se pierde con la conexión
+    conn.close()
+    monkeypatch.setattr(importar, 'crear_cuentas_pendientes', original)
+
+    conn = sqlite3.connect('database.db')
+    try:
+        assert conn.execute('SELECT filas_procesadas, estado FROM importaciones').fetchone() == (10, 'en_proceso')
+        assert conn.execute('SELECT COUNT(*) FROM ventas').fetchone()[0] == 10
+
+        resumen = importar.importar_ventas_excel(conn, planilla, tamano_lote=10)
+        assert resumen['reanudada_desde'] == 10
+        assert resumen['completada']
+        assert resumen['insertados'] == 14
+        esperado = sum(10.0 * (i + 1) for i in range(25) if i != 13)
+        assert totales(conn) == (24, esperado, esperado, esperado, 5, 5)
+        # P3 (filas 18 y 21) quedó partido entre lotes y conserva sus dos líneas
+        pedido = conn.execute('''
+            SELECT p.total, p.item_count FROM pedidos p
+            JOIN importacion_pedidos ip ON ip.pedido_id = p.id WHERE ip.referencia = 'P3'
+        ''').fetchone()
+        assert pedido == (190.0 + 220.0, 2)
+    finally:
+        conn.close()
+
+
+def test_reimportar_el_mismo_archivo_no_duplica(conn, planilla):
+    importar.importar_ventas_excel(conn, planilla, tamano_lote=10)
+    antes = totales(conn)
+
+    resumen = importar.importar_ventas_excel(conn, planilla, tamano_lote=10)
+    assert resumen['ya_importada'] and resumen['completada']
+    assert resumen['insertados'] == 0
+    assert totales(conn) == antes
+    assert conn.execute('SELECT COUNT(*) FROM importaciones').fetchone()[0] == 1
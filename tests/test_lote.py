@@ -0,0 +1,65 @@
+def contar(conn, tabla):
+    return conn.execute(f'SELECT COUNT(*) FROM {tabla}').fetchone()[0]
+
+
+def test_referencias_a_operaciones_anteriores(cliente_http, conn):
+    respuesta = cliente_http.post('/api/batch', json={'operaciones': [
+        {'ruta': '/api/clientes', 'cuerpo': {'nombre': 'Ana'}, 'ref': 'cli'},
+        {'ruta': '/api/productos', 'cuerpo': {'nombre': 'Logo', 'tipo': 'gfx', 'precio': 100.0}},
+        {'ruta': '/api/pedidos', 'cuerpo': {
+            'cliente_id': '$cli.id',
+            'notas': 'Pedido de $cli.id',
+            'productos': [{'producto_id': '$1.id', 'cantidad': 3}],
+        }},
+        {'metodo': 'GET', 'ruta': '/api/clientes/$cli.id'},
+    ]})
+    assert respuesta.status_code == 200
+    resultados = respuesta.get_json()['resultados']
+    assert [r['status'] for r in resultados] == [201, 201, 201, 200]
+    assert resultados[3]['cuerpo']['nombre'] == 'Ana'
+
+    # Una referencia completa conserva el tipo; dentro de un texto se interpola
+    pedido = conn.execute('SELECT cliente_id, notas, total FROM pedidos').fetchone()
+    assert tuple(pedido) == (1, 'Pedido de 1', 300.0)
+    assert isinstance(pedido['cliente_id'], int)
+
+
+def test_una_falla_deshace_todo_el_lote(cliente_http, conn):
+    respuesta = cliente_http.post('/api/batch', json={'operaciones': [
+        {'ruta': '/api/clientes', 'cuerpo': {'nombre': 'Ana'}, 'ref': 'cli'},
+        {'ruta': '/api/pedidos', 'cuerpo': {'cliente_id': '$cli.id', 'productos': [{'producto_id': 99}]}},
+    ]})
+    assert respuesta.status_code == 404
+    assert respuesta.get_json()['indice'] == 1
+    assert contar(conn, 'clientes') == 0
+    assert contar(conn, 'pedidos') == 0
+
+
+def test_referencia_a_una_operacion_posterior(cliente_http, conn):
+    respuesta = cliente_http.post('/api/batch', json={'operaciones': [
+        {'ruta': '/api/clientes', 'cuerpo': {'nombre': 'Ana'}},
+        {'ruta': '/api/clientes/$2.id', 'metodo': 'PUT', 'cuerpo': {'nombre': 'Beto'}},
+        {'ruta': '/api/clientes', 'cuerpo': {'nombre': 'Carla'}},
+    ]})
+    assert respuesta.status_code == 400
+    assert contar(conn, 'clientes') == 0
+
+
+def test_ruta_con_metodo_no_permitido(cliente_http, conn):
+    respuesta = cliente_http.post('/api/batch', json={'operaciones': [
+        {'ruta': '/api/clientes', 'cuerpo': {'nombre': 'Ana'}},
+        {'ruta': '/api/clientes', 'metodo': 'DELETE'},
+    ]})
+    assert respuesta.status_code == 400
+    assert contar(conn, 'clientes') == 0
+
+
+def test_error_http_de_la_vista_conserva_su_status(cliente_http, conn):
+    # Sin cuerpo, request.json de la vista lanza 415
+    respuesta = cliente_http.post('/api/batch', json={'operaciones': [
+        {'ruta': '/api/clientes', 'cuerpo': {'nombre': 'Ana'}},
+        {'ruta': '/api/clientes'},
+    ]})
+    assert respuesta.status_code == 415
+    assert respuesta.get_json()['resultados'][1]['status'] == 415
+    assert contar(conn, 'clientes') == 0
@@ -0,0 +1,85 @@
+import os
+import shutil
+import sqlite3
+
+import pytest
+
+import models
+
+ORIGEN = models.MIGRATIONS_DIR
+
+
+@pytest.fixture
+def migrar_hasta(tmp_path, monkeypatch):
+    """Aplicar las migraciones del repositorio hasta la versión indicada"""
+    monkeypatch.chdir(tmp_path)
+    destino = tmp_path / 'migraciones'
+    destino.mkdir()
+    monkeypatch.setattr(models, 'MIGRATIONS_DIR', str(destino))
+
+    def migrar(version=None):
+        for archivo in sorted(os.listdir(ORIGEN)):
+            if archivo.endswith('.sql') and (version is None or int(archivo.split('_', 1)[0]) <= version):
+                shutil.copy(os.path.join(ORIGEN, archivo), destino)
+        models.init_db()
+    return migrar
+
+
+def test_carga_inicial_de_venta_items_cuadra_con_ventas(migrar_hasta):
+    migrar_hasta(9)
+    conn = sqlite3.connect('database.db')
+    conn.executescript('''
+        INSERT INTO clientes (id, nombre) VALUES (1, 'Ana');
+        INSERT INTO productos (id, nombre, tipo, precio) VALUES
+            (1, 'Logo', 'gfx', 100.0), (2, 'Intro', 'vfx', 250.0), (3, 'Banner', 'gfx', 33.0), (4, 'Viejo', 'gfx', 10.0);
+        -- Pedido normal: se reparte por precio * cantidad
+        INSERT INTO pedidos (id, cliente_id, fecha, total) VALUES (1, 1, '2025-03-01', 450.0);
+        INSERT INTO pedido_productos (pedido_id, producto_id, cantidad) VALUES (1, 1, 2), (1, 2, 1);
+        -- Pedido importado: se reparte por assigned_payment
+        INSERT INTO pedidos (id, cliente_id, fecha, total) VALUES (2, 1, '2025-03-01', 100.0);
+        INSERT INTO pedido_productos (pedido_id, producto_id, cantidad, assigned_payment) VALUES (2, 1, 1, 70.0), (2, 2, 1, 30.0);
+        INSERT INTO importaciones (id, archivo, huella, hoja) VALUES (1, 'h.xlsx', 'abc', 'Ventas');
+        INSERT INTO importacion_pedidos (importacion_id, referencia, pedido_id) VALUES (1, 'P1', 2);
+        -- Tres líneas iguales: el redondeo queda en la última
+        INSERT INTO pedidos (id, cliente_id, fecha, total) VALUES (3, 1, '2025-03-01', 100.0);
+        INSERT INTO pedido_productos (pedido_id, producto_id, cantidad) VALUES (3, 3, 1), (3, 3, 1), (3, 3, 1);
+        -- Pedido sin líneas
+        INSERT INTO pedidos (id, cliente_id, fecha, total) VALUES (4, 1, '2025-03-01', 80.0);
+
+        INSERT INTO ventas (cliente_id, producto_id, cantidad, total, fecha, pedido_id) VALUES
+            (1, 1, 2, 200.0, '2025-03-01 10:00:00', NULL),
+            (1, 4, 1, 10.0, '2025-03-01 11:00:00', NULL),
+            (1, NULL, 1, 450.0, '2025-03-02 10:00:00', 1),
+            (NULL, NULL, 1, 100.0, '2025-03-02 12:00:00', 2),
+            (1, NULL, 1, 100.0, '2025-03-03 10:00:00', 3),
+            (1, NULL, 1, 80.0, '2025-03-03 11:00:00', 4);
+        -- El producto de la segunda venta ya no existe
+        DELETE FROM productos WHERE id = 4;
+    ''')
+    conn.commit()
+    conn.close()
+
+    migrar_hasta()
+    conn = sqlite3.connect('database.db')
+    try:
+        descuadres = conn.execute('''
+            SELECT v.id FROM ventas v
+            LEFT JOIN (SELECT venta_id, ROUND(SUM(total), 2) AS total FROM venta_items GROUP BY venta_id) vi
+                ON vi.venta_id = v.id
+            WHERE vi.total IS NULL OR vi.total != v.total
+        ''').fetchall()
+        assert descuadres == []
+        assert conn.execute('SELECT SUM(total) FROM ventas_diarias').fetchone()[0] == \
+            conn.execute('SELECT SUM(total) FROM ventas').fetchone()[0] == 940.0
+
+        por_venta = lambda venta_id: conn.execute(
+            'SELECT producto_id, tipo, total FROM venta_items WHERE venta_id = ? ORDER BY id', (venta_id,)).fetchall()
+        assert por_venta(2) == [(None, None, 10.0)]
+        assert por_venta(3) == [(1, 'GFX', 200.0), (2, 'VFX', 250.0)]
+        assert por_venta(4) == [(1, 'GFX', 70.0), (2, 'VFX', 30.0)]
+        assert por_venta(5) == [(3, 'GFX', 33.33), (3, 'GFX', 33.33), (3, 'GFX', 33.34)]
+        assert por_venta(6) == [(None, None, 80.0)]
+        # Las líneas sin tipo se agrupan con tipo '' en el resumen diario
+        assert conn.execute("SELECT SUM(total) FROM ventas_diarias WHERE tipo = ''").fetchone()[0] == 90.0
+    finally:
+        conn.close()
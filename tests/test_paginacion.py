@@ -0,0 +1,65 @@
+import base64
+import json
+
+import app as appmod
+
+
+CLAVES = [('nombre', 'nombre'), ('id', 'id')]
+
+
+def test_paginas_cubren_todas_las_filas(conn):
+    # Nombres repetidos: el id desempata y el orden sigue siendo estable
+    conn.executemany('INSERT INTO clientes (nombre) VALUES (?)',
+                     [(f'Cliente {i % 7}',) for i in range(23)])
+    conn.commit()
+
+    vistos = []
+    cursor = None
+    while True:
+        filas, siguiente = appmod.consulta_paginada(conn, 'SELECT * FROM clientes', CLAVES, (5, cursor))
+        vistos.extend((fila['nombre'], fila['id']) for fila in filas)
+        if siguiente is None:
+            break
+        cursor = appmod.decodificar_cursor(siguiente)
+
+    esperado = [tuple(fila) for fila in conn.execute('SELECT nombre, id FROM clientes ORDER BY nombre, id')]
+    assert vistos == esperado
+
+
+def test_paginacion_descendente(conn):
+    conn.executemany('INSERT INTO clientes (nombre) VALUES (?)', [(f'C{i}',) for i in range(6)])
+    conn.commit()
+
+    filas, siguiente = appmod.consulta_paginada(conn, 'SELECT * FROM clientes', [('id', 'id')], (4, None), descendente=True)
+    assert [fila['id'] for fila in filas] == [6, 5, 4, 3]
+    filas, siguiente = appmod.consulta_paginada(conn, 'SELECT * FROM clientes', [('id', 'id')],
+                                                (4, appmod.decodificar_cursor(siguiente)), descendente=True)
+    assert [fila['id'] for fila in filas] == [2, 1]
+    assert siguiente is None
+
+
+def test_cursor_ida_y_vuelta():
+    valores = ['Estudio Ñandú', 42, 3.5, None]
+    assert appmod.decodificar_cursor(appmod.codificar_cursor(valores)) == valores
+
+
+def cursor_crudo(valor):
+    return base64.urlsafe_b64encode(json.dumps(valor).encode()).decode()
+
+
+def test_listado_paginado_por_http(cliente_http, conn):
+    conn.executemany('INSERT INTO clientes (nombre) VALUES (?)', [(f'C{i}',) for i in range(5)])
+    conn.commit()
+
+    primera = cliente_http.get('/api/clientes?limit=3').get_json()
+    assert [c['id'] for c in primera['items']] == [1, 2, 3]
+    segunda = cliente_http.get(f"/api/clientes?limit=3&cursor={primera['next_cursor']}").get_json()
+    assert [c['id'] for c in segunda['items']] == [4, 5]
+    assert segunda['next_cursor'] is None
+
+
+def test_cursores_invalidos_devuelven_400(cliente_http):
+    for cursor in ('no-es-base64!', cursor_crudo({'id': 1}), cursor_crudo([[1, 2]]),
+                   cursor_crudo([{'a': 1}]), cursor_crudo([1, 2])):
+        respuesta = cliente_http.get(f'/api/clientes?limit=2&cursor={cursor}')
+        assert respuesta.status_code == 400, cursor
@@ -0,0 +1,66 @@
+from conftest import crear_ventas
+from mantenimiento import acumular_ventas_diarias, reconstruir_ventas_diarias
+
+
+def sumas(conn):
+    ventas = conn.execute('SELECT COALESCE(SUM(total), 0), COUNT(*) FROM ventas').fetchone()
+    diarias = conn.execute('SELECT COALESCE(SUM(total), 0), COALESCE(SUM(ventas), 0) FROM ventas_diarias').fetchone()
+    return tuple(ventas), tuple(diarias)
+
+
+def sembrar(conn):
+    conn.executemany('INSERT INTO clientes (nombre) VALUES (?)', [('Ana',), ('Beto',)])
+    conn.executemany('INSERT INTO productos (nombre, tipo, precio) VALUES (?, ?, ?)',
+                     [('Logo', 'gfx', 100.0), ('Intro', 'vfx', 250.0)])
+    return crear_ventas(conn, [
+        (1, 1, 1, 100.0, '2026-01-05 10:00:00'),
+        (1, 2, 2, 500.0, '2026-01-05 12:30:00'),
+        (2, 1, 3, 300.0, '2026-01-06 09:00:00'),
+        (None, 2, 1, 250.0, '2026-02-01 18:00:00'),
+    ])
+
+
+def test_sumar_y_restar_cuadran_con_ventas(conn):
+    ids = sembrar(conn)
+    acumular_ventas_diarias(conn, ids)
+    conn.commit()
+    ventas, diarias = sumas(conn)
+    assert ventas == diarias == (1150.0, 4)
+    # Misma clave (día, tipo, cliente) acumula sobre la fila existente
+    fila = conn.execute("SELECT total, ventas FROM ventas_diarias WHERE dia = '2026-01-05' AND tipo = 'GFX'").fetchone()
+    assert tuple(fila) == (100.0, 1)
+
+    # Restar antes de borrar, como lo hace DELETE /api/ventas/<id>
+    acumular_ventas_diarias(conn, ids[1:3], -1)
+    conn.execute('DELETE FROM ventas WHERE id IN (?, ?)', ids[1:3])
+    conn.commit()
+    ventas, diarias = sumas(conn)
+    assert ventas == diarias == (350.0, 2)
+    # Las filas que quedan en cero se eliminan
+    assert conn.execute("SELECT COUNT(*) FROM ventas_diarias WHERE dia = '2026-01-06'").fetchone()[0] == 0
+
+
+def test_reconstruir_da_lo_mismo_que_acumular(conn):
+    acumular_ventas_diarias(conn, sembrar(conn))
+    conn.commit()
+    incremental = conn.execute('SELECT * FROM ventas_diarias ORDER BY dia, tipo, cliente_id').fetchall()
+    reconstruir_ventas_diarias(conn)
+    assert [tuple(f) for f in conn.execute('SELECT * FROM ventas_diarias ORDER BY dia, tipo, cliente_id')] \
+        == [tuple(f) for f in incremental]
+
+
+def test_api_mantiene_el_resumen(cliente_http, conn):
+    conn.execute("INSERT INTO productos (nombre, tipo, precio) VALUES ('Logo', 'gfx', 80.0)")
+    conn.commit()
+
+    ids = []
+    for cantidad in (1, 2, 3):
+        respuesta = cliente_http.post('/api/ventas', json={'producto_id': 1, 'cantidad': cantidad, 'estado_pago': 'pagado'})
+        assert respuesta.status_code == 201
+        ids.append(respuesta.get_json()['venta_id'])
+    ventas, diarias = sumas(conn)
+    assert ventas == diarias == (480.0, 3)
+
+    assert cliente_http.delete(f'/api/ventas/{ids[0]}').status_code == 200
+    ventas, diarias = sumas(conn)
+    assert ventas == diarias == (400.0, 2)